@@ -1,12 +1,17 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from app.database.base import get_db
 from app.models.models import User
+from app.core.cache import TTLCache
 import os
 from dotenv import load_dotenv
 
@@ -22,12 +27,38 @@ ALGORITHM = "HS256"
 # Срок действия токена доступа (в минутах)
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Стоимость хеширования bcrypt (log2 числа раундов).
+# Хеши с другой стоимостью продолжают проверяться
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
 # Создаем контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Хеширование выполняется в отдельном пуле потоков, чтобы не блокировать цикл событий
+# (bcrypt освобождает GIL на время вычисления)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Максимум операций хеширования в работе и в очереди; остальные ждут освобождения места
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+# Время ожидания места в очереди (в секундах), после которого возвращается 503
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_password_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+
+# Ограничение числа неудачных попыток входа для одного имени пользователя
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", 10))
+LOGIN_RATE_WINDOW = float(os.getenv("LOGIN_RATE_WINDOW", 60))
+login_attempts = TTLCache("login_attempts", maxsize=10000, ttl=LOGIN_RATE_WINDOW)
 
 # Создаем схему OAuth2 для проверки токенов в запросах
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
+# Кэш аутентифицированных пользователей по имени пользователя (sub токена).
+# Кэш локален для процесса: в других процессах изменения видны по истечении TTL
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+principal_cache = TTLCache("auth_principals", maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
 
 class TokenData:
     """Данные токена"""
@@ -35,6 +66,34 @@ class TokenData:
         self.username = username
 
 
+class UserPrincipal:
+    """
+    Снимок данных аутентифицированного пользователя без привязки к сессии БД
+    Хранится в кэше вместо ORM-объекта, чтобы не разделять его между сессиями
+    """
+    def __init__(self, id: int, username: str, role: str, created_at: datetime, updated_at: Optional[datetime] = None):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.created_at = created_at
+        self.updated_at = updated_at
+    
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            created_at=user.created_at,
+            updated_at=user.updated_at
+        )
+
+
+def invalidate_user_cache(username: str):
+    """Удаляет пользователя из кэша аутентификации (после изменения или удаления)"""
+    principal_cache.invalidate(username)
+
+
 def verify_password(plain_password, hashed_password):
     """Проверяет соответствие хешированного пароля и обычного пароля"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -45,13 +104,76 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    """Аутентифицирует пользователя по имени пользователя и паролю"""
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        return False
-    if not verify_password(password, user.password):
+async def _run_password_task(func, *args):
+    """Выполняет операцию bcrypt в пуле потоков с ограничением очереди"""
+    try:
+        await asyncio.wait_for(_password_slots.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+    
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _password_slots.release()
+
+
+async def verify_password_async(plain_password, hashed_password):
+    """Проверяет пароль, не блокируя цикл событий"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    """Хеширует пароль, не блокируя цикл событий"""
+    return await _run_password_task(get_password_hash, password)
+
+
+def _recent_login_failures(username: str, now: float) -> list:
+    return [t for t in login_attempts.get(username, []) if now - t < LOGIN_RATE_WINDOW]
+
+
+def check_login_rate(username: str):
+    """
+    Проверяет лимит неудачных попыток входа для имени пользователя
+    Превышение лимита за окно LOGIN_RATE_WINDOW возвращает 429
+    """
+    now = time.monotonic()
+    failures = _recent_login_failures(username, now)
+    
+    if len(failures) >= LOGIN_RATE_LIMIT:
+        retry_after = int(LOGIN_RATE_WINDOW - (now - failures[0])) + 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много попыток входа, повторите попытку позже",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def record_login_failure(username: str):
+    """Учитывает неудачную попытку входа (неизвестный пользователь или неверный пароль)"""
+    now = time.monotonic()
+    failures = _recent_login_failures(username, now)
+    failures.append(now)
+    login_attempts.set(username, failures)
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """
+    Аутентифицирует пользователя по имени пользователя и паролю
+    Лимит учитывает только неудачные попытки; успешный вход сбрасывает счетчик
+    """
+    check_login_rate(username)
+    
+    user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+    if not user or not await verify_password_async(password, user.password):
+        record_login_failure(username)
         return False
+    
+    login_attempts.invalidate(username)
     return user
 
 
@@ -73,8 +195,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Получает текущего пользователя по токену"""
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """
+    Получает текущего пользователя по токену
+    Пользователь кэшируется, поэтому обращение к БД выполняется только при промахе кэша
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Неверные учетные данные",
@@ -94,13 +219,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
+    principal = principal_cache.get(token_data.username)
+    if principal is not None:
+        return principal
+    
     # Получаем пользователя из базы данных
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = (await db.execute(select(User).where(User.username == token_data.username))).scalars().first()
     
     if user is None:
         raise credentials_exception
     
-    return user
+    principal = UserPrincipal.from_user(user)
+    principal_cache.set(token_data.username, principal)
+    
+    return principal
 
 
 async def get_current_admin(current_user: User = Depends(get_current_user)):
@@ -0,0 +1,305 @@
+"""
+Кэши: LRU в памяти процесса и хранилище, совместимое с Redis
+TTLCache синхронный (для кода без операций ввода-вывода), кэши из create_cache -
+асинхронные, чтобы обращения к Redis не блокировали цикл событий
+"""
+import fnmatch
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Бэкенд кэшей, создаваемых через create_cache: memory, redis или fakeredis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Признак отсутствия записи; позволяет хранить в кэше None (отрицательное кэширование)
+MISSING = object()
+
+# Зарегистрированные кэши по имени (для метрик)
+_caches: Dict[str, Any] = {}
+
+
+class TTLCache:
+    """
+    LRU-кэш ограниченного размера со сроком жизни записей
+    При переполнении вытесняются давно не использованные записи
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение по ключу или default, если записи нет или она устарела"""
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is not None and item[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+
+            if item is not None:
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        """
+        Возвращает значения по списку ключей (default для отсутствующих)
+        Обращение учитывается в счетчиках один раз: как попадание, если найден хотя бы один ключ
+        """
+        values = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is not None and item[1] > now:
+                    self._data.move_to_end(key)
+                    values.append(item[0])
+                    continue
+                if item is not None:
+                    del self._data[key]
+                values.append(default)
+
+            if any(value is not default for value in values):
+                self.hits += 1
+            else:
+                self.misses += 1
+        return values
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохраняет значение; ttl переопределяет срок жизни по умолчанию"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Удаляет запись по ключу"""
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Удаляет все записи"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Возвращает счетчики попаданий и промахов"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class AsyncMemoryCache:
+    """
+    TTLCache с асинхронным интерфейсом RedisCache
+    Позволяет вызывающему коду не зависеть от бэкенда кэша
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60):
+        self.name = name
+        self._cache = TTLCache(name, maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        return self._cache.get(key, default)
+
+    async def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        return self._cache.get_many(keys, default)
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._cache.set(key, value, ttl)
+
+    async def invalidate(self, key: Hashable):
+        self._cache.invalidate(key)
+
+    async def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+class RedisCache:
+    """
+    Кэш в хранилище, совместимом с Redis (общий для всех процессов)
+    Значения сериализуются в JSON, срок жизни задается через EX.
+    Клиент асинхронный (redis.asyncio или FakeRedis)
+    """
+
+    def __init__(self, name: str, client, ttl: float = 60, prefix: Optional[str] = None):
+        self.name = name
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix or f"cache:{name}:"
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        _caches[name] = self
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key}"
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        raw = await self.client.get(self._key(key))
+
+        if raw is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return json.loads(raw)
+
+    async def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        """Значения по списку ключей одним запросом MGET; учитывается как одно обращение"""
+        if not keys:
+            return []
+
+        raws = await self.client.mget([self._key(key) for key in keys])
+
+        if all(raw is None for raw in raws):
+            self.misses += 1
+        else:
+            self.hits += 1
+        return [default if raw is None else json.loads(raw) for raw in raws]
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        await self.client.set(self._key(key), json.dumps(value, ensure_ascii=False, default=str), ex=max(int(ttl), 1))
+
+    async def invalidate(self, key: Hashable):
+        if await self.client.delete(self._key(key)):
+            self.invalidations += 1
+
+    async def clear(self):
+        keys = [key async for key in self.client.scan_iter(match=f"{self.prefix}*")]
+        if keys:
+            await self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class FakeRedis:
+    """
+    Минимальная замена клиента redis.asyncio в памяти процесса (get/mget/set/delete/scan_iter)
+    Используется для локального запуска и проверок без сервера Redis
+    """
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, name: str):
+        item = self._data.get(name)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[name]
+            return None
+        return item
+
+    async def get(self, name: str):
+        with self._lock:
+            item = self._alive(name)
+            return item[0] if item is not None else None
+
+    async def mget(self, names: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            items = [self._alive(name) for name in names]
+        return [item[0] if item is not None else None for item in items]
+
+    async def set(self, name: str, value, ex: Optional[int] = None):
+        value = value.encode("utf-8") if isinstance(value, str) else value
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(1 for name in names if self._alive(name) is not None and self._data.pop(name, None))
+
+    async def scan_iter(self, match: str = "*"):
+        with self._lock:
+            names = [name for name in list(self._data) if self._alive(name) is not None]
+        for name in names:
+            if fnmatch.fnmatchcase(name, match):
+                yield name
+
+    async def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+_redis_client = None
+
+
+def get_redis_client():
+    """Возвращает общий асинхронный клиент Redis (или FakeRedis при CACHE_BACKEND=fakeredis)"""
+    global _redis_client
+
+    if _redis_client is None:
+        if CACHE_BACKEND == "fakeredis":
+            _redis_client = FakeRedis()
+        else:
+            from redis import asyncio as aioredis
+            _redis_client = aioredis.Redis.from_url(REDIS_URL)
+
+    return _redis_client
+
+
+def create_cache(name: str, maxsize: int = 1024, ttl: float = 60):
+    """
+    Создает асинхронный кэш с бэкендом из CACHE_BACKEND
+    Если клиент Redis недоступен (пакет redis не установлен), используется кэш в памяти
+    """
+    if CACHE_BACKEND in ("redis", "fakeredis"):
+        try:
+            return RedisCache(name, get_redis_client(), ttl=ttl)
+        except ImportError:
+            logger.warning(f"Пакет redis не установлен, кэш {name} хранится в памяти процесса")
+
+    return AsyncMemoryCache(name, maxsize=maxsize, ttl=ttl)
+
+
+def get_cache_stats() -> dict:
+    """Возвращает счетчики всех зарегистрированных кэшей"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,71 @@
+"""
+Условные GET-запросы: слабые ETag, If-None-Match и Last-Modified
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional
+
+from fastapi import Response, status
+
+# Длительность интервала (в секундах), входящего в ETag.
+# Статус и days_left меняются с течением времени без изменения строк,
+# поэтому ETag обновляется не реже одного раза за интервал
+HTTP_CACHE_BUCKET = int(os.getenv("HTTP_CACHE_BUCKET", 300))
+
+
+def time_bucket() -> int:
+    """Номер текущего интервала HTTP_CACHE_BUCKET"""
+    return int(time.time() // HTTP_CACHE_BUCKET) if HTTP_CACHE_BUCKET > 0 else 0
+
+
+def weak_etag(*parts) -> str:
+    """Слабый ETag по набору значений (результаты агрегатов, параметры запроса, область видимости)"""
+    digest = hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение ETag с заголовком If-None-Match (список тегов или "*")"""
+    if not if_none_match:
+        return False
+    
+    if if_none_match.strip() == "*":
+        return True
+    
+    return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+
+
+def http_date(value: datetime) -> str:
+    """Дата в формате HTTP; время в базе хранится в UTC без часового пояса"""
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: datetime = None) -> dict:
+    """
+    Заголовки кэширования ответа
+    Ответы зависят от пользователя, поэтому кэшируются только клиентом (private)
+    и перепроверяются при каждом запросе (no-cache)
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def set_cache_headers(response: Response, etag: str, last_modified: datetime = None):
+    """Добавляет заголовки кэширования к ответу"""
+    response.headers.update(cache_headers(etag, last_modified))
+
+
+def not_modified(etag: str, last_modified: datetime = None) -> Response:
+    """Ответ 304 без тела"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, last_modified))
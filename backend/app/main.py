@@ -2,17 +2,19 @@
 Главный модуль FastAPI приложения
 """
 from fastapi import FastAPI
+import asyncio
 import os
 import logging
 from typing import List
 import uvicorn
 
-from app.routers import auth, users, contracts, dadata
+from app.routers import auth, users, contracts, dadata, metrics
 from app.models.models import User
-from app.database.base import get_db
-from app.core.auth import get_password_hash
+from app.database.base import AsyncSessionLocal
+from app.core.auth import get_password_hash_async
+from app.services import contract_service, expiry_service, user_service
+from app.services.dadata_service import dadata_service
 from app.cors_config import setup_cors
-from sqlalchemy.orm import Session
 
 # Настройка логирования
 logging.basicConfig(
@@ -36,26 +38,31 @@ app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(contracts.router)
 app.include_router(dadata.router)  # Добавляем маршруты для DaData API
+app.include_router(metrics.router)
 
 
-def create_initial_admin():
+async def create_initial_admin():
     """Создает администратора по умолчанию, если такого пользователя нет в базе"""
-    db = next(get_db())
     admin_username = os.getenv("ADMIN_USERNAME", "admin")
     admin_password = os.getenv("ADMIN_PASSWORD", "admin")
     
-    admin = db.query(User).filter(User.username == admin_username).first()
+    async with AsyncSessionLocal() as db:
+        await _create_initial_admin(db, admin_username, admin_password)
+
+
+async def _create_initial_admin(db, admin_username: str, admin_password: str):
+    """Создает администратора в переданной сессии"""
+    admin = await user_service.get_user_by_username(db, admin_username)
     if not admin:
         logger.info(f"Создание администратора по умолчанию: {admin_username}")
-        hashed_password = get_password_hash(admin_password)
+        hashed_password = await get_password_hash_async(admin_password)
         admin = User(
             username=admin_username,
             password=hashed_password,
             role="admin"
         )
         db.add(admin)
-        db.commit()
-        db.refresh(admin)
+        await db.commit()
         logger.info(f"Администратор по умолчанию создан: {admin_username}")
     else:
         logger.info(f"Администратор уже существует: {admin_username}")
@@ -65,10 +72,30 @@ def create_initial_admin():
 async def startup_event():
     """Выполняется при запуске приложения"""
     logger.info("Запуск приложения...")
-    create_initial_admin()
+    await create_initial_admin()
+    
+    # Переходы статусов и уведомления юристов (если проверка не вынесена в worker.py)
+    if expiry_service.EXPIRY_SCHEDULER == "app" and expiry_service.EXPIRY_CHECK_INTERVAL > 0:
+        app.state.expiry_task = asyncio.create_task(expiry_service.run_expiry_scheduler())
+    elif expiry_service.EXPIRY_SCHEDULER == "off" and not contract_service.STATUS_REFRESH_ON_READ:
+        logger.warning(
+            "Проверка сроков отключена (EXPIRY_SCHEDULER=off): сохраненные статусы и статистика "
+            "не обновляются с течением времени; включите планировщик или STATUS_REFRESH_ON_READ=1"
+        )
+    
     logger.info("Приложение готово к работе")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Выполняется при остановке приложения"""
+    expiry_task = getattr(app.state, "expiry_task", None)
+    if expiry_task:
+        expiry_task.cancel()
+    
+    await dadata_service.aclose()
+
+
 @app.get("/api")
 async def root():
     """Корневой маршрут для проверки работоспособности API"""
@@ -1,10 +1,54 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Index, case, false
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.database.base import Base
 
+# Количество дней до окончания, в течение которых контракт считается истекающим
+EXPIRING_SOON_DAYS = 30
+
+# Допустимые статусы контракта
+CONTRACT_STATUSES = ("active", "expiring_soon", "expired")
+
+
+def status_boundaries(now: datetime = None):
+    """
+    Возвращает границы статусов по дате окончания:
+    контракт истек, если end_date < now, и снова активен, если end_date >= active_from
+    (совпадает с условием days_left > EXPIRING_SOON_DAYS)
+    """
+    now = now or datetime.utcnow()
+    return now, now + timedelta(days=EXPIRING_SOON_DAYS + 1)
+
+
+class days_until(FunctionElement):
+    """Целое число полных дней от момента now до даты end_date в SQL"""
+    type = Integer()
+    name = "days_until"
+    inherit_cache = True
+
+
+@compiles(days_until)
+def _compile_days_until(element, compiler, **kw):
+    end_date, now = list(element.clauses)
+    return "CAST(FLOOR(EXTRACT(EPOCH FROM (%s - %s)) / 86400) AS INTEGER)" % (
+        compiler.process(end_date, **kw),
+        compiler.process(now, **kw),
+    )
+
+
+@compiles(days_until, "sqlite")
+def _compile_days_until_sqlite(element, compiler, **kw):
+    end_date, now = list(element.clauses)
+    return "CAST(julianday(%s) - julianday(%s) AS INTEGER)" % (
+        compiler.process(end_date, **kw),
+        compiler.process(now, **kw),
+    )
+
 
 class User(Base):
     """Модель пользователя (юриста)"""
@@ -34,18 +78,154 @@ class Contract(Base):
     director = Column(String(100), nullable=False)
     address = Column(Text, nullable=False)
     end_date = Column(DateTime, nullable=False)
+    # Денормализованная копия статуса для старых потребителей.
+    # Актуальный статус рассчитывается по end_date (см. current_status)
     status = Column(String(20), default="active", nullable=False)  # active, expiring_soon, expired
     comments = Column(Text)
     has_nd = Column(Boolean, default=False)
-    history = Column(JSON, default=list)  # История изменений в формате JSON
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
+    # Отпечаток строки таблицы-источника (sha256), по которому синхронизация
+    # migration_tool определяет измененные строки
+    source_hash = Column(String(64))
+    # Номер версии для оптимистичной блокировки: ORM добавляет его в условие UPDATE
+    # и увеличивает при каждом изменении (см. __mapper_args__)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Внешние ключи
     lawyer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # Отношения
     lawyer = relationship("User", back_populates="contracts")
+    # История удаляется базой данных (ON DELETE CASCADE), без загрузки записей в сессию
+    history_entries = relationship(
+        "ContractHistory",
+        back_populates="contract",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="ContractHistory.timestamp"
+    )
+
+    __table_args__ = (
+        # Курсорная пагинация по (end_date, id) и фильтрация по статусу (диапазону end_date)
+        Index("ix_contracts_end_date_id", "end_date", "id"),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+    @hybrid_property
+    def current_status(self):
+        """Статус контракта, рассчитанный по дате окончания на текущий момент"""
+        now, active_from = status_boundaries()
+        if self.end_date < now:
+            return "expired"
+        if self.end_date < active_from:
+            return "expiring_soon"
+        return "active"
+
+    @current_status.expression
+    def current_status(cls):
+        now, active_from = status_boundaries()
+        return case(
+            (cls.end_date < now, "expired"),
+            (cls.end_date < active_from, "expiring_soon"),
+            else_="active",
+        )
+
+    @hybrid_property
+    def days_left(self):
+        """Количество дней до истечения срока (0 для истекших контрактов)"""
+        return max((self.end_date - datetime.utcnow()).days, 0)
+
+    @days_left.expression
+    def days_left(cls):
+        now = datetime.utcnow()
+        return case((cls.end_date < now, 0), else_=days_until(cls.end_date, now))
+
+    @classmethod
+    def status_condition(cls, status: str, now: datetime = None):
+        """
+        Условие отбора контрактов с заданным статусом в виде диапазона end_date.
+        В отличие от сравнения с current_status, использует индекс по end_date
+        """
+        now, active_from = status_boundaries(now)
+        
+        if status == "expired":
+            return cls.end_date < now
+        if status == "expiring_soon":
+            return (cls.end_date >= now) & (cls.end_date < active_from)
+        if status == "active":
+            return cls.end_date >= active_from
+        
+        return false()
+
+    def __repr__(self):
+        return f"<Contract(company='{self.company_name}', status='{self.status}')>"
+
+
+class ContractHistory(Base):
+    """Запись истории изменений контракта (только добавление)"""
+    __tablename__ = "contract_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    contract_id = Column(Integer, ForeignKey("contracts.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, nullable=False)  # Без внешнего ключа: история переживает удаление пользователя
+    username = Column(String(50), nullable=False)
+    action = Column(String(20), nullable=False)  # create, update, etc.
+    changes = Column(JSON, default=dict)  # field: {old: value, new: value}
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Отношения
+    contract = relationship("Contract", back_populates="history_entries")
+
+    __table_args__ = (
+        Index("ix_contract_history_contract_id_timestamp", "contract_id", "timestamp"),
+    )
+
+    def __repr__(self):
+        return f"<ContractHistory(contract_id={self.contract_id}, action='{self.action}')>"
+
+
+class ContractStat(Base):
+    """
+    Количество контрактов юриста в каждом статусе.
+    Поддерживается инкрементально при изменении контрактов
+    и периодически сверяется с таблицей контрактов
+    """
+    __tablename__ = "contract_stats"
+
+    lawyer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<ContractStat(lawyer_id={self.lawyer_id}, status='{self.status}', count={self.count})>"
+
+
+class NotificationOutbox(Base):
+    """
+    Сводка для юриста, ожидающая отправки.
+    Записывается в одной транзакции с переходами статусов и помечается
+    отправленной только после успешной передачи в приемник уведомлений
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lawyer_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime)  # None, пока сводка не отправлена
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text)
+    # Время следующей попытки после неудачной (задержка растет с числом попыток)
+    next_attempt_at = Column(DateTime)
+    # Заполняется, когда попытки исчерпаны: сводка больше не отправляется
+    failed_at = Column(DateTime)
+
+    __table_args__ = (
+        # Выборка неотправленных сводок по порядку создания
+        Index("ix_notification_outbox_sent_at_id", "sent_at", "id"),
+    )
 
     def __repr__(self):
-        return f"<Contract(company='{self.company_name}', status='{self.status}')>"
\ No newline at end of file
+        return f"<NotificationOutbox(lawyer_id={self.lawyer_id}, sent_at={self.sent_at})>"
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 from app.core.auth import authenticate_user, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
@@ -24,9 +24,9 @@ class LoginData(BaseModel):
 
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """Endpoint для получения токена доступа"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     
     if not user:
         raise HTTPException(
@@ -45,9 +45,9 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginData, db: Session = Depends(get_db)):
+async def login(login_data: LoginData, db: AsyncSession = Depends(get_db)):
     """Endpoint для входа в систему через обычную форму (не OAuth2)"""
-    user = authenticate_user(db, login_data.username, login_data.password)
+    user = await authenticate_user(db, login_data.username, login_data.password)
     
     if not user:
         raise HTTPException(
@@ -65,9 +65,9 @@ async def login(login_data: LoginData, db: Session = Depends(get_db)):
 
 
 @router.post("/register", response_model=UserSchema)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Endpoint для регистрации нового пользователя"""
-    return user_service.create_user(db, user_data)
+    return await user_service.create_user(db, user_data)
 
 
 @router.get("/me", response_model=UserSchema)
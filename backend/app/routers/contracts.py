@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 
 from app.database.base import get_db
 from app.models.models import User
-from app.schemas.contract import Contract as ContractSchema, ContractCreate, ContractUpdate, ContractStats
+from app.schemas.contract import (
+    Contract as ContractSchema, ContractCreate, ContractUpdate, ContractStats, ContractPage, ContractHistoryEntry,
+    ContractListItem, ContractBulkRequest, ContractBulkResponse
+)
+from app.schemas.dadata import EnrichmentStatus
 from app.core.auth import get_current_user, get_current_admin
-from app.services import contract_service
+from app.core import http_cache
+from app.services import contract_service, enrichment_service, expiry_service, export_service
 
 router = APIRouter(
     prefix="/contracts",
@@ -14,90 +20,271 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=List[ContractSchema])
+@router.get(
+    "/",
+    response_model=Union[List[ContractListItem], ContractPage],
+    response_model_exclude_unset=True  # В ответ попадают только запрошенные поля
+)
 async def read_contracts(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     status: Optional[str] = None,
     lawyer_id: Optional[int] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    view: str = Query("summary", pattern="^(summary|full)$"),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Получение списка контрактов с фильтрацией и пагинацией
     Обычные пользователи видят только свои контракты,
     администраторы могут видеть все контракты
+    
+    По умолчанию используется пагинация через skip/limit и возвращается список.
+    При pagination=cursor (или переданном cursor) возвращается страница
+    с next_cursor для запроса следующей страницы; order_by задает порядок
+    (id или end_date)
+    
+    view=summary (по умолчанию) возвращает контракты без адреса и комментариев,
+    view=full - все поля; fields задает перечень полей через запятую
+    
+    Ответ содержит слабый ETag; при совпадении If-None-Match возвращается 304
+    без выборки контрактов
     """
-    return contract_service.get_contracts(
+    list_fields = contract_service.resolve_list_fields(view, fields)
+    
+    etag = await contract_service.get_contracts_etag(
+        db,
+        params={
+            "skip": skip, "limit": limit, "pagination": pagination,
+            "cursor": cursor, "order_by": order_by, "fields": list_fields
+        },
+        status=status,
+        lawyer_id=lawyer_id,
+        search=search,
+        current_user=current_user
+    )
+    if http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_cache_headers(response, etag)
+    
+    if pagination == "cursor" or cursor:
+        return await contract_service.get_contracts_page(
+            db,
+            cursor=cursor,
+            limit=limit,
+            order_by=order_by,
+            status=status,
+            lawyer_id=lawyer_id,
+            search=search,
+            current_user=current_user,
+            fields=list_fields
+        )
+    
+    return await contract_service.get_contracts(
         db, 
         skip=skip, 
         limit=limit, 
         status=status,
         lawyer_id=lawyer_id,
         search=search,
-        current_user=current_user
+        current_user=current_user,
+        fields=list_fields
     )
 
 
 @router.get("/stats", response_model=ContractStats)
 async def get_stats(
+    response: Response,
     lawyer_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Получение статистики по контрактам
     Обычные пользователи видят только статистику по своим контрактам,
-    администраторы могут видеть статистику по всем контрактам
+    администраторы могут видеть статистику по всем контрактам.
+    Поддерживает условный GET (ETag / If-None-Match)
+    """
+    etag = await contract_service.get_stats_etag(db, lawyer_id, current_user)
+    if http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    
+    http_cache.set_cache_headers(response, etag)
+    return await contract_service.get_stats(db, lawyer_id, current_user)
+
+
+@router.get("/export")
+async def export_contracts(
+    format: str = Query("csv", pattern="^(csv|xlsx|ndjson)$"),
+    status: Optional[str] = None,
+    lawyer_id: Optional[int] = None,
+    search: Optional[str] = None,
+    view: str = Query("full", pattern="^(summary|full)$"),
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Выгрузка контрактов в CSV, XLSX или NDJSON с теми же фильтрами и правами доступа,
+    что и у списка контрактов. Строки читаются из базы пакетами и передаются
+    по мере чтения, поэтому объем памяти не зависит от числа контрактов
+    """
+    export_service.check_export_format(format)
+    list_fields = contract_service.resolve_list_fields(view, fields)
+    
+    return StreamingResponse(
+        export_service.export_contracts(format, list_fields, status, lawyer_id, search, current_user),
+        media_type=export_service.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_service.export_filename(format)}"'}
+    )
+
+
+@router.post("/refresh-statuses", response_model=dict)
+async def refresh_statuses(
+    current_user: User = Depends(get_current_admin)  # Только администраторы могут запускать пересчет
+):
+    """
+    Пересчет сохраненных статусов всех контрактов (только для администраторов)
+    Выполняет внеочередную проверку сроков с отправкой сводок юристам
+    Возвращает количество контрактов, перешедших в каждый статус
     """
-    return contract_service.get_stats(db, lawyer_id, current_user)
+    return await expiry_service.run_expiry_check_async()
+
+
+@router.post("/refresh-company-data", response_model=EnrichmentStatus, status_code=status.HTTP_202_ACCEPTED)
+async def refresh_company_data(
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_admin)  # Только администраторы могут запускать обновление
+):
+    """
+    Запуск обновления наименования, руководителя и адреса всех контрактов по данным DaData
+    (только для администраторов). Задача выполняется в фоне, ход выполнения -
+    через GET /contracts/refresh-company-data
+    """
+    if enrichment_service.enrichment_state["running"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Обновление реквизитов уже выполняется"
+        )
+    
+    # Отмечаем запуск сразу, чтобы повторный запрос не запустил вторую задачу
+    enrichment_service.enrichment_state["running"] = True
+    background_tasks.add_task(enrichment_service.run_enrichment, current_user)
+    
+    return enrichment_service.enrichment_state
+
+
+@router.get("/refresh-company-data", response_model=EnrichmentStatus)
+async def get_company_data_refresh_status(
+    current_user: User = Depends(get_current_admin)
+):
+    """Состояние последнего обновления реквизитов контрактов (только для администраторов)"""
+    return enrichment_service.enrichment_state
 
 
 @router.get("/{contract_id}", response_model=ContractSchema)
 async def read_contract(
     contract_id: int, 
-    db: Session = Depends(get_db),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Получение информации о контракте по ID
     Обычные пользователи могут получать информацию только о своих контрактах,
-    администраторы могут получать информацию о любых контрактах
+    администраторы могут получать информацию о любых контрактах.
+    Заголовок ETag передается в If-Match при обновлении контракта
+    и в If-None-Match при повторном чтении (304, если контракт не изменился)
+    """
+    etag = await contract_service.get_contract_etag(db, contract_id, current_user)
+    if http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    
+    contract = await contract_service.get_contract(db, contract_id, current_user)
+    http_cache.set_cache_headers(
+        response,
+        contract_service.contract_etag(contract["id"], contract["version"]),
+        contract_service.contract_last_modified(contract)
+    )
+    return contract
+
+
+@router.get("/{contract_id}/history", response_model=List[ContractHistoryEntry])
+async def read_contract_history(
+    contract_id: int,
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Получение истории изменений контракта с пагинацией (сначала последние изменения)
+    Обычные пользователи могут получать историю только своих контрактов
     """
-    return contract_service.get_contract(db, contract_id, current_user)
+    return await contract_service.get_contract_history(db, contract_id, skip, limit, current_user)
 
 
 @router.post("/", response_model=ContractSchema)
 async def create_contract(
     contract: ContractCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Создание нового контракта"""
-    return contract_service.create_contract(db, contract, current_user)
+    return await contract_service.create_contract(db, contract, current_user)
+
+
+@router.post("/bulk", response_model=ContractBulkResponse)
+async def bulk_contracts(
+    request: ContractBulkRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)  # Только администраторы могут выполнять пакетные изменения
+):
+    """
+    Пакетное создание, изменение, переназначение юриста и удаление контрактов
+    (только для администраторов). Возвращает результат по каждой операции
+    """
+    return await contract_service.bulk_contracts(db, request.items, current_user, request.atomic)
 
 
 @router.put("/{contract_id}", response_model=ContractSchema)
 async def update_contract(
     contract_id: int,
     contract_update: ContractUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Обновление контракта
     Обычные пользователи могут обновлять только свои контракты,
-    администраторы могут обновлять любые контракты
+    администраторы могут обновлять любые контракты.
+    С заголовком If-Match (ETag из GET) изменение сохраняется, только если контракт
+    не менялся с момента чтения; иначе возвращается 409
     """
-    return contract_service.update_contract(db, contract_id, contract_update, current_user)
+    contract = await contract_service.update_contract(db, contract_id, contract_update, current_user, if_match)
+    http_cache.set_cache_headers(
+        response,
+        contract_service.contract_etag(contract["id"], contract["version"]),
+        contract_service.contract_last_modified(contract)
+    )
+    return contract
 
 
 @router.delete("/{contract_id}", response_model=dict)
 async def delete_contract(
     contract_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin)  # Только администраторы могут удалять контракты
 ):
     """Удаление контракта (только для администраторов)"""
-    return contract_service.delete_contract(db, contract_id)
\ No newline at end of file
+    return await contract_service.delete_contract(db, contract_id)
\ No newline at end of file
@@ -4,10 +4,14 @@ API маршруты для взаимодействия с сервисом DaD
 from typing import List, Dict, Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.auth import get_current_user
+from app.database.base import get_db
 from app.models.models import User
-from app.services.dadata_service import dadata_service
+from app.schemas.dadata import CompanyBatchRequest, CompanyBatchItem
+from app.services import contract_service
+from app.services.dadata_service import dadata_service, merge_suggestions, SUGGEST_MIN_LENGTH
 
 router = APIRouter(
     prefix="/api/dadata",
@@ -24,29 +28,56 @@ async def get_company_info(
     """
     Получение информации о компании по ИНН
     """
-    company = dadata_service.get_company_full_info(inn)
+    company = await dadata_service.get_company_full_info(inn)
     if not company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
     return company
 
 
+@router.post("/companies", response_model=List[CompanyBatchItem])
+async def get_companies_info(
+    request: CompanyBatchRequest,
+    current_user: User = Depends(get_current_user)
+) -> List[Dict[str, Any]]:
+    """
+    Получение информации о нескольких компаниях по списку ИНН
+    Возвращает результат по каждому ИНН: информацию о компании или текст ошибки
+    """
+    return await dadata_service.get_companies(request.inns)
+
+
 @router.get("/suggest", response_model=List[Dict[str, Any]])
 async def suggest_companies(
     query: str,
     count: Optional[int] = 5,
+    local: bool = True,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> List[Dict[str, Any]]:
     """
     Поиск компаний по части наименования или ИНН
+    При local=true (по умолчанию) первыми идут компании из своих контрактов,
+    за ними подсказки DaData; источник указан в поле source.
+    Если DaData недоступна, возвращаются только свои компании (если они найдены)
     """
-    if not query or len(query) < 3:
+    if not query or len(query.strip()) < SUGGEST_MIN_LENGTH:
         raise HTTPException(
             status_code=400, 
             detail="Запрос должен содержать не менее 3 символов"
         )
     
-    suggestions = dadata_service.suggest_companies(query, count)
-    return suggestions
+    local_matches = []
+    if local:
+        local_matches = await contract_service.suggest_local_companies(db, query.strip(), count, current_user)
+    
+    try:
+        remote_matches = await dadata_service.suggest_companies(query, count)
+    except HTTPException:
+        if not local_matches:
+            raise
+        remote_matches = []
+    
+    return merge_suggestions(local_matches, remote_matches, count)
 
 
 @router.get("/address/{inn}", response_model=Dict[str, str])
@@ -57,7 +88,7 @@ async def get_company_address(
     """
     Получение юридического адреса компании по ИНН
     """
-    address = dadata_service.get_company_address(inn)
+    address = await dadata_service.get_company_address(inn)
     if not address:
         raise HTTPException(status_code=404, detail="Адрес не найден")
     return {"address": address}
@@ -71,7 +102,7 @@ async def get_company_director(
     """
     Получение ФИО руководителя компании по ИНН
     """
-    director = dadata_service.get_company_director(inn)
+    director = await dadata_service.get_company_director(inn)
     if not director:
         raise HTTPException(status_code=404, detail="Руководитель не найден")
     return {"director": director}
\ No newline at end of file
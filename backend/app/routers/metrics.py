@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+
+from app.models.models import User
+from app.database.base import get_pool_metrics
+from app.core.cache import get_cache_stats
+from app.core.auth import get_current_admin
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+)
+
+
+@router.get("/", response_model=dict)
+async def read_metrics(
+    current_user: User = Depends(get_current_admin)  # Только администраторы могут получать метрики
+):
+    """
+    Метрики работы сервера (только для администраторов)
+    Пулы соединений: время ожидания соединения, занятые соединения, выход за размер пула
+    Кэши: попадания, промахи и вытеснения
+    """
+    return {
+        "database_pools": get_pool_metrics(),
+        "caches": get_cache_stats(),
+    }
@@ -44,6 +44,48 @@ class ContractUpdate(BaseModel):
         return v
 
 
+class ContractBulkItem(BaseModel):
+    """
+    Операция пакетного изменения контрактов:
+    create - contract, update - id и changes, reassign - id и lawyer_id, delete - id.
+    version (необязательно) - ожидаемая версия контракта, как в If-Match
+    """
+    action: str = Field(..., pattern="^(create|update|reassign|delete)$")
+    id: Optional[int] = None
+    version: Optional[int] = None
+    contract: Optional[ContractCreate] = None
+    changes: Optional[ContractUpdate] = None
+    lawyer_id: Optional[int] = None
+
+
+class ContractBulkRequest(BaseModel):
+    """
+    Пакет операций над контрактами
+    atomic=true - все операции в одной транзакции (при любой ошибке ничего не применяется),
+    atomic=false - операции применяются пакетами, ошибки не влияют на другие пакеты
+    """
+    items: List[ContractBulkItem] = Field(..., min_length=1)
+    atomic: bool = True
+
+
+class ContractBulkResult(BaseModel):
+    """Результат одной операции пакета"""
+    index: int
+    action: str
+    id: Optional[int] = None
+    status: str  # ok, error или skipped (не применена из-за ошибок в атомарном пакете)
+    version: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ContractBulkResponse(BaseModel):
+    """Итог пакетного изменения контрактов"""
+    atomic: bool
+    succeeded: int
+    failed: int
+    results: List[ContractBulkResult]
+
+
 class ContractHistoryEntry(BaseModel):
     """Схема для записи в истории изменений контракта"""
     userId: int
@@ -58,9 +100,12 @@ class ContractInDB(ContractBase):
     id: int
     status: str
     lawyer_id: int
+    # История возвращается только при получении одного контракта,
+    # постранично она доступна через /contracts/{id}/history
     history: List[ContractHistoryEntry] = []
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: int  # Номер версии, в заголовке ETag передается вместе с ID
 
     class Config:
         orm_mode = True
@@ -71,6 +116,33 @@ class Contract(ContractInDB):
     days_left: int  # Количество дней до истечения срока
 
 
+class ContractListItem(BaseModel):
+    """
+    Контракт в списке. Набор полей зависит от запрошенной проекции
+    (view или fields), поэтому все поля, кроме ID, необязательны
+    """
+    id: int
+    company_name: Optional[str] = None
+    inn: Optional[str] = None
+    director: Optional[str] = None
+    address: Optional[str] = None
+    end_date: Optional[datetime] = None
+    status: Optional[str] = None
+    comments: Optional[str] = None
+    has_nd: Optional[bool] = None
+    lawyer_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    version: Optional[int] = None
+    days_left: Optional[int] = None
+
+
+class ContractPage(BaseModel):
+    """Страница контрактов при курсорной пагинации"""
+    items: List[ContractListItem]
+    next_cursor: Optional[str] = None  # None, если страница последняя
+
+
 class ContractStats(BaseModel):
     """Схема для статистики по контрактам"""
     total: int
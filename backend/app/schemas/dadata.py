@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+
+from app.services.dadata_service import DADATA_BATCH_MAX
+
+
+class CompanyBatchRequest(BaseModel):
+    """Схема пакетного запроса информации о компаниях"""
+    inns: List[str] = Field(..., min_length=1, max_length=DADATA_BATCH_MAX)
+
+
+class CompanyBatchItem(BaseModel):
+    """Результат по одному ИНН: информация о компании или текст ошибки"""
+    inn: str
+    company: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class EnrichmentStatus(BaseModel):
+    """Состояние задачи обновления реквизитов контрактов из DaData"""
+    running: bool
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    report: Optional[Dict[str, Any]] = None
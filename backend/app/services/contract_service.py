@@ -1,10 +1,57 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.models.models import Contract, User
-from app.schemas.contract import ContractCreate, ContractUpdate, ContractHistoryEntry
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, tuple_, update
+from app.models.models import Contract, ContractHistory, User, EXPIRING_SOON_DAYS, CONTRACT_STATUSES
+from app.schemas.contract import ContractBulkItem, ContractCreate, ContractUpdate
+from app.services import stats_service, search_service
+from app.core import http_cache
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
+import base64
 import json
+import os
+import time
+from typing import List
+
+# Режим чтения статусов:
+# computed - статус рассчитывается по end_date в момент запроса (в том числе в SQL),
+# stored - используется сохраненная колонка status, периодически пересчитываемая
+STATUS_MODE = os.getenv("CONTRACT_STATUS_MODE", "computed")
+
+# Минимальный интервал (в секундах) между пересчетами статусов при чтении
+STATUS_REFRESH_INTERVAL = int(os.getenv("STATUS_REFRESH_INTERVAL", 60))
+
+# Пересчитывать ли статусы на чтении (без уведомлений, в обход планировщика)
+STATUS_REFRESH_ON_READ = os.getenv("STATUS_REFRESH_ON_READ", "0") == "1"
+
+# Размер пакета id в одном UPDATE при переходе статусов
+STATUS_UPDATE_CHUNK = 500
+
+# Поля контракта в ответах API
+CONTRACT_FIELDS = (
+    "id", "company_name", "inn", "director", "address", "end_date", "status",
+    "comments", "has_nd", "lawyer_id", "created_at", "updated_at", "version", "days_left"
+)
+
+# Наборы полей для списка контрактов: summary не содержит больших текстовых полей
+CONTRACT_VIEWS = {
+    "summary": tuple(field for field in CONTRACT_FIELDS if field not in ("address", "comments")),
+    "full": CONTRACT_FIELDS,
+}
+
+# Максимальное число операций в одном пакетном запросе
+BULK_MAX_ITEMS = int(os.getenv("CONTRACT_BULK_MAX_ITEMS", 1000))
+
+# Число операций в одной транзакции при неатомарном пакетном изменении
+BULK_CHUNK_SIZE = int(os.getenv("CONTRACT_BULK_CHUNK_SIZE", 200))
+
+# Допустимые порядки сортировки для курсорной пагинации
+CURSOR_ORDERINGS = ("id", "end_date")
+
+# Время последнего пересчета статусов (по монотонным часам)
+_last_status_refresh = None
 
 
 def calculate_contract_status(end_date: datetime):
@@ -18,146 +65,555 @@ def calculate_contract_status(end_date: datetime):
     
     if days_left < 0:
         return {"status": "expired", "days_left": 0}
-    elif days_left <= 30:
+    elif days_left <= EXPIRING_SOON_DAYS:
         return {"status": "expiring_soon", "days_left": days_left}
     else:
         return {"status": "active", "days_left": days_left}
 
 
-def get_contracts(
-    db: Session, 
-    skip: int = 0, 
-    limit: int = 100, 
+def apply_status_transitions(db: Session, now: datetime = None):
+    """
+    Переводит контракты с устаревшим сохраненным статусом в актуальный.
+    Кандидаты на переход отбираются запросами по диапазонам end_date
+    (индекс ix_contracts_end_date_id), затрагиваются только строки с устаревшим статусом.
+    UPDATE повторно проверяет условие статуса: строка, у которой между выборкой
+    и обновлением изменили end_date, не получит устаревший статус и не попадет
+    в список переходов. Номер версии контракта увеличивается, как при любом изменении.
+    Если переходы были, в той же транзакции сверяется материализованная статистика;
+    проверка без переходов не блокирует статистику и не пересчитывает ее. Фиксирует вызывающий код.
+    Возвращает список переходов: id, company_name, inn, end_date, lawyer_id,
+    old_status и new_status
+    """
+    global _last_status_refresh
+    
+    now = now or datetime.utcnow()
+    
+    stats_locked = False
+    transitions = []
+    for new_status in CONTRACT_STATUSES:
+        condition = (Contract.status_condition(new_status, now), Contract.status != new_status)
+        rows = db.execute(
+            select(
+                Contract.id, Contract.company_name, Contract.inn,
+                Contract.end_date, Contract.lawyer_id, Contract.status
+            )
+            .where(*condition)
+            .order_by(Contract.end_date, Contract.id)
+        ).all()
+        
+        # Статистика блокируется до первого изменения контрактов
+        # (порядок блокировок как у сервиса контрактов)
+        if rows and not stats_locked:
+            stats_service.lock_contract_stats(db)
+            stats_locked = True
+        
+        # В список переходов попадают только строки, которые действительно обновлены
+        ids = [row.id for row in rows]
+        updated = set()
+        for start in range(0, len(ids), STATUS_UPDATE_CHUNK):
+            updated.update(db.execute(
+                update(Contract)
+                .where(Contract.id.in_(ids[start:start + STATUS_UPDATE_CHUNK]), *condition)
+                .values(status=new_status, version=Contract.version + 1)
+                .returning(Contract.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+        
+        transitions.extend(
+            {
+                "id": row.id,
+                "company_name": row.company_name,
+                "inn": row.inn,
+                "end_date": row.end_date,
+                "lawyer_id": row.lawyer_id,
+                "old_status": row.status,
+                "new_status": new_status,
+            }
+            for row in rows
+            if row.id in updated
+        )
+    
+    # Без переходов сохраненные статусы не менялись и статистика остается верной
+    if transitions:
+        stats_service.reconcile_contract_stats(db)
+    
+    _last_status_refresh = time.monotonic()
+    
+    return transitions
+
+
+def refresh_contract_statuses(db: Session, now: datetime = None):
+    """
+    Пересчитывает сохраненные статусы всех контрактов.
+    Функция синхронная: ее используют фоновые задачи и migration_tool,
+    из асинхронного кода она вызывается через AsyncSession.run_sync.
+    Возвращает количество контрактов, перешедших в каждый статус.
+    """
+    result = dict.fromkeys(CONTRACT_STATUSES, 0)
+    for transition in apply_status_transitions(db, now):
+        result[transition["new_status"]] += 1
+    
+    db.commit()
+    
+    return result
+
+
+async def refresh_contract_statuses_if_due(db: AsyncSession, stored_only: bool = True):
+    """
+    Пересчитывает статусы, если с последнего пересчета прошло
+    больше STATUS_REFRESH_INTERVAL секунд.
+    В режиме computed сохраненная колонка на чтении не используется, поэтому
+    пересчет выполняется только для читающих ее вызовов (stored_only=False, статистика).
+    По умолчанию статусы обслуживает планировщик expiry_service, а пересчет
+    при чтении включается только при STATUS_REFRESH_ON_READ=1
+    """
+    if not STATUS_REFRESH_ON_READ or (stored_only and STATUS_MODE != "stored"):
+        return None
+    
+    if _last_status_refresh is not None and time.monotonic() - _last_status_refresh < STATUS_REFRESH_INTERVAL:
+        return None
+    
+    return await db.run_sync(refresh_contract_statuses)
+
+
+def contract_to_dict(contract: Contract, current_status: str, days_left: int, fields: tuple = CONTRACT_FIELDS):
+    """
+    Создает объект контракта с дополнительной информацией для ответа API.
+    fields ограничивает набор полей: обращение только к ним не приводит
+    к догрузке отложенных колонок
+    """
+    result = {}
+    for field in fields:
+        if field == "status":
+            result[field] = contract.status if STATUS_MODE == "stored" else current_status
+        elif field == "days_left":
+            result[field] = days_left
+        else:
+            result[field] = getattr(contract, field)
+    
+    return result
+
+
+def resolve_list_fields(view: str = "summary", fields: str = None):
+    """
+    Определяет набор полей контракта для списка.
+    fields - перечень полей через запятую, имеет приоритет над view
+    """
+    if not fields:
+        return CONTRACT_VIEWS[view]
+    
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in CONTRACT_FIELDS]
+    
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестные поля: {', '.join(unknown)}. Допустимые поля: {', '.join(CONTRACT_FIELDS)}"
+        )
+    
+    # ID возвращается всегда, порядок полей соответствует CONTRACT_FIELDS
+    requested = set(requested) | {"id"}
+    return tuple(field for field in CONTRACT_FIELDS if field in requested)
+
+
+def _load_list_columns(stmt, fields: tuple):
+    """Загружает из таблицы контрактов только колонки, нужные для списка"""
+    columns = {Contract.id, Contract.end_date}  # end_date нужна для курсора пагинации
+    
+    for field in fields:
+        if field == "status":
+            if STATUS_MODE == "stored":
+                columns.add(Contract.status)
+        elif field != "days_left":
+            columns.add(getattr(Contract, field))
+    
+    return stmt.options(load_only(*columns))
+
+
+def filter_contracts(
+    stmt,
     status: str = None,
     lawyer_id: int = None,
     search: str = None,
     current_user: User = None
 ):
     """
-    Получение списка контрактов с фильтрацией и пагинацией
-    Обычные пользователи видят только свои контракты,
-    администраторы могут видеть все контракты
+    Применяет к запросу фильтры списка контрактов и ограничения доступа
+    Обычные пользователи видят только свои контракты
     """
-    query = db.query(Contract)
-    
     # Фильтрация по статусу
     if status:
-        query = query.filter(Contract.status == status)
+        if STATUS_MODE == "stored":
+            stmt = stmt.where(Contract.status == status)
+        else:
+            stmt = stmt.where(Contract.status_condition(status))
     
     # Фильтрация по юристу
     if lawyer_id:
-        query = query.filter(Contract.lawyer_id == lawyer_id)
+        stmt = stmt.where(Contract.lawyer_id == lawyer_id)
     elif current_user and current_user.role != "admin":
         # Обычные пользователи видят только свои контракты
-        query = query.filter(Contract.lawyer_id == current_user.id)
+        stmt = stmt.where(Contract.lawyer_id == current_user.id)
     
     # Фильтрация по поисковой строке
     if search:
-        query = query.filter(
-            or_(
-                Contract.company_name.ilike(f"%{search}%"),
-                Contract.inn.ilike(f"%{search}%"),
-                Contract.director.ilike(f"%{search}%"),
-                Contract.address.ilike(f"%{search}%")
-            )
+        stmt = stmt.where(search_service.search_condition(search))
+    
+    return stmt
+
+
+async def get_contracts(
+    db: AsyncSession, 
+    skip: int = 0, 
+    limit: int = 100, 
+    status: str = None,
+    lawyer_id: int = None,
+    search: str = None,
+    current_user: User = None,
+    fields: tuple = CONTRACT_VIEWS["summary"]
+):
+    """
+    Получение списка контрактов с фильтрацией и пагинацией
+    Обычные пользователи видят только свои контракты,
+    администраторы могут видеть все контракты
+    """
+    # Актуализируем сохраненные статусы перед фильтрацией по ним
+    await refresh_contract_statuses_if_due(db)
+    
+    # Статус и количество дней до истечения рассчитываются в SQL
+    stmt = select(Contract, Contract.current_status, Contract.days_left)
+    stmt = _load_list_columns(stmt, fields)
+    stmt = filter_contracts(stmt, status, lawyer_id, search, current_user)
+    
+    # При поиске сначала идут наиболее релевантные контракты
+    if search:
+        dialect_name = db.get_bind().dialect.name
+        stmt = stmt.order_by(search_service.search_rank(search, dialect_name).desc())
+    
+    # Получаем контракты с пагинацией в стабильном порядке
+    rows = (await db.execute(stmt.order_by(Contract.id).offset(skip).limit(limit))).all()
+    
+    return [contract_to_dict(*row, fields=fields) for row in rows]
+
+
+async def get_contracts_etag(
+    db: AsyncSession,
+    params: dict,
+    status: str = None,
+    lawyer_id: int = None,
+    search: str = None,
+    current_user: User = None
+) -> str:
+    """
+    Слабый ETag списка контрактов для условного GET.
+    Вычисляется одним агрегатным запросом (число контрактов и время последнего
+    изменения) по тем же фильтрам, что и список; params - остальные параметры
+    запроса (пагинация, набор полей), область видимости - пользователь и его роль
+    """
+    stmt = filter_contracts(
+        select(func.count(Contract.id), func.max(func.coalesce(Contract.updated_at, Contract.created_at))),
+        status, lawyer_id, search, current_user
+    )
+    count, last_modified = (await db.execute(stmt)).one()
+    
+    return http_cache.weak_etag(
+        "contracts", count, last_modified, params, status, lawyer_id, search,
+        _user_scope(current_user), STATUS_MODE, http_cache.time_bucket()
+    )
+
+
+def _user_scope(current_user: User = None):
+    return (current_user.id, current_user.role) if current_user else None
+
+
+def _encode_cursor(order_by: str, contract: Contract):
+    """Кодирует позицию последнего контракта страницы в непрозрачный курсор"""
+    payload = {"order_by": order_by, "id": contract.id}
+    if order_by == "end_date":
+        payload["end_date"] = contract.end_date.isoformat()
+    
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    """Декодирует курсор, полученный от клиента"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        order_by = payload["order_by"]
+        last_id = int(payload["id"])
+        last_end_date = datetime.fromisoformat(payload["end_date"]) if order_by == "end_date" else None
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
         )
     
-    # Получаем контракты с пагинацией
-    contracts = query.offset(skip).limit(limit).all()
+    _validate_ordering(order_by)
     
-    # Рассчитываем актуальные статусы и дни до истечения
-    result = []
-    for contract in contracts:
-        status_info = calculate_contract_status(contract.end_date)
-        
-        # Обновляем статус в базе данных, если он изменился
-        if contract.status != status_info["status"]:
-            contract.status = status_info["status"]
-            db.commit()
-        
-        # Создаем объект с дополнительной информацией
-        contract_dict = {
-            "id": contract.id,
-            "company_name": contract.company_name,
-            "inn": contract.inn,
-            "director": contract.director,
-            "address": contract.address,
-            "end_date": contract.end_date,
-            "status": contract.status,
-            "comments": contract.comments,
-            "has_nd": contract.has_nd,
-            "lawyer_id": contract.lawyer_id,
-            "history": contract.history,
-            "created_at": contract.created_at,
-            "updated_at": contract.updated_at,
-            "days_left": status_info["days_left"]
-        }
+    return order_by, last_end_date, last_id
+
+
+def _validate_ordering(order_by: str):
+    """Проверяет порядок сортировки для курсорной пагинации"""
+    if order_by not in CURSOR_ORDERINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Сортировка должна быть одной из: {', '.join(CURSOR_ORDERINGS)}"
+        )
+
+
+async def get_contracts_page(
+    db: AsyncSession,
+    cursor: str = None,
+    limit: int = 100,
+    order_by: str = "id",
+    status: str = None,
+    lawyer_id: int = None,
+    search: str = None,
+    current_user: User = None,
+    fields: tuple = CONTRACT_VIEWS["summary"]
+):
+    """
+    Получение страницы контрактов с курсорной (keyset) пагинацией.
+    Вместо OFFSET запрос продолжается с позиции последнего контракта
+    предыдущей страницы, поэтому стоимость не зависит от номера страницы.
+    Результаты поиска здесь упорядочиваются по ключу курсора, а не по релевантности
+    """
+    _validate_ordering(order_by)
+    
+    # Актуализируем сохраненные статусы перед фильтрацией по ним
+    await refresh_contract_statuses_if_due(db)
+    
+    stmt = select(Contract, Contract.current_status, Contract.days_left)
+    stmt = _load_list_columns(stmt, fields)
+    stmt = filter_contracts(stmt, status, lawyer_id, search, current_user)
+    
+    # Порядок страниц задается курсором, если он передан
+    if cursor:
+        order_by, last_end_date, last_id = _decode_cursor(cursor)
         
-        result.append(contract_dict)
+        if order_by == "end_date":
+            stmt = stmt.where(tuple_(Contract.end_date, Contract.id) > tuple_(last_end_date, last_id))
+        else:
+            stmt = stmt.where(Contract.id > last_id)
     
-    return result
+    if order_by == "end_date":
+        stmt = stmt.order_by(Contract.end_date, Contract.id)
+    else:
+        stmt = stmt.order_by(Contract.id)
+    
+    # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(order_by, rows[-1][0])
+    
+    return {
+        "items": [contract_to_dict(*row, fields=fields) for row in rows],
+        "next_cursor": next_cursor
+    }
 
 
-def get_contract(db: Session, contract_id: int, current_user: User = None):
+async def get_contract(db: AsyncSession, contract_id: int, current_user: User = None):
     """
     Получение контракта по ID
     Обычные пользователи могут получать информацию только о своих контрактах,
     администраторы могут получать информацию о любых контрактах
     """
-    # Получаем контракт из базы данных
-    contract = db.query(Contract).filter(Contract.id == contract_id).first()
+    # Получаем контракт из базы данных вместе с рассчитанными статусом и днями до истечения
+    row = (await db.execute(
+        select(Contract, Contract.current_status, Contract.days_left)
+        .where(Contract.id == contract_id)
+    )).first()
     
-    if not contract:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Контракт с ID {contract_id} не найден"
         )
     
+    contract, current_status, days_left = row
+    
     # Проверяем права доступа
+    _check_contract_access(contract, current_user)
+    
+    # Полная история в хронологическом порядке возвращается только для одного контракта
+    history = (await db.execute(
+        select(ContractHistory)
+        .where(ContractHistory.contract_id == contract_id)
+        .order_by(ContractHistory.timestamp, ContractHistory.id)
+    )).scalars().all()
+    
+    contract_dict = contract_to_dict(contract, current_status, days_left)
+    contract_dict["history"] = [history_entry_to_dict(entry) for entry in history]
+    
+    return contract_dict
+
+
+async def get_contract_etag(db: AsyncSession, contract_id: int, current_user: User = None) -> str:
+    """
+    ETag контракта по одной строке без загрузки истории (для условного GET)
+    Права доступа проверяются так же, как при чтении контракта
+    """
+    row = (await db.execute(
+        select(Contract.id, Contract.lawyer_id, Contract.version).where(Contract.id == contract_id)
+    )).first()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Контракт с ID {contract_id} не найден"
+        )
+    
+    _check_contract_access(row, current_user)
+    
+    return contract_etag(row.id, row.version)
+
+
+def _check_contract_access(contract: Contract, current_user: User = None):
+    """
+    Проверяет права доступа к контракту
+    Обычные пользователи имеют доступ только к своим контрактам
+    """
     if current_user and current_user.role != "admin" and contract.lawyer_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="У вас нет доступа к этому контракту"
         )
+
+
+def contract_etag(contract_id: int, version: int) -> str:
+    """
+    Слабый ETag контракта: номер версии меняется при каждом сохранении,
+    интервал времени учитывает изменение статуса и days_left
+    """
+    return f'W/"{contract_id}-{version}-{http_cache.time_bucket()}"'
+
+
+def contract_last_modified(contract: dict) -> datetime:
+    """Время последнего изменения контракта (для заголовка Last-Modified)"""
+    return contract["updated_at"] or contract["created_at"]
+
+
+def parse_if_match(if_match: str, contract_id: int):
+    """
+    Разбирает заголовок If-Match и возвращает множество ожидаемых версий контракта.
+    Из ETag контракта сравнивается только номер версии.
+    None означает, что проверка не нужна (заголовка нет или указан "*")
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
     
-    # Рассчитываем актуальный статус и дни до истечения
-    status_info = calculate_contract_status(contract.end_date)
+    versions = set()
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        
+        parts = tag.strip('"').split("-")
+        if len(parts) < 2 or not parts[0].isdigit() or not parts[1].isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Некорректный заголовок If-Match: {if_match}"
+            )
+        
+        # Тег другого контракта не может совпасть с текущей версией
+        if int(parts[0]) == contract_id:
+            versions.add(int(parts[1]))
     
-    # Обновляем статус в базе данных, если он изменился
-    if contract.status != status_info["status"]:
-        contract.status = status_info["status"]
-        db.commit()
-    
-    # Создаем объект с дополнительной информацией
-    contract_dict = {
-        "id": contract.id,
-        "company_name": contract.company_name,
-        "inn": contract.inn,
-        "director": contract.director,
-        "address": contract.address,
-        "end_date": contract.end_date,
-        "status": contract.status,
-        "comments": contract.comments,
-        "has_nd": contract.has_nd,
-        "lawyer_id": contract.lawyer_id,
-        "history": contract.history,
-        "created_at": contract.created_at,
-        "updated_at": contract.updated_at,
-        "days_left": status_info["days_left"]
+    return versions
+
+
+def _version_conflict(contract_id: int, current_version: int):
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Контракт был изменен другим пользователем. Загрузите актуальную версию и повторите сохранение",
+        headers={"ETag": contract_etag(contract_id, current_version)}
+    )
+
+
+def history_entry_to_dict(entry: ContractHistory):
+    """Создает объект записи истории в формате ответа API"""
+    return {
+        "userId": entry.user_id,
+        "username": entry.username,
+        "action": entry.action,
+        "changes": entry.changes or {},
+        "timestamp": entry.timestamp.isoformat()
     }
+
+
+async def get_contract_history(
+    db: AsyncSession,
+    contract_id: int,
+    skip: int = 0,
+    limit: int = 50,
+    current_user: User = None
+):
+    """
+    Получение истории изменений контракта с пагинацией, начиная с последних изменений
+    Обычные пользователи могут получать историю только своих контрактов
+    """
+    contract = await db.get(Contract, contract_id)
     
-    return contract_dict
+    if not contract:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Контракт с ID {contract_id} не найден"
+        )
+    
+    _check_contract_access(contract, current_user)
+    
+    entries = (await db.execute(
+        select(ContractHistory)
+        .where(ContractHistory.contract_id == contract_id)
+        .order_by(ContractHistory.timestamp.desc(), ContractHistory.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )).scalars().all()
+    
+    return [history_entry_to_dict(entry) for entry in entries]
+
+
+async def suggest_local_companies(db: AsyncSession, query: str, limit: int, current_user: User):
+    """
+    Подсказки по компаниям из своих контрактов (поиск по наименованию и ИНН)
+    Возвращает записи в формате подсказок DaData; обычные пользователи
+    получают только компании своих контрактов
+    """
+    stmt = filter_contracts(
+        select(Contract.id, Contract.company_name, Contract.inn, Contract.director, Contract.address)
+        .where(search_service.company_condition(query)),
+        current_user=current_user
+    )
+    dialect_name = db.get_bind().dialect.name
+    stmt = stmt.order_by(search_service.search_rank(query, dialect_name).desc(), Contract.id).limit(limit)
+    
+    return [
+        {
+            "value": row.company_name,
+            "contract_id": row.id,
+            "data": {
+                "inn": row.inn,
+                "address": {"value": row.address},
+                "management": {"name": row.director},
+            },
+        }
+        for row in (await db.execute(stmt)).all()
+    ]
 
 
-def get_contract_by_inn(db: Session, inn: str):
+async def get_contract_by_inn(db: AsyncSession, inn: str):
     """Получение контракта по ИНН"""
-    return db.query(Contract).filter(Contract.inn == inn).first()
+    return (await db.execute(select(Contract).where(Contract.inn == inn))).scalars().first()
 
 
-def create_contract(db: Session, contract: ContractCreate, current_user: User):
+async def create_contract(db: AsyncSession, contract: ContractCreate, current_user: User):
     """Создание нового контракта"""
     # Проверяем, что контракт с таким ИНН еще не существует
-    existing_contract = get_contract_by_inn(db, contract.inn)
+    existing_contract = await get_contract_by_inn(db, contract.inn)
     
     if existing_contract:
         raise HTTPException(
@@ -178,7 +634,7 @@ def create_contract(db: Session, contract: ContractCreate, current_user: User):
             )
         
         # Проверяем существование юриста
-        lawyer = db.query(User).filter(User.id == lawyer_id).first()
+        lawyer = await db.get(User, lawyer_id)
         
         if not lawyer:
             raise HTTPException(
@@ -189,15 +645,6 @@ def create_contract(db: Session, contract: ContractCreate, current_user: User):
     # Рассчитываем статус контракта
     status_info = calculate_contract_status(contract.end_date)
     
-    # Создаем запись в истории
-    history_entry = ContractHistoryEntry(
-        userId=current_user.id,
-        username=current_user.username,
-        action="create",
-        changes={},
-        timestamp=datetime.utcnow().isoformat()
-    )
-    
     # Создаем новый контракт
     db_contract = Contract(
         company_name=contract.company_name,
@@ -209,27 +656,76 @@ def create_contract(db: Session, contract: ContractCreate, current_user: User):
         comments=contract.comments,
         has_nd=contract.has_nd,
         lawyer_id=lawyer_id,
-        history=[history_entry.dict()]
+        history_entries=[
+            # Создаем запись в истории
+            ContractHistory(
+                user_id=current_user.id,
+                username=current_user.username,
+                action="create",
+                changes={}
+            )
+        ]
     )
     
     db.add(db_contract)
-    db.commit()
-    db.refresh(db_contract)
+    await stats_service.track_contract_change(db, new=(lawyer_id, db_contract.status))
+    await db.commit()
     
     # Добавляем информацию о днях до истечения
-    contract_dict = get_contract(db, db_contract.id)
+    contract_dict = await get_contract(db, db_contract.id)
     
     return contract_dict
 
 
-def update_contract(db: Session, contract_id: int, contract_update: ContractUpdate, current_user: User):
+def apply_contract_changes(db_contract: Contract, update_data: dict):
+    """
+    Применяет изменения к контракту и возвращает различия полей для истории
+    Если изменилась дата окончания, статус пересчитывается
+    """
+    changes = {}
+    
+    for key, value in update_data.items():
+        old_value = getattr(db_contract, key)
+        
+        # Если значение изменилось
+        if old_value != value:
+            # Для дат преобразуем в строку
+            if key == 'end_date' and old_value and value:
+                old_str = old_value.isoformat()
+                new_str = value.isoformat()
+                changes[key] = {"old": old_str, "new": new_str}
+            else:
+                changes[key] = {"old": old_value, "new": value}
+            
+            # Обновляем значение
+            setattr(db_contract, key, value)
+    
+    if 'end_date' in update_data:
+        status_info = calculate_contract_status(db_contract.end_date)
+        db_contract.status = status_info["status"]
+    
+    return changes
+
+
+async def update_contract(
+    db: AsyncSession,
+    contract_id: int,
+    contract_update: ContractUpdate,
+    current_user: User,
+    if_match: str = None
+):
     """
     Обновление контракта
     Обычные пользователи могут обновлять только свои контракты,
-    администраторы могут обновлять любые контракты
+    администраторы могут обновлять любые контракты.
+    Если передан If-Match, контракт сохраняется только при совпадении версии;
+    параллельное изменение после чтения обнаруживается по номеру версии в UPDATE.
+    В обоих случаях возвращается 409
     """
+    expected_versions = parse_if_match(if_match, contract_id)
+    
     # Получаем контракт из базы данных
-    db_contract = db.query(Contract).filter(Contract.id == contract_id).first()
+    db_contract = await db.get(Contract, contract_id)
     
     if not db_contract:
         raise HTTPException(
@@ -244,9 +740,12 @@ def update_contract(db: Session, contract_id: int, contract_update: ContractUpda
             detail="У вас нет доступа к этому контракту"
         )
     
+    if expected_versions is not None and db_contract.version not in expected_versions:
+        raise _version_conflict(contract_id, db_contract.version)
+    
     # Если меняется ИНН, проверяем, что новый ИНН не занят
     if contract_update.inn and contract_update.inn != db_contract.inn:
-        existing_contract = get_contract_by_inn(db, contract_update.inn)
+        existing_contract = await get_contract_by_inn(db, contract_update.inn)
         
         if existing_contract:
             raise HTTPException(
@@ -264,7 +763,7 @@ def update_contract(db: Session, contract_id: int, contract_update: ContractUpda
             )
         
         # Проверяем существование юриста
-        lawyer = db.query(User).filter(User.id == contract_update.lawyer_id).first()
+        lawyer = await db.get(User, contract_update.lawyer_id)
         
         if not lawyer:
             raise HTTPException(
@@ -272,56 +771,42 @@ def update_contract(db: Session, contract_id: int, contract_update: ContractUpda
                 detail=f"Юрист с ID {contract_update.lawyer_id} не найден"
             )
     
-    # Отслеживаем изменения для истории
-    changes = {}
-    update_data = contract_update.dict(exclude_unset=True)
+    # Запоминаем юриста и статус для обновления статистики
+    old_bucket = (db_contract.lawyer_id, db_contract.status)
     
-    for key, value in update_data.items():
-        old_value = getattr(db_contract, key)
-        
-        # Если значение изменилось
-        if old_value != value:
-            # Для дат преобразуем в строку
-            if key == 'end_date' and old_value and value:
-                old_str = old_value.isoformat()
-                new_str = value.isoformat()
-                changes[key] = {"old": old_str, "new": new_str}
-            else:
-                changes[key] = {"old": old_value, "new": value}
-            
-            # Обновляем значение
-            setattr(db_contract, key, value)
+    # Применяем изменения и отслеживаем их для истории
+    changes = apply_contract_changes(db_contract, contract_update.dict(exclude_unset=True))
     
-    # Если изменилась дата окончания, пересчитываем статус
-    if 'end_date' in update_data:
-        status_info = calculate_contract_status(db_contract.end_date)
-        db_contract.status = status_info["status"]
-    
-    # Обновляем историю, только если были изменения
+    # Добавляем запись в историю, только если были изменения.
+    # Существующая история при этом не читается и не перезаписывается
     if changes:
-        history_entry = ContractHistoryEntry(
-            userId=current_user.id,
+        db.add(ContractHistory(
+            contract_id=db_contract.id,
+            user_id=current_user.id,
             username=current_user.username,
             action="update",
-            changes=changes,
-            timestamp=datetime.utcnow().isoformat()
-        )
-        
-        # Получаем текущую историю и добавляем новую запись
-        history = db_contract.history if db_contract.history else []
-        history.append(history_entry.dict())
-        db_contract.history = history
+            changes=changes
+        ))
     
-    db.commit()
-    db.refresh(db_contract)
+    await stats_service.track_contract_change(db, old=old_bucket, new=(db_contract.lawyer_id, db_contract.status))
+    
+    try:
+        await db.commit()
+    except StaleDataError:
+        # Между чтением и записью контракт сохранил другой пользователь
+        await db.rollback()
+        current_version = (await db.execute(
+            select(Contract.version).where(Contract.id == contract_id)
+        )).scalar()
+        raise _version_conflict(contract_id, current_version)
     
     # Получаем обновленный контракт с дополнительной информацией
-    return get_contract(db, db_contract.id)
+    return await get_contract(db, contract_id)
 
 
-def delete_contract(db: Session, contract_id: int):
+async def delete_contract(db: AsyncSession, contract_id: int):
     """Удаление контракта"""
-    db_contract = db.query(Contract).filter(Contract.id == contract_id).first()
+    db_contract = await db.get(Contract, contract_id)
     
     if not db_contract:
         raise HTTPException(
@@ -329,77 +814,289 @@ def delete_contract(db: Session, contract_id: int):
             detail=f"Контракт с ID {contract_id} не найден"
         )
     
-    db.delete(db_contract)
-    db.commit()
+    await db.delete(db_contract)
+    await stats_service.track_contract_change(db, old=(db_contract.lawyer_id, db_contract.status))
+    await db.commit()
     
     return {"message": f"Контракт с ID {contract_id} успешно удален"}
 
 
-def get_stats(db: Session, lawyer_id: int = None, current_user: User = None):
+async def bulk_contracts(db: AsyncSession, items: List[ContractBulkItem], current_user: User, atomic: bool = True):
     """
-    Получение статистики по контрактам
-    Обычные пользователи видят только статистику по своим контрактам,
-    администраторы могут видеть статистику по всем контрактам
+    Пакетное создание, изменение, переназначение и удаление контрактов.
+    Контракты, юристы и занятые ИНН для всех операций пакета выбираются
+    тремя запросами, операции проверяются в памяти, изменения записываются
+    одной транзакцией (atomic) или пакетами по BULK_CHUNK_SIZE операций.
+    Возвращает результат по каждой операции
     """
-    query = db.query(Contract)
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Слишком много операций в пакете: {len(items)}, максимум {BULK_MAX_ITEMS}"
+        )
     
-    # Обычные пользователи видят только свои контракты
-    if current_user and current_user.role != "admin" and not lawyer_id:
-        lawyer_id = current_user.id
+    results = [None] * len(items)
+    indexed = list(enumerate(items))
+    chunk_size = len(items) if atomic else BULK_CHUNK_SIZE
     
-    # Фильтрация по юристу
-    if lawyer_id:
-        query = query.filter(Contract.lawyer_id == lawyer_id)
+    for start in range(0, len(indexed), chunk_size):
+        await _apply_bulk_chunk(db, indexed[start:start + chunk_size], current_user, atomic, results)
     
-    # Получаем все контракты
-    contracts = query.all()
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    return {
+        "atomic": atomic,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+async def _prefetch_bulk_chunk(db: AsyncSession, chunk: list, current_user: User):
+    """Загружает контракты, существующих юристов и владельцев ИНН для операций пакета"""
+    contract_ids = {item.id for _, item in chunk if item.action != "create" and item.id is not None}
+    lawyer_ids = {current_user.id}
+    inns = set()
     
-    # Обновляем статусы контрактов
-    for contract in contracts:
-        status_info = calculate_contract_status(contract.end_date)
-        if contract.status != status_info["status"]:
-            contract.status = status_info["status"]
+    for _, item in chunk:
+        if item.action == "create" and item.contract:
+            inns.add(item.contract.inn)
+            lawyer_ids.add(item.contract.lawyer_id or current_user.id)
+        elif item.action == "update" and item.changes:
+            if item.changes.inn:
+                inns.add(item.changes.inn)
+            if item.changes.lawyer_id:
+                lawyer_ids.add(item.changes.lawyer_id)
+        elif item.action == "reassign" and item.lawyer_id:
+            lawyer_ids.add(item.lawyer_id)
     
-    # Фиксируем изменения в базе данных
-    db.commit()
+    contracts = {}
+    if contract_ids:
+        contracts = {
+            contract.id: contract
+            for contract in (await db.execute(select(Contract).where(Contract.id.in_(contract_ids)))).scalars()
+        }
     
-    # Считаем статистику
-    total = len(contracts)
-    active = sum(1 for c in contracts if c.status == "active")
-    expiring_soon = sum(1 for c in contracts if c.status == "expiring_soon")
-    expired = sum(1 for c in contracts if c.status == "expired")
-    
-    stats = {
-        "total": total,
-        "active": active,
-        "expiring_soon": expiring_soon,
-        "expired": expired
-    }
+    lawyers = set((await db.execute(select(User.id).where(User.id.in_(lawyer_ids)))).scalars())
     
-    # Если запрос от администратора и не указан конкретный юрист,
-    # добавляем статистику по каждому юристу
-    if current_user and current_user.role == "admin" and not lawyer_id:
-        per_lawyer = {}
+    inn_owners = {}
+    if inns:
+        inn_owners = dict((await db.execute(select(Contract.inn, Contract.id).where(Contract.inn.in_(inns)))).all())
+    
+    return contracts, lawyers, inn_owners
+
+
+def _validate_bulk_item(item: ContractBulkItem, current_user: User, contracts: dict, lawyers: set, inn_owners: dict, deleted: set):
+    """
+    Проверяет операцию пакета по предварительно загруженным данным.
+    Учитывает предыдущие операции пакета: занятые ИНН и удаленные контракты.
+    Возвращает текст ошибки или None
+    """
+    if item.action == "create":
+        if not item.contract:
+            return "Для создания контракта нужно поле contract"
         
-        # Получаем всех юристов
-        lawyers = db.query(User).all()
+        lawyer_id = item.contract.lawyer_id or current_user.id
+        if lawyer_id not in lawyers:
+            return f"Юрист с ID {lawyer_id} не найден"
         
-        for lawyer in lawyers:
-            lawyer_contracts = db.query(Contract).filter(Contract.lawyer_id == lawyer.id).all()
+        if item.contract.inn in inn_owners:
+            return f"Контракт с ИНН {item.contract.inn} уже существует"
+        
+        inn_owners[item.contract.inn] = None
+        return None
+    
+    if item.id is None:
+        return "Не указан ID контракта"
+    
+    contract = contracts.get(item.id)
+    if contract is None or item.id in deleted:
+        return f"Контракт с ID {item.id} не найден"
+    
+    if item.version is not None and item.version != contract.version:
+        return "Контракт был изменен другим пользователем"
+    
+    if item.action == "delete":
+        deleted.add(item.id)
+        return None
+    
+    if item.action == "reassign":
+        if not item.lawyer_id:
+            return "Для переназначения нужно поле lawyer_id"
+        if item.lawyer_id not in lawyers:
+            return f"Юрист с ID {item.lawyer_id} не найден"
+        return None
+    
+    if not item.changes:
+        return "Для изменения контракта нужно поле changes"
+    
+    if item.changes.lawyer_id and item.changes.lawyer_id not in lawyers:
+        return f"Юрист с ID {item.changes.lawyer_id} не найден"
+    
+    inn = item.changes.inn
+    if inn and inn != contract.inn:
+        if inn in inn_owners and inn_owners[inn] != contract.id:
+            return f"Контракт с ИНН {inn} уже существует"
+        inn_owners[inn] = contract.id
+    
+    return None
+
+
+async def _apply_bulk_chunk(db: AsyncSession, chunk: list, current_user: User, atomic: bool, results: list):
+    """Проверяет и применяет операции одного пакета в одной транзакции"""
+    contracts, lawyers, inn_owners = await _prefetch_bulk_chunk(db, chunk, current_user)
+    
+    planned = []
+    deleted = set()
+    for index, item in chunk:
+        error = _validate_bulk_item(item, current_user, contracts, lawyers, inn_owners, deleted)
+        results[index] = {
+            "index": index,
+            "action": item.action,
+            "id": item.id,
+            "status": "error" if error else "ok",
+            "version": None,
+            "error": error,
+        }
+        if not error:
+            planned.append((index, item))
+    
+    # В атомарном режиме при любой ошибке пакет не применяется
+    if atomic and len(planned) < len(chunk):
+        for index, _ in planned:
+            results[index].update(status="skipped", error="Операция не применена из-за ошибок в пакете")
+        return
+    
+    if not planned:
+        return
+    
+    # Изменения статистики копятся по парам (юрист, статус) и применяются в конце
+    stats_deltas = {}
+    history = []
+    written = {}
+    
+    def track(bucket, delta):
+        stats_deltas[bucket] = stats_deltas.get(bucket, 0) + delta
+    
+    try:
+        for index, item in planned:
+            if item.action == "create":
+                lawyer_id = item.contract.lawyer_id or current_user.id
+                contract = Contract(
+                    **item.contract.dict(exclude={"lawyer_id"}),
+                    lawyer_id=lawyer_id,
+                    status=calculate_contract_status(item.contract.end_date)["status"]
+                )
+                db.add(contract)
+                history.append((contract, "create", {}))
+                track((contract.lawyer_id, contract.status), 1)
             
-            # Подсчитываем статистику для каждого юриста
-            lawyer_total = len(lawyer_contracts)
-            lawyer_active = sum(1 for c in lawyer_contracts if c.status == "active")
-            lawyer_expiring_soon = sum(1 for c in lawyer_contracts if c.status == "expiring_soon")
-            lawyer_expired = sum(1 for c in lawyer_contracts if c.status == "expired")
+            elif item.action == "delete":
+                contract = contracts[item.id]
+                track((contract.lawyer_id, contract.status), -1)
+                await db.delete(contract)
             
-            per_lawyer[lawyer.username] = {
-                "total": lawyer_total,
-                "active": lawyer_active,
-                "expiring_soon": lawyer_expiring_soon,
-                "expired": lawyer_expired
-            }
+            else:
+                contract = contracts[item.id]
+                old_bucket = (contract.lawyer_id, contract.status)
+                update_data = (
+                    item.changes.dict(exclude_unset=True) if item.action == "update"
+                    else {"lawyer_id": item.lawyer_id}
+                )
+                changes = apply_contract_changes(contract, update_data)
+                if changes:
+                    history.append((contract, item.action, changes))
+                track(old_bucket, -1)
+                track((contract.lawyer_id, contract.status), 1)
+            
+            written[index] = contract
+        
+        # Статистика изменяется до записи контрактов: порядок блокировок тот же,
+        # что у update_contract и apply_status_transitions (см. stats_service.lock_contract_stats)
+        for (lawyer_id, contract_status), delta in stats_deltas.items():
+            if delta:
+                await stats_service.adjust_contract_stats(db, lawyer_id, contract_status, delta)
+        
+        # Контракты записываются одним сбросом сессии (новым контрактам назначаются ID),
+        # затем добавляются записи истории
+        await db.flush()
+        
+        timestamp = datetime.utcnow()
+        db.add_all([
+            ContractHistory(
+                contract_id=contract.id,
+                user_id=current_user.id,
+                username=current_user.username,
+                action=action,
+                changes=changes,
+                timestamp=timestamp
+            )
+            for contract, action, changes in history
+        ])
         
+        await db.commit()
+    
+    except (StaleDataError, DBAPIError) as e:
+        # Параллельное изменение, нарушение уникальности или ошибка базы данных
+        # (например, взаимная блокировка) - пакет откатывается целиком
+        await db.rollback()
+        if isinstance(e, StaleDataError):
+            error = "Контракт был изменен другим пользователем"
+        elif isinstance(e, IntegrityError):
+            error = "Нарушено ограничение целостности данных"
+        else:
+            error = "Ошибка базы данных при записи пакета, повторите операцию"
+        for index, _ in planned:
+            results[index].update(status="error", error=error)
+        return
+    
+    for index, item in planned:
+        contract = written[index]
+        results[index]["id"] = contract.id
+        if item.action != "delete":
+            results[index]["version"] = contract.version
+
+
+async def get_stats_etag(db: AsyncSession, lawyer_id: int = None, current_user: User = None) -> str:
+    """
+    Слабый ETag статистики: агрегаты по контрактам в области видимости
+    и по пользователям (имена юристов входят в per_lawyer)
+    """
+    contracts = filter_contracts(
+        select(func.count(Contract.id), func.max(func.coalesce(Contract.updated_at, Contract.created_at))),
+        lawyer_id=lawyer_id, current_user=current_user
+    )
+    users = select(func.count(User.id), func.max(func.coalesce(User.updated_at, User.created_at)))
+    
+    return http_cache.weak_etag(
+        "stats", tuple((await db.execute(contracts)).one()), tuple((await db.execute(users)).one()),
+        lawyer_id, _user_scope(current_user), STATUS_MODE, http_cache.time_bucket()
+    )
+
+
+async def get_stats(db: AsyncSession, lawyer_id: int = None, current_user: User = None):
+    """
+    Получение статистики по контрактам
+    Обычные пользователи видят только статистику по своим контрактам,
+    администраторы могут видеть статистику по всем контрактам.
+    Счетчики contract_stats ведутся по сохраненным статусам в любом режиме
+    STATUS_MODE: контракт, срок которого подошел, учитывается в новом статусе
+    после проверки сроков планировщиком (EXPIRY_SCHEDULER=app или worker).
+    Без планировщика статистика сходится только при STATUS_REFRESH_ON_READ=1
+    """
+    # Обычные пользователи видят только свои контракты
+    if current_user and current_user.role != "admin" and not lawyer_id:
+        lawyer_id = current_user.id
+    
+    # Актуализируем сохраненные статусы перед подсчетом
+    await refresh_contract_statuses_if_due(db, stored_only=False)
+    
+    # Статистика читается из материализованной таблицы за O(юристов)
+    per_lawyer = await stats_service.get_lawyer_stats(db, lawyer_id)
+    stats = stats_service.get_totals(per_lawyer)
+    
+    # Если запрос от администратора и не указан конкретный юрист,
+    # добавляем статистику по каждому юристу
+    if current_user and current_user.role == "admin" and not lawyer_id:
         stats["per_lawyer"] = per_lawyer
     
-    return stats
\ No newline at end of file
+    return stats
@@ -1,126 +1,465 @@
 """
 Сервис для работы с API DaData
 """
+import asyncio
+import logging
 import os
+import random
+import time
 from typing import Optional, Dict, Any, List
 
-from dadata import Dadata
+import httpx
 from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from app.core.cache import create_cache, MISSING
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Получаем API-ключи из переменных окружения
 TOKEN = os.getenv("DADATA_TOKEN")
 SECRET = os.getenv("DADATA_SECRET")
 
+# Адрес API подсказок DaData
+DADATA_BASE_URL = os.getenv("DADATA_BASE_URL", "https://suggestions.dadata.ru/suggestions/api/4_1/rs")
+
+# Таймауты (в секундах) на установку соединения и чтение ответа
+DADATA_CONNECT_TIMEOUT = float(os.getenv("DADATA_CONNECT_TIMEOUT", 3))
+DADATA_READ_TIMEOUT = float(os.getenv("DADATA_READ_TIMEOUT", 5))
+
+# Повторы при сетевых ошибках, 429 и 5xx: число повторов и базовая задержка
+# (задержка растет экспоненциально, к ней добавляется случайная составляющая)
+DADATA_RETRIES = int(os.getenv("DADATA_RETRIES", 2))
+DADATA_RETRY_BACKOFF = float(os.getenv("DADATA_RETRY_BACKOFF", 0.2))
+
+# Автомат отключения: после DADATA_BREAKER_THRESHOLD неудачных запросов подряд
+# обращения к DaData прекращаются на DADATA_BREAKER_RESET секунд
+DADATA_BREAKER_THRESHOLD = int(os.getenv("DADATA_BREAKER_THRESHOLD", 5))
+DADATA_BREAKER_RESET = float(os.getenv("DADATA_BREAKER_RESET", 30))
+
+# Кэш карточек компаний по ИНН: срок жизни найденных записей,
+# срок жизни отметки "не найдено" и максимальное число записей в памяти
+DADATA_CACHE_TTL = float(os.getenv("DADATA_CACHE_TTL", 24 * 60 * 60))
+DADATA_NEGATIVE_CACHE_TTL = float(os.getenv("DADATA_NEGATIVE_CACHE_TTL", 60 * 60))
+DADATA_CACHE_SIZE = int(os.getenv("DADATA_CACHE_SIZE", 10000))
+
+# Кэш подсказок по тексту запроса и минимальная длина запроса
+DADATA_SUGGEST_CACHE_TTL = float(os.getenv("DADATA_SUGGEST_CACHE_TTL", 60 * 60))
+DADATA_SUGGEST_CACHE_SIZE = int(os.getenv("DADATA_SUGGEST_CACHE_SIZE", 5000))
+SUGGEST_MIN_LENGTH = 3
+
+# Сколько начал запроса (от самого длинного) проверяется в кэше подсказок
+SUGGEST_PREFIX_PROBES = int(os.getenv("SUGGEST_PREFIX_PROBES", 8))
+
+# Пакетные запросы: максимум ИНН в одном запросе и одновременных обращений к DaData
+DADATA_BATCH_MAX = int(os.getenv("DADATA_BATCH_MAX", 200))
+DADATA_BATCH_CONCURRENCY = int(os.getenv("DADATA_BATCH_CONCURRENCY", 8))
+
+# Текст ошибки для ИНН, по которому DaData не нашла компанию
+COMPANY_NOT_FOUND = "Компания не найдена"
+
+# Коды ответа, при которых запрос повторяется
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Автомат отключения внешнего сервиса
+    closed - запросы проходят; open - запросы отклоняются до истечения reset_timeout;
+    half_open - пропускается один пробный запрос, его результат закрывает или снова открывает автомат
+    """
+
+    def __init__(self, failure_threshold: int = DADATA_BREAKER_THRESHOLD, reset_timeout: float = DADATA_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Разрешает ли автомат выполнить запрос"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_progress:
+            self.trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"DaData недоступна: {self.failures} ошибок подряд, запросы приостановлены")
+            self.opened_at = time.monotonic()
+
 
 class DadataService:
     """Сервис для работы с API DaData"""
 
-    def __init__(self, token: Optional[str] = None, secret: Optional[str] = None):
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        secret: Optional[str] = None,
+        cache=None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        base_url: str = DADATA_BASE_URL,
+    ):
         """
         Инициализация сервиса DaData
         :param token: API-ключ DaData
         :param secret: Секретный ключ DaData
+        :param cache: Кэш карточек компаний (по умолчанию создается по CACHE_BACKEND)
+        :param transport: Транспорт httpx (для подмены HTTP-сервера при проверках)
+        :param base_url: Адрес API подсказок
         """
         self.token = token or TOKEN
         self.secret = secret or SECRET
-        self.dadata = Dadata(self.token, self.secret)
+        self.base_url = base_url
+        self.transport = transport
+        self.cache = cache if cache is not None else create_cache(
+            "dadata_party", maxsize=DADATA_CACHE_SIZE, ttl=DADATA_CACHE_TTL
+        )
+        self.suggest_cache = create_cache(
+            "dadata_suggest", maxsize=DADATA_SUGGEST_CACHE_SIZE, ttl=DADATA_SUGGEST_CACHE_TTL
+        )
+        self.breaker = CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+        # Выполняющиеся запросы к DaData (карточки по ИНН и подсказки),
+        # к которым присоединяются одинаковые одновременные вызовы
+        self._in_flight: Dict[Any, asyncio.Task] = {}
 
-    def get_company_by_inn(self, inn: str) -> Optional[Dict[str, Any]]:
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP-клиент с пулом соединений, создается при первом запросе"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self.transport,
+                timeout=httpx.Timeout(DADATA_READ_TIMEOUT, connect=DADATA_CONNECT_TIMEOUT),
+                headers={
+                    "Authorization": f"Token {self.token}",
+                    "Content-Type": "application/json",
+                    "Accept": "application/json",
+                },
+            )
+        return self._client
+
+    async def aclose(self):
+        """Закрывает HTTP-клиент"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST-запрос к DaData с повторами и автоматом отключения
+        При недоступности сервиса возвращает 503
+        """
+        unavailable = HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис DaData временно недоступен"
+        )
+        
+        if not self.breaker.allow():
+            raise unavailable
+        
+        # Пробный запрос полуоткрытого автомата: флаг снимается при любом исходе,
+        # в том числе при непредвиденном исключении или отмене запроса
+        trial = self.breaker.trial_in_progress
+        try:
+            return await self._post_with_retries(path, payload, unavailable)
+        finally:
+            if trial:
+                self.breaker.trial_in_progress = False
+
+    async def _post_with_retries(self, path: str, payload: Dict[str, Any], unavailable: HTTPException) -> Dict[str, Any]:
+        """Запрос с повторами; результат учитывается автоматом отключения"""
+        for attempt in range(DADATA_RETRIES + 1):
+            try:
+                response = await self.client.post(path, json=payload)
+                
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    self.breaker.record_success()
+                    return response.json()
+                
+                error = f"HTTP {response.status_code}"
+            
+            except httpx.HTTPStatusError as e:
+                # Ошибки 4xx (кроме 429) повторять бессмысленно
+                self.breaker.record_success()
+                logger.error(f"DaData отклонила запрос {path}: HTTP {e.response.status_code}")
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail="Ошибка запроса к DaData"
+                )
+            
+            except (httpx.TransportError, ValueError) as e:
+                error = f"{type(e).__name__}: {e}"
+            
+            if attempt < DADATA_RETRIES:
+                # Экспоненциальная задержка со случайной составляющей, чтобы повторы не совпадали
+                delay = DADATA_RETRY_BACKOFF * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+        
+        self.breaker.record_failure()
+        logger.error(f"Ошибка при обращении к DaData {path} после {DADATA_RETRIES + 1} попыток: {error}")
+        raise unavailable
+
+    async def get_company_by_inn(self, inn: str) -> Optional[Dict[str, Any]]:
         """
         Получение информации о компании по ИНН
+        Ответы кэшируются по ИНН, включая отсутствие компании (на меньший срок);
+        ошибки запроса не кэшируются. Одновременные запросы одного ИНН
+        объединяются в один запрос к DaData
         :param inn: ИНН компании
         :return: Информация о компании или None, если компания не найдена
         """
+        inn = (inn or "").strip()
         if not inn:
             return None
         
-        try:
-            result = self.dadata.find_by_id("party", inn)
-            if result and len(result) > 0:
-                return result[0]
-            return None
-        except Exception as e:
-            print(f"Ошибка при получении данных из DaData: {str(e)}")
-            return None
+        company = await self.cache.get(inn, MISSING)
+        if company is not MISSING:
+            return company
+        
+        return await self._coalesce(("party", inn), lambda: self._fetch_company(inn))
 
-    def get_company_address(self, inn: str) -> Optional[str]:
+    async def _coalesce(self, key, factory):
+        """
+        Выполняет запрос factory() или присоединяется к уже выполняющемуся запросу с тем же ключом
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        
+        # shield: отмена одного из ожидающих запросов не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _fetch_company(self, inn: str) -> Optional[Dict[str, Any]]:
+        """Запрашивает карточку компании в DaData и сохраняет результат в кэш"""
+        result = await self._post("/findById/party", {"query": inn})
+        suggestions = result.get("suggestions") or []
+        
+        if suggestions:
+            await self.cache.set(inn, suggestions[0])
+            return suggestions[0]
+        
+        await self.cache.set(inn, None, ttl=DADATA_NEGATIVE_CACHE_TTL)
+        return None
+
+    async def get_company_address(self, inn: str) -> Optional[str]:
         """
         Получение адреса компании по ИНН
         :param inn: ИНН компании
         :return: Юридический адрес компании или None, если адрес не найден
         """
-        company = self.get_company_by_inn(inn)
+        company = await self.get_company_by_inn(inn)
         if company and 'data' in company and 'address' in company['data']:
             return company['data']['address'].get('value')
         return None
 
-    def get_company_name(self, inn: str) -> Optional[str]:
+    async def get_company_name(self, inn: str) -> Optional[str]:
         """
         Получение наименования компании по ИНН
         :param inn: ИНН компании
         :return: Наименование компании или None, если компания не найдена
         """
-        company = self.get_company_by_inn(inn)
+        company = await self.get_company_by_inn(inn)
         if company and 'value' in company:
             return company['value']
         return None
 
-    def get_company_director(self, inn: str) -> Optional[str]:
+    async def get_company_director(self, inn: str) -> Optional[str]:
         """
         Получение ФИО руководителя компании по ИНН
         :param inn: ИНН компании
         :return: ФИО руководителя или None, если информация не найдена
         """
-        company = self.get_company_by_inn(inn)
+        company = await self.get_company_by_inn(inn)
         if company and 'data' in company and 'management' in company['data']:
             management = company['data']['management']
             if management and 'name' in management:
                 return management['name']
         return None
 
-    def suggest_companies(self, query: str, count: int = 5) -> List[Dict[str, Any]]:
+    async def suggest_companies(self, query: str, count: int = 5) -> List[Dict[str, Any]]:
         """
         Поиск компаний по части наименования или ИНН
         :param query: Часть наименования или ИНН
         :param count: Количество результатов (по умолчанию 5)
         :return: Список найденных компаний
         """
-        try:
-            result = self.dadata.suggest("party", query, count=count)
-            return result
-        except Exception as e:
-            print(f"Ошибка при поиске компаний в DaData: {str(e)}")
-            return []
+        key = normalize_query(query)
+        
+        cached = await self._cached_suggestions(key, count)
+        if cached is not None:
+            return cached
+        
+        return await self._coalesce(("suggest", key, count), lambda: self._fetch_suggestions(query, key, count))
+
+    async def _cached_suggestions(self, key: str, count: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ищет подсказки в кэше: сначала по самому запросу, затем по его началу.
+        Ответ для начала запроса ("рога") подходит для продолжения ("рога и"),
+        если DaData вернула меньше подсказок, чем запрашивалось, т.е. список полный;
+        тогда он фильтруется по словам запроса.
+        Запрос и не более SUGGEST_PREFIX_PROBES его начал читаются из кэша
+        одним обращением (для Redis - один MGET), промах учитывается один раз
+        """
+        prefixes = [
+            key[:end] for end in range(len(key) - 1, SUGGEST_MIN_LENGTH - 1, -1)
+            if not key[:end].endswith(" ")
+        ][:SUGGEST_PREFIX_PROBES]
+        entry, *prefix_entries = await self.suggest_cache.get_many([key] + prefixes)
+        
+        if entry and (count <= entry["count"] or len(entry["suggestions"]) < entry["count"]):
+            return entry["suggestions"][:count]
+        
+        words = key.split()
+        for entry in prefix_entries:
+            if entry and len(entry["suggestions"]) < entry["count"]:
+                return [
+                    suggestion for suggestion in entry["suggestions"]
+                    if suggestion_matches(suggestion, words)
+                ][:count]
+        
+        return None
+
+    async def _fetch_suggestions(self, query: str, key: str, count: int) -> List[Dict[str, Any]]:
+        """Запрашивает подсказки в DaData и сохраняет их в кэш"""
+        result = await self._post("/suggest/party", {"query": query, "count": count})
+        suggestions = result.get("suggestions") or []
+        await self.suggest_cache.set(key, {"count": count, "suggestions": suggestions})
+        return suggestions
 
-    def get_company_full_info(self, inn: str) -> Optional[Dict[str, Any]]:
+    async def get_company_full_info(self, inn: str) -> Optional[Dict[str, Any]]:
         """
         Получение полной информации о компании по ИНН
         :param inn: ИНН компании
         :return: Полная информация о компании
         """
-        company = self.get_company_by_inn(inn)
+        company = await self.get_company_by_inn(inn)
         if not company:
             return None
+        
+        return company_summary(company)
+
+    async def get_companies(self, inns: List[str], concurrency: int = DADATA_BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+        """
+        Получение информации о нескольких компаниях
+        Записи из кэша возвращаются сразу, остальные запрашиваются не более чем
+        concurrency запросами одновременно. Ошибка по одному ИНН не прерывает остальные
+        :param inns: Список ИНН (повторы объединяются)
+        :param concurrency: Максимум одновременных запросов к DaData
+        :return: Список {"inn", "company", "error"} в порядке первых вхождений ИНН
+        """
+        unique_inns = list(dict.fromkeys((inn or "").strip() for inn in inns))
+        results = {inn: {"inn": inn, "company": None, "error": None} for inn in unique_inns}
+        
+        pending = []
+        for inn in unique_inns:
+            if not inn.isdigit() or len(inn) not in (10, 12):
+                results[inn]["error"] = "Некорректный ИНН"
+                continue
             
-        # Формируем структурированный ответ
-        result = {
-            "name": company.get('value'),
-            "inn": company.get('data', {}).get('inn'),
-            "kpp": company.get('data', {}).get('kpp'),
-            "ogrn": company.get('data', {}).get('ogrn'),
-            "address": company.get('data', {}).get('address', {}).get('value'),
-            "status": company.get('data', {}).get('state', {}).get('status'),
-            "registration_date": company.get('data', {}).get('state', {}).get('registration_date'),
-            "director": company.get('data', {}).get('management', {}).get('name'),
-            "director_position": company.get('data', {}).get('management', {}).get('post'),
-            "okved": company.get('data', {}).get('okved'),
-            "okved_name": company.get('data', {}).get('okved_type') 
-        }
-        
-        return result
+            company = await self.cache.get(inn, MISSING)
+            if company is MISSING:
+                pending.append(inn)
+            elif company is None:
+                results[inn]["error"] = COMPANY_NOT_FOUND
+            else:
+                results[inn]["company"] = company_summary(company)
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch(inn: str):
+            async with semaphore:
+                try:
+                    company = await self.get_company_by_inn(inn)
+                except HTTPException as e:
+                    results[inn]["error"] = e.detail
+                    return
+            
+            if company:
+                results[inn]["company"] = company_summary(company)
+            else:
+                results[inn]["error"] = COMPANY_NOT_FOUND
+        
+        await asyncio.gather(*(fetch(inn) for inn in pending))
+        
+        return list(results.values())
+
+
+def normalize_query(query: str) -> str:
+    """Приводит текст запроса подсказок к ключу кэша"""
+    return " ".join(query.lower().split())
+
+
+def suggestion_matches(suggestion: Dict[str, Any], words: List[str]) -> bool:
+    """Содержит ли подсказка (наименование или ИНН) все слова запроса"""
+    data = suggestion.get("data") or {}
+    text = f"{suggestion.get('value') or ''} {data.get('inn') or ''}".lower()
+    return all(word in text for word in words)
+
+
+def merge_suggestions(local: List[Dict[str, Any]], remote: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+    """
+    Объединяет подсказки по своим контрактам и подсказки DaData
+    Свои контракты идут первыми, компании DaData с теми же ИНН пропускаются.
+    Каждая подсказка помечается источником (source: local или dadata)
+    """
+    merged = [{**suggestion, "source": "local"} for suggestion in local]
+    seen_inns = {(suggestion.get("data") or {}).get("inn") for suggestion in local}
+    
+    for suggestion in remote:
+        if (suggestion.get("data") or {}).get("inn") not in seen_inns:
+            merged.append({**suggestion, "source": "dadata"})
+    
+    return merged[:count]
+
+
+def company_summary(company: Dict[str, Any]) -> Dict[str, Any]:
+    """Формирует структурированный ответ по карточке компании DaData"""
+    # Вложенные блоки могут приходить как null (например, management у ИП)
+    data = company.get('data') or {}
+    address = data.get('address') or {}
+    state = data.get('state') or {}
+    management = data.get('management') or {}
+    
+    return {
+        "name": company.get('value'),
+        "inn": data.get('inn'),
+        "kpp": data.get('kpp'),
+        "ogrn": data.get('ogrn'),
+        "address": address.get('value'),
+        "status": state.get('status'),
+        "registration_date": state.get('registration_date'),
+        "director": management.get('name'),
+        "director_position": management.get('post'),
+        "okved": data.get('okved'),
+        "okved_name": data.get('okved_type')
+    }
 
 
 # Создаем экземпляр сервиса
-dadata_service = DadataService()
\ No newline at end of file
+dadata_service = DadataService()
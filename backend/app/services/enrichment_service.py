@@ -0,0 +1,174 @@
+"""
+Обновление реквизитов контрактов (наименование, руководитель, адрес) по данным DaData
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.base import AsyncSessionLocal
+from app.models.models import Contract, ContractHistory
+from app.services.dadata_service import dadata_service, COMPANY_NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+# Число контрактов, обрабатываемых за один пакетный запрос к DaData и одну транзакцию
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", 100))
+
+# Поля контракта и соответствующие им поля ответа DaData
+ENRICH_FIELDS = {
+    "company_name": "name",
+    "director": "director",
+    "address": "address",
+}
+
+# Состояние последнего запуска (задача выполняется в фоне)
+enrichment_state = {"running": False, "started_at": None, "finished_at": None, "report": None}
+
+
+def _fit_column(field: str, value: str) -> str:
+    """Обрезает значение до длины колонки (наименования из DaData бывают длиннее)"""
+    length = getattr(Contract.__table__.c[field].type, "length", None)
+    return value[:length] if length else value
+
+
+# Пакетный UPDATE через Core (executemany одним запросом): ORM-обновление с version_id_col
+# выполняет отдельный UPDATE для каждой строки. Версия проверяется в WHERE и увеличивается
+_contracts = Contract.__table__
+_enrich_update = (
+    update(_contracts)
+    .where(_contracts.c.id == bindparam("b_id"), _contracts.c.version == bindparam("b_version"))
+    .values(version=_contracts.c.version + 1, **{field: bindparam(f"b_{field}") for field in ENRICH_FIELDS})
+)
+
+
+async def _applied_updates(db: AsyncSession, updates: list) -> set:
+    """
+    Возвращает id контрактов, к которым применился пакетный UPDATE.
+    Число строк executemany драйверы сообщают ненадежно, поэтому строки перечитываются:
+    обновленная строка имеет следующую версию и новые значения полей.
+    Строки, обновленные в этой транзакции, заблокированы до ее фиксации
+    """
+    expected = {item["b_id"]: item for item in updates}
+    rows = (await db.execute(
+        select(Contract.id, Contract.version, *[getattr(Contract, field) for field in ENRICH_FIELDS])
+        .where(Contract.id.in_(expected))
+    )).all()
+    
+    return {
+        row.id for row in rows
+        if row.version == expected[row.id]["b_version"] + 1
+        and all(getattr(row, field) == expected[row.id][f"b_{field}"] for field in ENRICH_FIELDS)
+    }
+
+
+async def refresh_contract_company_data(db: AsyncSession, current_user, batch_size: int = ENRICH_BATCH_SIZE) -> dict:
+    """
+    Обновляет наименование, руководителя и адрес всех контрактов по данным DaData
+    Контракты обходятся пакетами по id; для каждого пакета ИНН запрашиваются
+    параллельно (с ограничением) через DadataService.get_companies.
+    Изменения записываются одним пакетным UPDATE с записью истории "enrich";
+    контракты, измененные параллельно, пропускаются и попадают в ошибки
+    """
+    report = {"checked": 0, "updated": 0, "unchanged": 0, "not_found": 0, "failed": 0, "errors": []}
+    last_id = 0
+    
+    while True:
+        rows = (await db.execute(
+            select(Contract.id, Contract.inn, Contract.version, *[getattr(Contract, field) for field in ENRICH_FIELDS])
+            .where(Contract.id > last_id)
+            .order_by(Contract.id)
+            .limit(batch_size)
+        )).all()
+        
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        results = {
+            item["inn"]: item
+            for item in await dadata_service.get_companies([row.inn for row in rows])
+        }
+        
+        updates = []
+        history = []
+        for row in rows:
+            report["checked"] += 1
+            item = results[row.inn.strip()]
+            
+            if item["error"] == COMPANY_NOT_FOUND:
+                report["not_found"] += 1
+                continue
+            
+            if item["error"]:
+                report["failed"] += 1
+                report["errors"].append({"contract_id": row.id, "inn": row.inn, "error": item["error"]})
+                continue
+            
+            changes = {}
+            for field, source_field in ENRICH_FIELDS.items():
+                new_value = item["company"].get(source_field)
+                if not new_value:
+                    continue
+                
+                new_value = _fit_column(field, new_value)
+                old_value = getattr(row, field)
+                if new_value != old_value:
+                    changes[field] = {"old": old_value, "new": new_value}
+            
+            if not changes:
+                report["unchanged"] += 1
+                continue
+            
+            updates.append({
+                "b_id": row.id,
+                "b_version": row.version,
+                **{f"b_{field}": changes[field]["new"] if field in changes else getattr(row, field) for field in ENRICH_FIELDS},
+            })
+            history.append(ContractHistory(
+                contract_id=row.id,
+                user_id=current_user.id,
+                username=current_user.username,
+                action="enrich",
+                changes=changes,
+                timestamp=datetime.utcnow()
+            ))
+        
+        if updates:
+            await db.execute(_enrich_update, updates)
+            applied = await _applied_updates(db, updates)
+            
+            # История пишется только для примененных изменений; контракты, измененные
+            # параллельно, будут обработаны при следующем запуске
+            db.add_all(entry for entry in history if entry.contract_id in applied)
+            await db.commit()
+            
+            report["updated"] += len(applied)
+            conflicts = [item["b_id"] for item in updates if item["b_id"] not in applied]
+            report["failed"] += len(conflicts)
+            report["errors"].extend(
+                {"contract_id": contract_id, "error": "Контракт изменен во время обновления"}
+                for contract_id in conflicts
+            )
+        
+        logger.info(f"Обновление реквизитов: проверено {report['checked']}, обновлено {report['updated']}")
+    
+    return report
+
+
+async def run_enrichment(current_user):
+    """Запускает обновление реквизитов в отдельной сессии (для фонового выполнения)"""
+    enrichment_state.update(running=True, started_at=datetime.utcnow(), finished_at=None, report=None)
+    
+    try:
+        async with AsyncSessionLocal() as db:
+            enrichment_state["report"] = await refresh_contract_company_data(db, current_user)
+    
+    except Exception as e:
+        logger.exception("Ошибка при обновлении реквизитов контрактов")
+        enrichment_state["report"] = {"error": str(e)}
+    
+    finally:
+        enrichment_state.update(running=False, finished_at=datetime.utcnow())
@@ -0,0 +1,432 @@
+"""
+Плановый перевод контрактов в статусы expiring_soon/expired и уведомление юристов
+Проверку выполняет фоновая задача приложения или отдельный процесс worker.py
+"""
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database.base import AsyncSessionLocal
+from app.models.models import NotificationOutbox, User
+from app.services import contract_service
+
+logger = logging.getLogger(__name__)
+
+# Интервал (в секундах) между проверками сроков; по умолчанию берется прежний интервал сверки статистики
+EXPIRY_CHECK_INTERVAL = int(os.getenv("EXPIRY_CHECK_INTERVAL", os.getenv("STATS_RECONCILE_INTERVAL", 300)))
+
+# Где выполняется проверка: app - фоновая задача API, worker - отдельный процесс worker.py, off - отключена
+EXPIRY_SCHEDULER = os.getenv("EXPIRY_SCHEDULER", "app")
+
+# Ключ advisory-блокировки PostgreSQL, под которой применяются переходы статусов
+EXPIRY_LOCK_KEY = 7246001
+
+# Приемник уведомлений: log, file или smtp
+NOTIFY_SINK = os.getenv("NOTIFY_SINK", "log")
+NOTIFY_FILE = os.getenv("NOTIFY_FILE", "notifications.jsonl")
+
+# Настройки SMTP: письмо уходит на username юриста, если это адрес, иначе на NOTIFY_EMAIL_TO
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+NOTIFY_EMAIL_FROM = os.getenv("NOTIFY_EMAIL_FROM", "contracts@localhost")
+NOTIFY_EMAIL_TO = os.getenv("NOTIFY_EMAIL_TO")
+
+# Число сводок, отправляемых за одну проверку, и срок хранения отправленных
+# и неотправленных (после исчерпания попыток) сводок
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", 500))
+NOTIFY_OUTBOX_RETENTION_DAYS = int(os.getenv("NOTIFY_OUTBOX_RETENTION_DAYS", 30))
+
+# Повторная отправка: максимум попыток, базовая и максимальная задержка (в секундах).
+# Задержка удваивается с каждой неудачной попыткой
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 8))
+NOTIFY_RETRY_BACKOFF = int(os.getenv("NOTIFY_RETRY_BACKOFF", 60))
+NOTIFY_RETRY_BACKOFF_MAX = int(os.getenv("NOTIFY_RETRY_BACKOFF_MAX", 6 * 60 * 60))
+
+# Статусы, о переходе в которые уведомляются юристы
+NOTIFY_STATUSES = ("expiring_soon", "expired")
+
+# Итог последней проверки (для логов и отладки)
+expiry_state = {"last_run_at": None, "transitions": None, "digests": 0, "delivery": None, "error": None}
+
+
+class NotificationSink:
+    """
+    Приемник уведомлений
+    send отправляет сводки и при ошибке выбрасывает исключение;
+    deliver отправляет сводки по отдельности и возвращает ошибку (или None) для каждой
+    """
+
+    def send(self, digests: List[dict]):
+        raise NotImplementedError
+
+    def deliver(self, digests: List[dict]) -> List[Optional[Exception]]:
+        errors = []
+        for digest in digests:
+            try:
+                self.send([digest])
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+
+class LogSink(NotificationSink):
+    """Пишет сводки в журнал приложения"""
+
+    def send(self, digests: List[dict]):
+        for digest in digests:
+            logger.info(
+                f"Сводка для {digest['username'] or 'без юриста'}: "
+                f"истекают {len(digest['expiring_soon'])}, истекли {len(digest['expired'])}"
+            )
+
+
+class FileSink(NotificationSink):
+    """Дописывает сводки в файл, по одному JSON-объекту на строку"""
+
+    def __init__(self, path: str = NOTIFY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, digests: List[dict]):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for digest in digests:
+                f.write(json.dumps(digest, ensure_ascii=False, default=str) + "\n")
+
+
+class SmtpSink(NotificationSink):
+    """
+    Отправляет каждую сводку отдельным письмом через одно SMTP-соединение
+    smtp_factory позволяет подставить заглушку вместо smtplib.SMTP
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.smtp_factory = smtp_factory
+
+    def _recipient(self, digest: dict) -> Optional[str]:
+        username = digest["username"] or ""
+        return username if "@" in username else NOTIFY_EMAIL_TO
+
+    def send(self, digests: List[dict]):
+        for error in self.deliver(digests):
+            if error is not None:
+                raise error
+
+    def deliver(self, digests: List[dict]) -> List[Optional[Exception]]:
+        """
+        Отправляет письма через одно соединение; ошибка одного письма (например,
+        отклоненный адрес) не мешает остальным, ошибка соединения относится ко всем
+        """
+        messages = {}
+        for index, digest in enumerate(digests):
+            recipient = self._recipient(digest)
+            if not recipient:
+                logger.warning(f"Нет адреса для сводки юриста {digest['username']}, письмо не отправлено")
+                continue
+            messages[index] = build_email(digest, recipient)
+        
+        errors = [None] * len(digests)
+        if not messages:
+            return errors
+        
+        try:
+            with self.smtp_factory(self.host, self.port) as smtp:
+                if SMTP_USER:
+                    smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+                for index, message in messages.items():
+                    try:
+                        smtp.send_message(message)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                        errors[index] = e
+        except Exception as e:
+            for index in messages:
+                errors[index] = errors[index] or e
+        
+        return errors
+
+
+SINKS = {
+    "log": LogSink,
+    "file": FileSink,
+    "smtp": SmtpSink,
+}
+
+
+def get_notification_sink(name: str = None):
+    """Создает приемник уведомлений по имени (по умолчанию NOTIFY_SINK)"""
+    name = name or NOTIFY_SINK
+    if name not in SINKS:
+        raise ValueError(f"Неизвестный приемник уведомлений: {name}. Допустимые: {', '.join(SINKS)}")
+    return SINKS[name]()
+
+
+def build_email(digest: dict, recipient: str) -> EmailMessage:
+    """Формирует письмо со сводкой по контрактам юриста"""
+    lines = []
+    titles = {"expiring_soon": "Скоро истекают", "expired": "Истекли"}
+    for status in NOTIFY_STATUSES:
+        if digest[status]:
+            lines.append(f"{titles[status]}:")
+            lines.extend(
+                f"  {item['company_name']} (ИНН {item['inn']}), до {item['end_date'][:10]}"
+                for item in digest[status]
+            )
+            lines.append("")
+    
+    message = EmailMessage()
+    message["Subject"] = f"Сроки контрактов: истекают {len(digest['expiring_soon'])}, истекли {len(digest['expired'])}"
+    message["From"] = NOTIFY_EMAIL_FROM
+    message["To"] = recipient
+    message.set_content("\n".join(lines))
+    return message
+
+
+def build_digests(db: Session, transitions: List[dict], now: datetime = None) -> List[dict]:
+    """
+    Группирует переходы в статусы NOTIFY_STATUSES по юристам
+    Имена юристов загружаются одним запросом
+    """
+    now = now or datetime.utcnow()
+    
+    grouped: Dict[Optional[int], dict] = {}
+    for transition in transitions:
+        if transition["new_status"] not in NOTIFY_STATUSES:
+            continue
+        
+        digest = grouped.setdefault(transition["lawyer_id"], {
+            "lawyer_id": transition["lawyer_id"],
+            "username": None,
+            "generated_at": now.isoformat(),
+            "expiring_soon": [],
+            "expired": [],
+        })
+        digest[transition["new_status"]].append({
+            "id": transition["id"],
+            "company_name": transition["company_name"],
+            "inn": transition["inn"],
+            "end_date": transition["end_date"].isoformat(),
+            "days_left": max((transition["end_date"] - now).days, 0),
+        })
+    
+    lawyer_ids = [lawyer_id for lawyer_id in grouped if lawyer_id is not None]
+    if lawyer_ids:
+        for user_id, username in db.execute(select(User.id, User.username).where(User.id.in_(lawyer_ids))):
+            grouped[user_id]["username"] = username
+    
+    return list(grouped.values())
+
+
+def _acquire_expiry_lock(db: Session) -> bool:
+    """
+    Берет транзакционную advisory-блокировку PostgreSQL, чтобы при нескольких
+    процессах API (EXPIRY_SCHEDULER=app) переходы применял только один из них.
+    Блокировка снимается при фиксации или откате транзакции.
+    В других СУБД блокировка не поддерживается: с SQLite проверку
+    должен выполнять один процесс (worker.py или API с одним воркером)
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    
+    return bool(db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": EXPIRY_LOCK_KEY}).scalar())
+
+
+def collect_expiry_digests(db: Session, now: datetime = None):
+    """
+    Применяет переходы статусов и ставит сводки по юристам в очередь отправки
+    (таблица notification_outbox) в той же транзакции, поэтому сводки
+    не теряются, если отправка не удалась.
+    Возвращает количество переходов по статусам и число поставленных в очередь сводок
+    """
+    now = now or datetime.utcnow()
+    
+    counts = dict.fromkeys(contract_service.CONTRACT_STATUSES, 0)
+    if not _acquire_expiry_lock(db):
+        logger.info("Переходы статусов применяет другой процесс, проверка пропущена")
+        db.rollback()
+        return counts, 0
+    
+    transitions = contract_service.apply_status_transitions(db, now)
+    
+    for transition in transitions:
+        counts[transition["new_status"]] += 1
+    
+    digests = build_digests(db, transitions, now)
+    db.add_all([
+        NotificationOutbox(lawyer_id=digest["lawyer_id"], payload=digest, created_at=now)
+        for digest in digests
+    ])
+    db.commit()
+    
+    return counts, len(digests)
+
+
+def _pending_digests_query(now: datetime):
+    """
+    Сводки к отправке по порядку создания: не отправленные, не исчерпавшие попытки
+    и с наступившим временем следующей попытки.
+    Строки блокируются до конца транзакции (на PostgreSQL заблокированные
+    другим процессом пропускаются), чтобы сводку не отправили дважды
+    """
+    return (
+        select(NotificationOutbox)
+        .where(
+            NotificationOutbox.sent_at.is_(None),
+            NotificationOutbox.failed_at.is_(None),
+            or_(NotificationOutbox.next_attempt_at.is_(None), NotificationOutbox.next_attempt_at <= now),
+        )
+        .order_by(NotificationOutbox.id)
+        .limit(NOTIFY_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Задержка перед следующей попыткой после attempts неудачных"""
+    return timedelta(seconds=min(NOTIFY_RETRY_BACKOFF * 2 ** (attempts - 1), NOTIFY_RETRY_BACKOFF_MAX))
+
+
+def _mark_failed(row: NotificationOutbox, error: Exception, now: datetime):
+    """
+    Учитывает неудачную попытку: назначает следующую с растущей задержкой,
+    после NOTIFY_MAX_ATTEMPTS попыток сводка больше не отправляется (failed_at)
+    """
+    row.attempts += 1
+    row.last_error = str(error)[:1000]
+    
+    if row.attempts >= NOTIFY_MAX_ATTEMPTS:
+        row.failed_at = now
+        logger.error(f"Сводка {row.id} не отправлена после {row.attempts} попыток: {error}")
+    else:
+        row.next_attempt_at = now + retry_delay(row.attempts)
+        logger.warning(f"Не удалось отправить сводку {row.id} (попытка {row.attempts}): {error}")
+
+
+def _apply_delivery(rows: List[NotificationOutbox], errors: List[Optional[Exception]], now: datetime) -> dict:
+    """Отмечает результаты отправки в строках очереди"""
+    result = {"sent": 0, "failed": 0, "dead": 0}
+    
+    for row, error in zip(rows, errors):
+        if error is None:
+            row.sent_at = now
+            result["sent"] += 1
+            continue
+        
+        _mark_failed(row, error, now)
+        result["failed"] += 1
+        if row.failed_at is not None:
+            result["dead"] += 1
+    
+    return result
+
+
+def _deliver(sink, rows: List[NotificationOutbox]) -> List[Optional[Exception]]:
+    """Передает сводки приемнику одним вызовом (одно SMTP-соединение на проверку)"""
+    if not rows:
+        return []
+    
+    try:
+        return sink.deliver([row.payload for row in rows])
+    except Exception as e:
+        return [e] * len(rows)
+
+
+def _purge_outbox_query():
+    """Удаление отправленных и неотправленных после всех попыток сводок старше NOTIFY_OUTBOX_RETENTION_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=NOTIFY_OUTBOX_RETENTION_DAYS)
+    return delete(NotificationOutbox).where(
+        or_(NotificationOutbox.sent_at < cutoff, NotificationOutbox.failed_at < cutoff)
+    )
+
+
+def deliver_pending_digests(db: Session, sink) -> dict:
+    """
+    Отправляет сводки из очереди. Успешно отправленная сводка помечается sent_at;
+    сводка, которую не удалось отправить, повторяется при следующих проверках
+    с растущей задержкой и не задерживает остальные.
+    Если процесс остановится между отправкой и фиксацией, сводка будет отправлена повторно
+    """
+    now = datetime.utcnow()
+    rows = db.execute(_pending_digests_query(now)).scalars().all()
+    result = _apply_delivery(rows, _deliver(sink, rows), now)
+    
+    db.execute(_purge_outbox_query())
+    db.commit()
+    
+    return result
+
+
+async def _deliver_pending_digests_async(db: AsyncSession, sink) -> dict:
+    """То же, что deliver_pending_digests; отправка (возможно, блокирующая) выполняется в отдельном потоке"""
+    now = datetime.utcnow()
+    rows = (await db.execute(_pending_digests_query(now))).scalars().all()
+    result = _apply_delivery(rows, await asyncio.to_thread(_deliver, sink, rows), now)
+    
+    await db.execute(_purge_outbox_query())
+    await db.commit()
+    
+    return result
+
+
+def _record_run(counts: dict, queued: int, delivery: dict) -> dict:
+    expiry_state.update(
+        last_run_at=datetime.utcnow().isoformat(),
+        transitions=counts,
+        digests=queued,
+        delivery=delivery,
+        error=None,
+    )
+    logger.info(
+        f"Проверка сроков контрактов: переходы {counts}, сводок в очереди {queued}, "
+        f"отправлено {delivery['sent']}, ошибок отправки {delivery['failed']}, "
+        f"исчерпаны попытки {delivery['dead']}"
+    )
+    return counts
+
+
+def run_expiry_check(db: Session, sink=None, now: datetime = None) -> dict:
+    """Синхронная проверка сроков (для worker.py): переходы статусов и рассылка сводок"""
+    counts, queued = collect_expiry_digests(db, now)
+    delivery = deliver_pending_digests(db, sink or get_notification_sink())
+    
+    return _record_run(counts, queued, delivery)
+
+
+async def run_expiry_check_async(sink=None) -> dict:
+    """
+    Асинхронная проверка сроков для приложения
+    Переходы выполняются на соединении асинхронной сессии через run_sync,
+    отправка сводок (возможно, блокирующая) - в отдельном потоке
+    """
+    async with AsyncSessionLocal() as db:
+        counts, queued = await db.run_sync(collect_expiry_digests)
+        delivery = await _deliver_pending_digests_async(db, sink or get_notification_sink())
+    
+    return _record_run(counts, queued, delivery)
+
+
+async def run_expiry_scheduler(interval: int = EXPIRY_CHECK_INTERVAL, sink=None):
+    """Периодически проверяет сроки контрактов; ошибка одной проверки не останавливает планировщик"""
+    sink = sink or get_notification_sink()
+    
+    while True:
+        try:
+            await run_expiry_check_async(sink)
+        except Exception as e:
+            expiry_state["error"] = str(e)
+            logger.error(f"Ошибка при проверке сроков контрактов: {e}")
+        
+        await asyncio.sleep(interval)
@@ -0,0 +1,189 @@
+"""
+Потоковая выгрузка контрактов в CSV, XLSX и NDJSON
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+
+from app.database.base import AsyncSessionLocal
+from app.models.models import Contract, User
+from app.services import contract_service
+
+# openpyxl нужен только для выгрузки в формате .xlsx
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Число строк, получаемых из курсора базы данных за один раз
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Размер блока при передаче готового файла .xlsx
+EXPORT_FILE_CHUNK = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def check_export_format(export_format: str):
+    """Проверяет, что формат выгрузки поддерживается в текущем окружении"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестный формат выгрузки: {export_format}. Допустимые: {', '.join(EXPORT_FORMATS)}"
+        )
+    
+    if export_format == "xlsx" and openpyxl is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Выгрузка в .xlsx недоступна: не установлен пакет openpyxl"
+        )
+
+
+def export_filename(export_format: str) -> str:
+    return f"contracts-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+
+
+def _export_statement(fields: tuple, status_filter: str, lawyer_id: int, search: str, current_user: User):
+    """
+    Запрос выгрузки: только нужные колонки (без ORM-объектов),
+    те же фильтры и ограничения доступа, что и у списка контрактов
+    """
+    columns = [
+        getattr(Contract, field) for field in fields
+        if field not in ("status", "days_left")
+    ]
+    if contract_service.STATUS_MODE == "stored":
+        columns.append(Contract.status)
+    
+    stmt = select(*columns, Contract.current_status.label("current_status"), Contract.days_left.label("days_left"))
+    stmt = contract_service.filter_contracts(stmt, status_filter, lawyer_id, search, current_user)
+    
+    # Стабильный порядок по первичному ключу
+    return stmt.order_by(Contract.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+async def _iter_batches(fields: tuple, status_filter: str, lawyer_id: int, search: str, current_user: User):
+    """
+    Выдает пакеты контрактов (списки словарей) из серверного курсора.
+    Сессия открывается на время выгрузки и не зависит от сессии запроса,
+    которая закрывается до окончания передачи ответа
+    """
+    async with AsyncSessionLocal() as db:
+        await contract_service.refresh_contract_statuses_if_due(db)
+        
+        result = await db.stream(_export_statement(fields, status_filter, lawyer_id, search, current_user))
+        async for rows in result.partitions():
+            yield [
+                contract_service.contract_to_dict(row, row.current_status, row.days_left, fields)
+                for row in rows
+            ]
+
+
+# Начальные символы, с которых Excel и другие табличные редакторы начинают формулу
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _isoformat(value):
+    """Дата и время в формате ISO 8601, как в ответах API"""
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _json_default(value):
+    """Сериализация значений, которые json не поддерживает (дата и время - в ISO 8601)"""
+    value = _isoformat(value)
+    return value if isinstance(value, str) else str(value)
+
+
+def _cell(value):
+    """
+    Значение ячейки CSV/XLSX
+    Строки, которые редактор воспринял бы как формулу, экранируются апострофом
+    """
+    value = _isoformat(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return "" if value is None else value
+
+
+async def _stream_csv(batches, fields: tuple) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    # BOM, чтобы Excel распознал кодировку UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([[_cell(contract[field]) for field in fields] for contract in batch])
+        yield buffer.getvalue()
+
+
+async def _stream_ndjson(batches, fields: tuple) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(
+            json.dumps(contract, ensure_ascii=False, default=_json_default) + "\n"
+            for contract in batch
+        )
+
+
+async def _stream_xlsx(batches, fields: tuple) -> AsyncIterator[bytes]:
+    """
+    Книга в режиме write_only записывает строки во временные файлы, поэтому память
+    не растет с числом контрактов. Формат .xlsx - zip-архив, который собирается
+    только после записи всех строк, поэтому передача начинается после выборки
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Contracts")
+    sheet.append(list(fields))
+    
+    async for batch in batches:
+        for contract in batch:
+            sheet.append([_cell(contract[field]) for field in fields])
+    
+    with tempfile.TemporaryFile() as output:
+        await asyncio.to_thread(workbook.save, output)
+        output.seek(0)
+        
+        while True:
+            chunk = await asyncio.to_thread(output.read, EXPORT_FILE_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+STREAMERS = {
+    "csv": _stream_csv,
+    "ndjson": _stream_ndjson,
+    "xlsx": _stream_xlsx,
+}
+
+
+def export_contracts(
+    export_format: str,
+    fields: tuple,
+    status_filter: str = None,
+    lawyer_id: int = None,
+    search: str = None,
+    current_user: User = None
+):
+    """
+    Возвращает асинхронный генератор содержимого выгрузки.
+    Формат и набор полей проверяются вызывающим кодом до начала передачи
+    """
+    batches = _iter_batches(fields, status_filter, lawyer_id, search, current_user)
+    return STREAMERS[export_format](batches, fields)
@@ -0,0 +1,59 @@
+"""
+Сервис поиска по контрактам.
+
+В PostgreSQL поиск подстроки по наименованию, ИНН, руководителю и адресу
+обслуживается GIN-индексами pg_trgm (см. миграцию 0004), а результаты
+ранжируются по word_similarity. В остальных СУБД (например, SQLite в тестах)
+используется обычный поиск подстроки с упрощенным ранжированием.
+"""
+from sqlalchemy import or_, case, func
+
+from app.models.models import Contract
+
+# Поля контракта, по которым выполняется поиск
+SEARCH_FIELDS = (
+    Contract.company_name,
+    Contract.inn,
+    Contract.director,
+    Contract.address,
+)
+
+
+def escape_like(term: str) -> str:
+    """Экранирует спецсимволы LIKE, чтобы они искались как обычные символы"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_condition(term: str):
+    """
+    Условие поиска подстроки по полям контракта.
+    ILIKE '%...%' в PostgreSQL использует триграммные GIN-индексы
+    """
+    pattern = f"%{escape_like(term)}%"
+    return or_(*(field.ilike(pattern, escape="\\") for field in SEARCH_FIELDS))
+
+
+def company_condition(term: str):
+    """Условие поиска подстроки по наименованию компании и ИНН (для подсказок)"""
+    pattern = f"%{escape_like(term)}%"
+    return or_(
+        Contract.company_name.ilike(pattern, escape="\\"),
+        Contract.inn.ilike(pattern, escape="\\"),
+    )
+
+
+def search_rank(term: str, dialect_name: str):
+    """
+    Выражение релевантности контракта поисковой строке (больше - релевантнее)
+    """
+    if dialect_name == "postgresql":
+        return func.greatest(*(func.word_similarity(term, field) for field in SEARCH_FIELDS))
+    
+    # Упрощенное ранжирование: точное совпадение ИНН, затем совпадение
+    # по началу наименования, затем остальные совпадения
+    prefix = f"{escape_like(term)}%"
+    return case(
+        (Contract.inn == term, 3),
+        (Contract.company_name.ilike(prefix, escape="\\"), 2),
+        else_=1,
+    )
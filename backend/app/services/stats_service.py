@@ -0,0 +1,133 @@
+"""
+Сервис материализованной статистики по контрактам.
+Таблица contract_stats хранит количество контрактов каждого юриста в каждом статусе
+(по сохраненной колонке status) и позволяет строить статистику за O(юристов).
+Переходы статусов с течением времени попадают в статистику при проверке сроков
+(планировщик expiry_service), поэтому без планировщика счетчики не обновляются.
+Функции пути запроса асинхронные, сверка статистики - синхронная фоновая задача.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.models import Contract, ContractStat, User, CONTRACT_STATUSES
+
+
+def _empty_stats():
+    """Возвращает статистику без контрактов"""
+    stats = {"total": 0}
+    for contract_status in CONTRACT_STATUSES:
+        stats[contract_status] = 0
+    return stats
+
+
+async def adjust_contract_stats(db: AsyncSession, lawyer_id: int, contract_status: str, delta: int):
+    """
+    Изменяет счетчик контрактов юриста в статусе на delta.
+    Изменение выполняется в текущей транзакции, фиксирует его вызывающий код
+    """
+    # INSERT ... ON CONFLICT атомарен: параллельные транзакции не вставляют
+    # один и тот же счетчик дважды и не теряют изменения друг друга
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(ContractStat).values(lawyer_id=lawyer_id, status=contract_status, count=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ContractStat.lawyer_id, ContractStat.status],
+        set_={"count": ContractStat.count + stmt.excluded.count},
+    )
+    await db.execute(stmt)
+
+
+async def track_contract_change(db: AsyncSession, old: tuple = None, new: tuple = None):
+    """
+    Учитывает изменение контракта в статистике.
+    old и new - пары (lawyer_id, status) до и после изменения,
+    None для создаваемого или удаляемого контракта
+    """
+    if old == new:
+        return
+    
+    if old:
+        await adjust_contract_stats(db, old[0], old[1], -1)
+    
+    if new:
+        await adjust_contract_stats(db, new[0], new[1], 1)
+
+
+def lock_contract_stats(db: Session):
+    """
+    Блокирует таблицу contract_stats до конца транзакции (PostgreSQL).
+    Режим SHARE ROW EXCLUSIVE несовместим с блокировками UPDATE/INSERT, поэтому
+    инкрементальные изменения других транзакций ждут ее завершения, а уже
+    начатые завершаются до получения блокировки. Блокировку нужно брать
+    до изменения контрактов в той же транзакции: сервис контрактов сначала
+    меняет статистику, потом контракт, и обратный порядок привел бы к взаимной блокировке.
+    SQLite блокирует базу целиком при записи, отдельная блокировка не нужна
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE contract_stats IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def reconcile_contract_stats(db: Session):
+    """
+    Сверяет материализованную статистику с таблицей контрактов.
+    Нужна после массовых изменений статусов, происходящих с течением времени,
+    и после импорта контрактов в обход сервиса. Фиксирует вызывающий код
+    """
+    # Пересчет и запись выполняются под блокировкой: иначе инкремент,
+    # зафиксированный между подсчетом и записью, был бы перезаписан
+    lock_contract_stats(db)
+    
+    fresh = {
+        (lawyer_id, contract_status): count
+        for lawyer_id, contract_status, count in (
+            db.query(Contract.lawyer_id, Contract.status, func.count(Contract.id))
+            .group_by(Contract.lawyer_id, Contract.status)
+            .all()
+        )
+    }
+    
+    for stat in db.query(ContractStat).all():
+        stat.count = fresh.pop((stat.lawyer_id, stat.status), 0)
+    
+    for (lawyer_id, contract_status), count in fresh.items():
+        db.add(ContractStat(lawyer_id=lawyer_id, status=contract_status, count=count))
+    
+    db.flush()
+
+
+async def get_lawyer_stats(db: AsyncSession, lawyer_id: int = None):
+    """
+    Получение статистики по каждому юристу из материализованной таблицы.
+    Возвращает словарь {имя юриста: статистика}, юристы без контрактов
+    включаются с нулевыми значениями
+    """
+    stmt = (
+        select(User.username, ContractStat.status, ContractStat.count)
+        .outerjoin(ContractStat, ContractStat.lawyer_id == User.id)
+    )
+    
+    if lawyer_id:
+        stmt = stmt.where(User.id == lawyer_id)
+    
+    per_lawyer = {}
+    for username, contract_status, count in (await db.execute(stmt)).all():
+        lawyer_stats = per_lawyer.setdefault(username, _empty_stats())
+        
+        if count and contract_status in CONTRACT_STATUSES:
+            lawyer_stats[contract_status] += count
+            lawyer_stats["total"] += count
+    
+    return per_lawyer
+
+
+def get_totals(per_lawyer: dict):
+    """Суммирует статистику по юристам"""
+    totals = _empty_stats()
+    
+    for lawyer_stats in per_lawyer.values():
+        for key in totals:
+            totals[key] += lawyer_stats[key]
+    
+    return totals
@@ -1,18 +1,20 @@
-from sqlalchemy.orm import Session
-from app.models.models import User
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from app.models.models import User, ContractStat
 from app.schemas.user import UserCreate, UserUpdate, UserUpdatePassword
-from app.core.auth import get_password_hash, verify_password
+from app.core.auth import get_password_hash_async, verify_password_async, invalidate_user_cache
+from app.services import stats_service
 from fastapi import HTTPException, status
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
     """Получение списка всех пользователей"""
-    return db.query(User).offset(skip).limit(limit).all()
+    return (await db.execute(select(User).offset(skip).limit(limit))).scalars().all()
 
 
-def get_user(db: Session, user_id: int):
+async def get_user(db: AsyncSession, user_id: int):
     """Получение пользователя по ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     
     if not user:
         raise HTTPException(
@@ -23,15 +25,15 @@ def get_user(db: Session, user_id: int):
     return user
 
 
-def get_user_by_username(db: Session, username: str):
+async def get_user_by_username(db: AsyncSession, username: str):
     """Получение пользователя по имени пользователя"""
-    return db.query(User).filter(User.username == username).first()
+    return (await db.execute(select(User).where(User.username == username))).scalars().first()
 
 
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
     """Создание нового пользователя"""
     # Проверяем, что пользователь с таким именем еще не существует
-    existing_user = get_user_by_username(db, user.username)
+    existing_user = await get_user_by_username(db, user.username)
     
     if existing_user:
         raise HTTPException(
@@ -40,7 +42,7 @@ def create_user(db: Session, user: UserCreate):
         )
     
     # Хешируем пароль и создаем пользователя
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         username=user.username,
         password=hashed_password,
@@ -48,19 +50,20 @@ def create_user(db: Session, user: UserCreate):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 
-def update_user(db: Session, user_id: int, user_update: UserUpdate):
+async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate):
     """Обновление данных пользователя"""
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
+    old_username = db_user.username
     
     # Если имя пользователя изменилось, проверяем, что новое имя не занято
     if user_update.username and user_update.username != db_user.username:
-        existing_user = get_user_by_username(db, user_update.username)
+        existing_user = await get_user_by_username(db, user_update.username)
         
         if existing_user:
             raise HTTPException(
@@ -74,58 +77,67 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate):
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    
+    # Сбрасываем кэш аутентификации: роль или имя пользователя могли измениться
+    invalidate_user_cache(old_username)
     
     return db_user
 
 
-def update_password(db: Session, user_id: int, password_update: UserUpdatePassword, current_user_id: int):
+async def update_password(db: AsyncSession, user_id: int, password_update: UserUpdatePassword, current_user_id: int):
     """Обновление пароля пользователя"""
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
     
     # Проверяем, имеет ли текущий пользователь право менять пароль
     # Обычный пользователь может менять только свой пароль, администратор может менять любой пароль
-    if current_user_id != user_id and db.query(User).filter(User.id == current_user_id).first().role != "admin":
+    if current_user_id != user_id and (await db.get(User, current_user_id)).role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Вы не можете изменить пароль другого пользователя"
         )
     
     # Проверяем текущий пароль
-    if not verify_password(password_update.current_password, db_user.password):
+    if not await verify_password_async(password_update.current_password, db_user.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неверный текущий пароль"
         )
     
     # Обновляем пароль
-    db_user.password = get_password_hash(password_update.new_password)
+    db_user.password = await get_password_hash_async(password_update.new_password)
     
-    db.commit()
+    await db.commit()
+    invalidate_user_cache(db_user.username)
     
     return {"message": "Пароль успешно обновлен"}
 
 
-def delete_user(db: Session, user_id: int):
+async def delete_user(db: AsyncSession, user_id: int):
     """Удаление пользователя"""
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
     
-    db.delete(db_user)
-    db.commit()
+    # Контракты пользователя удаляются каскадно, вместе с ними удаляем и статистику
+    await db.execute(
+        delete(ContractStat)
+        .where(ContractStat.lawyer_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    username = db_user.username
+    await db.delete(db_user)
+    await db.commit()
+    invalidate_user_cache(username)
     
     return {"message": f"Пользователь с ID {user_id} успешно удален"}
 
 
-def get_user_with_stats(db: Session, user_id: int):
+async def get_user_with_stats(db: AsyncSession, user_id: int):
     """Получение пользователя со статистикой по контрактам"""
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
     
-    # Получаем статистику по контрактам пользователя
-    total_contracts = len(db_user.contracts)
-    active_contracts = sum(1 for contract in db_user.contracts if contract.status == "active")
-    expiring_contracts = sum(1 for contract in db_user.contracts if contract.status == "expiring_soon")
-    expired_contracts = sum(1 for contract in db_user.contracts if contract.status == "expired")
+    # Получаем статистику по контрактам пользователя из материализованной таблицы
+    stats = (await stats_service.get_lawyer_stats(db, user_id))[db_user.username]
     
     # Создаем словарь с данными пользователя и статистикой
     user_with_stats = {
@@ -134,10 +146,10 @@ def get_user_with_stats(db: Session, user_id: int):
         "role": db_user.role,
         "created_at": db_user.created_at,
         "updated_at": db_user.updated_at,
-        "total_contracts": total_contracts,
-        "active_contracts": active_contracts,
-        "expiring_contracts": expiring_contracts,
-        "expired_contracts": expired_contracts
+        "total_contracts": stats["total"],
+        "active_contracts": stats["active"],
+        "expiring_contracts": stats["expiring_soon"],
+        "expired_contracts": stats["expired"]
     }
     
     return user_with_stats
\ No newline at end of file
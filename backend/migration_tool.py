@@ -1,20 +1,41 @@
 import os
+import csv
 import json
+import hashlib
+import argparse
+from abc import ABC, abstractmethod
 import pandas as pd
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 import logging
 from dotenv import load_dotenv
 
 # Импортируем модели и сервисы
-from app.database.base import SessionLocal, engine, Base
-from app.models.models import User, Contract
+from app.database.base import SessionLocal, engine
+from app.models.models import User, Contract, ContractHistory, CONTRACT_STATUSES
 from app.core.auth import get_password_hash
+from app.services.contract_service import refresh_contract_statuses, calculate_contract_status
+from app.services.stats_service import reconcile_contract_stats
 
 # Google API клиенты
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
+# openpyxl нужен только для локального источника в формате .xlsx
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
 # Настраиваем логирование
 logging.basicConfig(
     level=logging.INFO,
@@ -25,8 +46,26 @@ logger = logging.getLogger(__name__)
 # Загружаем переменные окружения
 load_dotenv()
 
+# Каталог backend: alembic.ini и миграции
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Константы
 DEFAULT_PASSWORD = "password123"  # Пароль по умолчанию для импортированных пользователей
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 500))  # Размер пакета записей для вставки
+USER_MIN_COLUMNS = 3  # Минимальное число заполненных столбцов в строке пользователя
+CONTRACT_MIN_COLUMNS = 7  # Минимальное число заполненных столбцов в строке контракта
+
+# Листы таблицы и их последние столбцы
+USERS_SHEET, USERS_LAST_COLUMN = "Users", "D"
+CONTRACTS_SHEET, CONTRACTS_LAST_COLUMN = "Contracts", "K"
+
+# Чтение листов страницами: строк на страницу и страниц на один запрос batchGet
+SHEET_PAGE_SIZE = int(os.getenv("SHEET_PAGE_SIZE", 1000))
+SHEET_PAGES_PER_REQUEST = int(os.getenv("SHEET_PAGES_PER_REQUEST", 5))
+
+# Синхронизация: поля, изменения которых переносятся из таблицы, и число процессов разбора
+SYNC_FIELDS = ("company_name", "director", "address", "end_date", "lawyer_id", "comments", "has_nd")
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", os.cpu_count() or 1))
 
 
 def get_db():
@@ -38,15 +77,33 @@ def get_db():
         db.close()
 
 
-class GoogleSheetsMigrator:
-    def __init__(self, credentials_path, spreadsheet_id):
+class SheetSource(ABC):
+    """
+    Источник строк листов таблицы
+    iter_rows выдает пары (номер строки листа, список значений ячеек) по одной,
+    начиная со второй строки (первая строка - заголовок)
+    """
+
+    def initialize(self):
+        """Подготовка источника к чтению"""
+        return True
+
+    @abstractmethod
+    def iter_rows(self, sheet, last_column):
+        """Построчно выдает строки листа sheet в столбцах A..last_column"""
+
+
+class GoogleSheetsMigrator(SheetSource):
+    def __init__(self, credentials_path, spreadsheet_id, page_size=SHEET_PAGE_SIZE):
         """
         Инициализация мигратора Google Sheets
         :param credentials_path: Путь к файлу учетных данных Google API
         :param spreadsheet_id: ID таблицы Google Sheets
+        :param page_size: Число строк листа, запрашиваемых за один диапазон
         """
         self.credentials_path = credentials_path
         self.spreadsheet_id = spreadsheet_id
+        self.page_size = page_size
         self.service = None
         
         logger.info(f"Инициализация мигратора с ID таблицы: {spreadsheet_id}")
@@ -69,197 +126,735 @@ class GoogleSheetsMigrator:
             logger.error(f"Ошибка при инициализации Google Sheets API: {e}")
             return False
 
-    def fetch_users(self):
-        """Получает данные пользователей из Google Sheets"""
-        try:
-            # Получаем данные из листа "Users"
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range="Users!A2:D100"  # Диапазон ячеек с данными пользователей
-            ).execute()
-            
-            values = result.get('values', [])
-            
-            if not values:
-                logger.warning("Данные о пользователях не найдены")
-                return []
-            
-            users = []
-            for row in values:
-                if len(row) >= 3:  # Проверяем, что в строке есть минимум 3 столбца
-                    user = {
-                        "id": int(row[0]) if row[0].isdigit() else None,
-                        "username": row[1],
-                        "role": row[2],
-                        "created_at": datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S") if len(row) > 3 else datetime.now()
-                    }
-                    users.append(user)
-            
-            logger.info(f"Получено {len(users)} пользователей из Google Sheets")
-            return users
+    def get_row_count(self, sheet):
+        """Возвращает число строк листа по свойствам таблицы"""
+        result = self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id,
+            fields="sheets.properties(title,gridProperties.rowCount)"
+        ).execute()
         
-        except Exception as e:
-            logger.error(f"Ошибка при получении данных пользователей: {e}")
-            return []
+        for sheet_data in result.get("sheets", []):
+            properties = sheet_data["properties"]
+            if properties["title"] == sheet:
+                return properties["gridProperties"]["rowCount"]
+        
+        raise ValueError(f"Лист {sheet} не найден в таблице")
 
-    def fetch_contracts(self):
-        """Получает данные контрактов из Google Sheets"""
-        try:
-            # Получаем данные из листа "Contracts"
-            result = self.service.spreadsheets().values().get(
+    def iter_rows(self, sheet, last_column):
+        """
+        Читает лист страницами по page_size строк
+        За один вызов batchGet запрашивается SHEET_PAGES_PER_REQUEST страниц,
+        в памяти одновременно находится только текущая порция
+        """
+        row_count = self.get_row_count(sheet)
+        first_row = 2
+        
+        while first_row <= row_count:
+            # Диапазоны страниц для одного запроса batchGet
+            ranges = []
+            for page in range(SHEET_PAGES_PER_REQUEST):
+                page_start = first_row + page * self.page_size
+                if page_start > row_count:
+                    break
+                page_end = min(page_start + self.page_size - 1, row_count)
+                ranges.append((page_start, f"{sheet}!A{page_start}:{last_column}{page_end}"))
+            
+            result = self.service.spreadsheets().values().batchGet(
                 spreadsheetId=self.spreadsheet_id,
-                range="Contracts!A2:K100"  # Диапазон ячеек с данными контрактов
+                ranges=[sheet_range for _, sheet_range in ranges],
+                majorDimension="ROWS"
             ).execute()
             
-            values = result.get('values', [])
-            
-            if not values:
-                logger.warning("Данные о контрактах не найдены")
-                return []
-            
-            contracts = []
-            for row in values:
-                if len(row) >= 7:  # Проверяем, что в строке есть минимум 7 столбцов
-                    # Обработка и конвертация данных
-                    contract = {
-                        "id": int(row[0]) if row[0].isdigit() else None,
-                        "company_name": row[1],
-                        "inn": row[2],
-                        "director": row[3],
-                        "address": row[4],
-                        "end_date": datetime.strptime(row[5], "%Y-%m-%d") if row[5] else None,
-                        "lawyer_id": int(row[6]) if row[6].isdigit() else None,
-                        "status": row[7] if len(row) > 7 else "active",
-                        "comments": row[8] if len(row) > 8 else None,
-                        "has_nd": row[9].lower() in ["true", "1", "yes"] if len(row) > 9 else False,
-                        "created_at": datetime.strptime(row[10], "%Y-%m-%d %H:%M:%S") if len(row) > 10 else datetime.now(),
-                        "history": []  # Пустая история изменений по умолчанию
-                    }
-                    contracts.append(contract)
+            for (page_start, _), value_range in zip(ranges, result.get("valueRanges", [])):
+                for offset, row in enumerate(value_range.get("values", [])):
+                    if row:  # Пустые строки пропускаем
+                        yield page_start + offset, row
             
-            logger.info(f"Получено {len(contracts)} контрактов из Google Sheets")
-            return contracts
+            first_row += len(ranges) * self.page_size
+
+
+class LocalSheetSource(SheetSource):
+    """
+    Локальная замена Google Sheets для офлайн-проверки импорта
+    path - каталог с файлами <Лист>.csv (UTF-8) или книга .xlsx с листами Users и Contracts
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def initialize(self):
+        if not os.path.exists(self.path):
+            logger.error(f"Источник данных {self.path} не найден")
+            return False
+        if self.path.endswith(".xlsx") and openpyxl is None:
+            logger.error("Для чтения .xlsx установите пакет openpyxl")
+            return False
+        return True
+
+    @staticmethod
+    def _cell_to_str(value):
+        """Приводит значение ячейки к строке в формате Google Sheets API"""
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            if value.hour == value.minute == value.second == 0:
+                return value.strftime("%Y-%m-%d")
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def iter_rows(self, sheet, last_column):
+        width = column_index(last_column)
         
-        except Exception as e:
-            logger.error(f"Ошибка при получении данных контрактов: {e}")
-            return []
+        if self.path.endswith(".xlsx"):
+            # Режим read_only читает книгу потоково, не загружая ее целиком
+            workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+            try:
+                rows = workbook[sheet].iter_rows(min_row=2, max_col=width, values_only=True)
+                for row_number, values in enumerate(rows, start=2):
+                    row = [self._cell_to_str(value) for value in values]
+                    # Как и Google Sheets API, отбрасываем пустые ячейки в конце строки
+                    while row and row[-1] == "":
+                        row.pop()
+                    if row:
+                        yield row_number, row
+            finally:
+                workbook.close()
+            return
+        
+        with open(os.path.join(self.path, f"{sheet}.csv"), newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Заголовок
+            for row_number, values in enumerate(reader, start=2):
+                row = values[:width]
+                while row and row[-1] == "":
+                    row.pop()
+                if row:
+                    yield row_number, row
 
 
-def migrate_users(migrator, db):
-    """Миграция пользователей из Google Sheets в PostgreSQL"""
-    users = migrator.fetch_users()
+def column_index(column):
+    """Номер столбца по его буквенному обозначению (A - 1)"""
+    index = 0
+    for char in column.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index
+
+
+def parse_user_row(row):
+    """
+    Преобразует строку листа Users в словарь пользователя
+    Некорректные значения приводят к ValueError
+    """
+    if len(row) < USER_MIN_COLUMNS:
+        raise ValueError(f"Ожидается минимум {USER_MIN_COLUMNS} столбца, получено {len(row)}")
     
-    if not users:
-        logger.warning("Нет пользователей для миграции")
-        return
+    return {
+        "id": int(row[0]) if row[0].isdigit() else None,
+        "username": row[1],
+        "role": row[2],
+        "created_at": datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S") if len(row) > 3 else datetime.now()
+    }
+
+
+def parse_contract_row(row):
+    """
+    Преобразует строку листа Contracts в словарь контракта
+    Некорректные значения приводят к ValueError
+    """
+    if len(row) < CONTRACT_MIN_COLUMNS:
+        raise ValueError(f"Ожидается минимум {CONTRACT_MIN_COLUMNS} столбцов, получено {len(row)}")
     
-    count = 0
-    for user_data in users:
-        # Проверяем, существует ли пользователь уже в базе
-        existing_user = db.query(User).filter(User.username == user_data["username"]).first()
+    # Обработка и конвертация данных
+    return {
+        "id": int(row[0]) if row[0].isdigit() else None,
+        "company_name": row[1],
+        "inn": row[2],
+        "director": row[3],
+        "address": row[4],
+        "end_date": datetime.strptime(row[5], "%Y-%m-%d") if row[5] else None,
+        "lawyer_id": int(row[6]) if row[6].isdigit() else None,
+        "status": row[7] if len(row) > 7 else "active",
+        "comments": row[8] if len(row) > 8 else None,
+        "has_nd": row[9].lower() in ["true", "1", "yes"] if len(row) > 9 else False,
+        "created_at": datetime.strptime(row[10], "%Y-%m-%d %H:%M:%S") if len(row) > 10 else datetime.now()
+    }
+
+
+def chunked(items, size):
+    """Разбивает последовательность (в том числе генератор) на списки заданного размера"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def migrate_users(source, db, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Миграция пользователей из таблицы в PostgreSQL
+    Строки читаются из источника потоково и обрабатываются пакетами по batch_size
+    """
+    report = {"fetched": 0, "duplicates": 0, "existing": 0, "created": 0, "failed": 0, "errors": []}
+    
+    # У всех импортированных пользователей одинаковый пароль по умолчанию,
+    # поэтому хеш bcrypt вычисляется один раз (при первой вставке)
+    default_password_hash = None
+    seen_usernames = set()
+    
+    for rows in chunked(source.iter_rows(USERS_SHEET, USERS_LAST_COLUMN), batch_size):
+        report["fetched"] += len(rows)
         
-        if existing_user:
-            logger.info(f"Пользователь {user_data['username']} уже существует в базе")
+        # Убираем повторы имен внутри источника, оставляя первую запись
+        batch = []
+        for row_number, row in rows:
+            try:
+                user_data = parse_user_row(row)
+            except (ValueError, IndexError) as e:
+                report["failed"] += 1
+                report["errors"].append({"row": row_number, "error": str(e)})
+                continue
+            
+            if user_data["username"] in seen_usernames:
+                report["duplicates"] += 1
+                continue
+            
+            seen_usernames.add(user_data["username"])
+            batch.append(user_data)
+        
+        if not batch:
             continue
         
-        # Создаем нового пользователя
+        # Проверяем существующих пользователей пакета одним запросом с IN
+        existing_usernames = {
+            username for (username,) in
+            db.query(User.username).filter(User.username.in_([user_data["username"] for user_data in batch]))
+        }
+        report["existing"] += len(existing_usernames)
+        new_users = [user_data for user_data in batch if user_data["username"] not in existing_usernames]
+        
+        if dry_run or not new_users:
+            continue
+        
+        if default_password_hash is None:
+            default_password_hash = get_password_hash(DEFAULT_PASSWORD)
+        
+        mappings = [
+            {
+                "username": user_data["username"],
+                "password": default_password_hash,  # Устанавливаем пароль по умолчанию
+                "role": user_data["role"],
+                "created_at": user_data["created_at"],
+            }
+            for user_data in new_users
+        ]
+        
+        # Каждый пакет - отдельная транзакция
         try:
-            new_user = User(
-                username=user_data["username"],
-                password=get_password_hash(DEFAULT_PASSWORD),  # Устанавливаем пароль по умолчанию
-                role=user_data["role"],
-                created_at=user_data["created_at"]
-            )
-            
-            db.add(new_user)
+            db.bulk_insert_mappings(User, mappings)
             db.commit()
-            count += 1
-            logger.info(f"Создан пользователь {user_data['username']}")
+            report["created"] += len(new_users)
         
         except Exception as e:
             db.rollback()
-            logger.error(f"Ошибка при создании пользователя {user_data['username']}: {e}")
+            report["failed"] += len(new_users)
+            logger.error(f"Ошибка при создании пакета пользователей ({new_users[0]['username']} - {new_users[-1]['username']}): {e}")
+        
+        logger.info(f"Пользователи: прочитано строк {report['fetched']}, создано {report['created']}")
+    
+    if report["fetched"] == 0:
+        logger.warning("Нет пользователей для миграции")
+        return
+    
+    if dry_run:
+        logger.info("Пробный запуск: запись пользователей в базу не выполнялась")
+    
+    logger.info(
+        f"Миграция пользователей завершена. Получено: {report['fetched']}, "
+        f"создано: {report['created']}, уже существовали: {report['existing']}, "
+        f"повторы в источнике: {report['duplicates']}, ошибки: {report['failed']}"
+    )
+    
+    return report
+
+
+def row_fingerprint(row):
+    """Отпечаток строки источника: sha256 от значений ячеек"""
+    return hashlib.sha256(json.dumps(row, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def normalize_contract_status(contract_data):
+    """Статус из таблицы используется, только если он допустим; иначе вычисляется по дате"""
+    if contract_data["status"] not in CONTRACT_STATUSES:
+        contract_data["status"] = calculate_contract_status(contract_data["end_date"])["status"]
+
+
+def validate_contract(contract_data, lawyers):
+    """
+    Проверяет контракт в памяти по заранее загруженному списку юристов
+    Возвращает текст ошибки или None
+    """
+    for field in ("company_name", "inn", "director", "address"):
+        if not contract_data[field]:
+            return f"Не заполнено поле {field}"
+    
+    if not contract_data["inn"].isdigit() or len(contract_data["inn"]) not in (10, 12):
+        return f"Некорректный ИНН {contract_data['inn']}"
+    
+    if contract_data["end_date"] is None:
+        return "Не указана дата окончания"
+    
+    if contract_data["lawyer_id"] not in lawyers:
+        return f"Юрист с ID {contract_data['lawyer_id']} не найден"
+    
+    return None
+
+
+def contract_values(contract_data):
+    """Значения колонок contracts для разобранной строки источника"""
+    return {
+        "company_name": contract_data["company_name"],
+        "inn": contract_data["inn"],
+        "director": contract_data["director"],
+        "address": contract_data["address"],
+        "end_date": contract_data["end_date"],
+        "status": contract_data["status"],
+        "comments": contract_data["comments"],
+        "has_nd": contract_data["has_nd"],
+        "lawyer_id": contract_data["lawyer_id"],
+        "created_at": contract_data["created_at"],
+        "source_hash": contract_data.get("source_hash"),
+    }
+
+
+def insert_contract_batch(db, batch, lawyers):
+    """
+    Вставляет пакет контрактов и записи истории о создании (executemany)
+    Возвращает число вставленных контрактов
+    """
+    timestamp = datetime.now()
+    contract_rows = [contract_values(contract_data) for _, contract_data in batch]
     
-    logger.info(f"Миграция пользователей завершена. Создано {count} новых пользователей")
+    inserted = db.execute(insert(Contract).returning(Contract.id, Contract.lawyer_id), contract_rows).all()
+    
+    db.execute(
+        insert(ContractHistory),
+        [
+            {
+                "contract_id": contract_id,
+                "user_id": lawyer_id,
+                "username": lawyers[lawyer_id],
+                "action": "create",
+                "changes": {},
+                "timestamp": timestamp,
+            }
+            for contract_id, lawyer_id in inserted
+        ]
+    )
+    
+    return len(inserted)
 
 
-def migrate_contracts(migrator, db):
-    """Миграция контрактов из Google Sheets в PostgreSQL"""
-    contracts = migrator.fetch_contracts()
+def migrate_contracts(source, db, batch_size=BATCH_SIZE, dry_run=False, resume_from=None):
+    """
+    Миграция контрактов из таблицы в PostgreSQL
+    
+    Существующие ИНН и юристы загружаются заранее, строки читаются из источника
+    потоково, проверяются в памяти и вставляются пакетами по batch_size,
+    каждый пакет - отдельная транзакция.
+    dry_run - только проверка без записи в базу, resume_from - номер строки листа,
+    с которой продолжается импорт (строки выше пропускаются)
+    """
+    report = {"fetched": 0, "skipped": 0, "existing": 0, "valid": 0, "created": 0, "failed": 0, "errors": []}
+    
+    def add_error(row_number, inn, error):
+        report["failed"] += 1
+        report["errors"].append({"row": row_number, "inn": inn, "error": str(error)})
+    
+    def insert_batch(batch):
+        try:
+            report["created"] += insert_contract_batch(db, batch, lawyers)
+            db.commit()
+        
+        except Exception:
+            db.rollback()
+            
+            # Повторяем пакет по одной строке, чтобы найти строки с ошибками
+            for item in batch:
+                try:
+                    report["created"] += insert_contract_batch(db, [item], lawyers)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    add_error(item[0], item[1]["inn"], e)
+        
+        logger.info(f"Контракты: обработано до строки {batch[-1][0]}, создано {report['created']}")
     
-    if not contracts:
+    # Загружаем существующие ИНН и юристов одним запросом каждый
+    existing_inns = {inn for (inn,) in db.query(Contract.inn)}
+    lawyers = dict(db.query(User.id, User.username))
+    
+    # Разбираем и проверяем строки в памяти.
+    # Номер строки соответствует номеру в листе (данные начинаются со второй строки)
+    pending = []
+    seen_inns = set()
+    try:
+        for row_number, row in source.iter_rows(CONTRACTS_SHEET, CONTRACTS_LAST_COLUMN):
+            report["fetched"] += 1
+            
+            if resume_from and row_number < resume_from:
+                report["skipped"] += 1
+                continue
+            
+            try:
+                contract_data = parse_contract_row(row)
+            except (ValueError, IndexError) as e:
+                add_error(row_number, row[2] if len(row) > 2 else None, e)
+                continue
+            
+            contract_data["source_hash"] = row_fingerprint(row)
+            
+            if contract_data["inn"] in existing_inns:
+                report["existing"] += 1
+                continue
+            
+            if contract_data["inn"] in seen_inns:
+                add_error(row_number, contract_data["inn"], "ИНН повторяется в источнике")
+                continue
+            
+            error = validate_contract(contract_data, lawyers)
+            if error:
+                add_error(row_number, contract_data["inn"], error)
+                continue
+            
+            normalize_contract_status(contract_data)
+            seen_inns.add(contract_data["inn"])
+            report["valid"] += 1
+            
+            if dry_run:
+                continue
+            
+            pending.append((row_number, contract_data))
+            if len(pending) >= batch_size:
+                insert_batch(pending)
+                pending = []
+        
+        if pending:
+            insert_batch(pending)
+    
+    except Exception as e:
+        # Ошибка чтения источника: уже вставленные пакеты сохранены,
+        # импорт можно продолжить с последней обработанной строки через resume_from
+        logger.error(f"Ошибка при получении данных контрактов: {e}")
+    
+    if report["fetched"] == 0:
         logger.warning("Нет контрактов для миграции")
         return
     
-    count = 0
-    for contract_data in contracts:
-        # Проверяем, существует ли контракт уже в базе
-        existing_contract = db.query(Contract).filter(Contract.inn == contract_data["inn"]).first()
+    if dry_run:
+        logger.info(f"Пробный запуск: к созданию готово {report['valid']} контрактов, запись в базу не выполнялась")
+    
+    logger.info(
+        f"Миграция контрактов завершена. Получено строк: {report['fetched']}, "
+        f"создано: {report['created']}, уже существовали: {report['existing']}, "
+        f"пропущено до строки {resume_from}: {report['skipped']}, ошибки: {report['failed']}"
+    )
+    for error in report["errors"]:
+        logger.warning(f"Строка {error['row']} (ИНН {error['inn']}): {error['error']}")
+    
+    return report
+
+
+def prepare_contract_rows(rows, lawyer_ids):
+    """
+    Разбирает, проверяет и хеширует часть строк листа Contracts
+    Выполняется в процессах-обработчиках, поэтому не обращается к базе данных.
+    Возвращает кортежи (номер строки, ИНН, данные контракта или None, ошибка или None, отпечаток)
+    """
+    prepared = []
+    for row_number, row in rows:
+        fingerprint = row_fingerprint(row)
+        try:
+            contract_data = parse_contract_row(row)
+            error = validate_contract(contract_data, lawyer_ids)
+        except (ValueError, IndexError) as e:
+            contract_data, error = None, str(e)
         
-        if existing_contract:
-            logger.info(f"Контракт с ИНН {contract_data['inn']} уже существует в базе")
-            continue
+        if error is None:
+            normalize_contract_status(contract_data)
+            contract_data["source_hash"] = fingerprint
         
-        # Проверяем, существует ли юрист
-        lawyer = db.query(User).filter(User.id == contract_data["lawyer_id"]).first()
+        prepared.append((row_number, row[2] if len(row) > 2 else None, contract_data, error, fingerprint))
+    
+    return prepared
+
+
+def iter_prepared_contract_rows(source, lawyer_ids, workers, chunk_size):
+    """
+    Выдает подготовленные строки листа Contracts в исходном порядке
+    Части по chunk_size строк обрабатываются параллельно в workers процессах;
+    в работе одновременно не более 2 * workers частей, чтобы чтение источника
+    не опережало обработку и память оставалась ограниченной
+    """
+    chunks = chunked(source.iter_rows(CONTRACTS_SHEET, CONTRACTS_LAST_COLUMN), chunk_size)
+    
+    if workers <= 1:
+        for chunk in chunks:
+            yield from prepare_contract_rows(chunk, lawyer_ids)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(prepare_contract_rows, chunk, lawyer_ids))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
         
-        if not lawyer:
-            logger.warning(f"Юрист с ID {contract_data['lawyer_id']} не найден. Пропускаем контракт {contract_data['company_name']}")
-            continue
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def upsert_contract_batch(db, batch, lawyers):
+    """
+    Записывает пакет новых и измененных контрактов через INSERT ... ON CONFLICT (inn) DO UPDATE
+    Для измененных контрактов добавляет запись истории "sync" с различиями полей,
+    для новых - запись "create". Если изменился только отпечаток строки
+    (например, столбец статуса), обновляется лишь source_hash без увеличения версии.
+    Возвращает пару (создано, обновлено)
+    """
+    timestamp = datetime.now()
+    
+    # Текущие значения контрактов пакета - одним запросом
+    current = {
+        row.inn: row
+        for row in db.execute(
+            select(Contract.id, Contract.inn, Contract.updated_at, *[getattr(Contract, field) for field in SYNC_FIELDS])
+            .where(Contract.inn.in_([contract_data["inn"] for _, contract_data in batch]))
+        )
+    }
+    
+    changes_by_inn = {}
+    hash_only = []
+    upserts = []
+    for _, contract_data in batch:
+        old = current.get(contract_data["inn"])
         
-        # Создаем новый контракт
-        try:
-            history_entry = {
-                "userId": lawyer.id,
-                "username": lawyer.username,
-                "action": "create",
-                "changes": {},
-                "timestamp": datetime.now().isoformat()
-            }
+        if old is not None:
+            changes = {}
+            for field in SYNC_FIELDS:
+                old_value, new_value = getattr(old, field), contract_data[field]
+                if old_value != new_value:
+                    # Для дат сохраняем строковое представление, как при обновлении через API
+                    if field == "end_date":
+                        old_value, new_value = old_value.isoformat(), new_value.isoformat()
+                    changes[field] = {"old": old_value, "new": new_value}
             
-            new_contract = Contract(
-                company_name=contract_data["company_name"],
-                inn=contract_data["inn"],
-                director=contract_data["director"],
-                address=contract_data["address"],
-                end_date=contract_data["end_date"],
-                status=contract_data["status"],
-                comments=contract_data["comments"],
-                has_nd=contract_data["has_nd"],
-                lawyer_id=lawyer.id,
-                created_at=contract_data["created_at"],
-                history=[history_entry]
-            )
+            if not changes:
+                # updated_at передается явно, чтобы не сработал onupdate: данные контракта не менялись
+                hash_only.append({"contract_id": old.id, "source_hash": contract_data["source_hash"], "updated_at": old.updated_at})
+                continue
             
-            db.add(new_contract)
+            changes_by_inn[contract_data["inn"]] = changes
+        
+        upserts.append(contract_values(contract_data))
+    
+    if hash_only:
+        # UPDATE на уровне таблицы: версия контракта не меняется, т.к. данные прежние
+        contracts = Contract.__table__
+        db.execute(update(contracts).where(contracts.c.id == bindparam("contract_id")), hash_only)
+    
+    if not upserts:
+        return 0, 0
+    
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(Contract)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Contract.inn],
+        set_={
+            # status не перезаписывается: его по датам окончания пересчитывает refresh_contract_statuses
+            **{field: stmt.excluded[field] for field in SYNC_FIELDS + ("source_hash",)},
+            "updated_at": timestamp,
+            "version": Contract.version + 1,
+        }
+    )
+    
+    written = db.execute(stmt.returning(Contract.id, Contract.inn, Contract.lawyer_id), upserts).all()
+    
+    db.execute(
+        insert(ContractHistory),
+        [
+            {
+                "contract_id": contract_id,
+                "user_id": lawyer_id,
+                "username": lawyers[lawyer_id],
+                "action": "sync" if inn in current else "create",
+                "changes": changes_by_inn.get(inn, {}),
+                "timestamp": timestamp,
+            }
+            for contract_id, inn, lawyer_id in written
+        ]
+    )
+    
+    updated = sum(1 for _, inn, _ in written if inn in current)
+    return len(written) - updated, updated
+
+
+def sync_contracts(source, db, batch_size=BATCH_SIZE, dry_run=False, workers=SYNC_WORKERS):
+    """
+    Инкрементальная синхронизация контрактов с таблицей
+    
+    Для каждой строки вычисляется отпечаток и сравнивается с contracts.source_hash;
+    записываются только новые и измененные строки. Разбор и проверка строк
+    выполняются параллельно в workers процессах. Контракты, отсутствующие
+    в таблице, не удаляются.
+    """
+    report = {"fetched": 0, "unchanged": 0, "changed": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+    
+    def add_error(row_number, inn, error):
+        report["failed"] += 1
+        report["errors"].append({"row": row_number, "inn": inn, "error": str(error)})
+    
+    def write_batch(batch):
+        try:
+            created, updated = upsert_contract_batch(db, batch, lawyers)
             db.commit()
-            count += 1
-            logger.info(f"Создан контракт для компании {contract_data['company_name']}")
+            report["created"] += created
+            report["updated"] += updated
         
-        except Exception as e:
+        except Exception:
             db.rollback()
-            logger.error(f"Ошибка при создании контракта {contract_data['company_name']}: {e}")
+            
+            # Повторяем пакет по одной строке, чтобы найти строки с ошибками
+            for item in batch:
+                try:
+                    created, updated = upsert_contract_batch(db, [item], lawyers)
+                    db.commit()
+                    report["created"] += created
+                    report["updated"] += updated
+                except Exception as e:
+                    db.rollback()
+                    add_error(item[0], item[1]["inn"], e)
+        
+        logger.info(
+            f"Синхронизация: обработано до строки {batch[-1][0]}, "
+            f"создано {report['created']}, обновлено {report['updated']}"
+        )
+    
+    # Отпечатки существующих контрактов и юристы - одним запросом каждый
+    known_hashes = dict(db.query(Contract.inn, Contract.source_hash))
+    lawyers = dict(db.query(User.id, User.username))
+    
+    pending = []
+    seen_inns = set()
+    try:
+        for row_number, inn, contract_data, error, fingerprint in iter_prepared_contract_rows(
+            source, set(lawyers), workers, batch_size
+        ):
+            report["fetched"] += 1
+            
+            if error:
+                add_error(row_number, inn, error)
+                continue
+            
+            if inn in seen_inns:
+                add_error(row_number, inn, "ИНН повторяется в источнике")
+                continue
+            seen_inns.add(inn)
+            
+            if known_hashes.get(inn) == fingerprint:
+                report["unchanged"] += 1
+                continue
+            
+            report["changed"] += 1
+            if dry_run:
+                continue
+            
+            pending.append((row_number, contract_data))
+            if len(pending) >= batch_size:
+                write_batch(pending)
+                pending = []
+        
+        if pending:
+            write_batch(pending)
+    
+    except Exception as e:
+        logger.error(f"Ошибка при получении данных контрактов: {e}")
+    
+    if dry_run:
+        logger.info(f"Пробный запуск: новых или измененных строк {report['changed']}, запись в базу не выполнялась")
+    
+    logger.info(
+        f"Синхронизация контрактов завершена. Получено строк: {report['fetched']}, "
+        f"без изменений: {report['unchanged']}, создано: {report['created']}, "
+        f"обновлено: {report['updated']}, ошибки: {report['failed']}"
+    )
+    for error in report["errors"]:
+        logger.warning(f"Строка {error['row']} (ИНН {error['inn']}): {error['error']}")
     
-    logger.info(f"Миграция контрактов завершена. Создано {count} новых контрактов")
+    return report
+
+
+def schema_is_current():
+    """Проверяет, что база данных обновлена до последней ревизии Alembic"""
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "migrations"))
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    
+    with engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    
+    return current == heads
+
+
+def parse_args():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Миграция пользователей и контрактов из Google Sheets")
+    parser.add_argument("--dry-run", action="store_true", help="Проверить данные без записи в базу")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Размер пакета вставки")
+    parser.add_argument("--resume-from", type=int, default=None, help="Номер строки листа Contracts, с которой продолжить импорт")
+    parser.add_argument("--error-report", default=None, help="Путь к JSON-файлу для отчета об ошибках строк")
+    parser.add_argument(
+        "--mode",
+        choices=("import", "sync"),
+        default="import",
+        help="import - добавить только новые контракты, sync - также обновить измененные строки"
+    )
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS, help="Число процессов разбора строк в режиме sync")
+    parser.add_argument(
+        "--source",
+        default=None,
+        help="Локальный источник вместо Google Sheets: каталог с Users.csv и Contracts.csv или файл .xlsx"
+    )
+    return parser.parse_args()
 
 
 def main():
     """Основная функция для запуска миграции"""
-    # Загружаем параметры миграции из переменных окружения
-    credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
-    spreadsheet_id = os.getenv("GOOGLE_SPREADSHEET_ID")
-    
-    if not credentials_path or not spreadsheet_id:
-        logger.error("Отсутствуют необходимые переменные окружения для миграции")
-        print("Ошибка: Установите переменные окружения GOOGLE_CREDENTIALS_PATH и GOOGLE_SPREADSHEET_ID")
-        return
+    args = parse_args()
     
-    # Создаем таблицы в базе данных, если они еще не созданы
-    Base.metadata.create_all(bind=engine)
+    if args.source:
+        migrator = LocalSheetSource(args.source)
+    else:
+        # Загружаем параметры миграции из переменных окружения
+        credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
+        spreadsheet_id = os.getenv("GOOGLE_SPREADSHEET_ID")
+        
+        if not credentials_path or not spreadsheet_id:
+            logger.error("Отсутствуют необходимые переменные окружения для миграции")
+            print("Ошибка: Установите переменные окружения GOOGLE_CREDENTIALS_PATH и GOOGLE_SPREADSHEET_ID")
+            return
+        
+        migrator = GoogleSheetsMigrator(credentials_path, spreadsheet_id)
     
-    # Инициализируем мигратор
-    migrator = GoogleSheetsMigrator(credentials_path, spreadsheet_id)
+    # Схему базы данных создают и обновляют только миграции Alembic
+    if not schema_is_current():
+        logger.error("Схема базы данных не соответствует последней миграции")
+        print("Ошибка: перед миграцией данных выполните alembic upgrade head")
+        return
     
+    # Инициализируем источник данных
     if not migrator.initialize():
         logger.error("Не удалось инициализировать мигратор. Миграция прервана.")
         return
@@ -270,11 +865,40 @@ def main():
     try:
         # Выполняем миграцию пользователей
         logger.info("Начало миграции пользователей")
-        migrate_users(migrator, db)
+        migrate_users(migrator, db, batch_size=args.batch_size, dry_run=args.dry_run)
         
         # Выполняем миграцию контрактов
-        logger.info("Начало миграции контрактов")
-        migrate_contracts(migrator, db)
+        if args.mode == "sync":
+            logger.info("Начало синхронизации контрактов")
+            report = sync_contracts(
+                migrator,
+                db,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run,
+                workers=args.workers
+            )
+        else:
+            logger.info("Начало миграции контрактов")
+            report = migrate_contracts(
+                migrator,
+                db,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run,
+                resume_from=args.resume_from
+            )
+        
+        if report and args.error_report:
+            with open(args.error_report, "w", encoding="utf-8") as f:
+                json.dump(report["errors"], f, ensure_ascii=False, indent=2)
+            logger.info(f"Отчет об ошибках сохранен в {args.error_report}")
+        
+        if not args.dry_run:
+            # Приводим статусы в соответствие с датами окончания и пересобираем статистику:
+            # контракты вставлены в обход сервиса, поэтому сверка нужна и без переходов статусов
+            logger.info("Пересчет статусов и статистики по контрактам")
+            refresh_contract_statuses(db)
+            reconcile_contract_stats(db)
+            db.commit()
         
         logger.info("Миграция успешно завершена")
     
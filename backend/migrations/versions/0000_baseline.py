@@ -0,0 +1,67 @@
+"""Исходная схема: пользователи и контракты
+
+Таблицы в том виде, в каком их создавала первая версия приложения
+(история изменений - JSON-колонка contracts.history, перенос в
+отдельную таблицу выполняет ревизия 0005).
+Базы, созданные до появления миграций, помечаются этой ревизией
+командой alembic stamp 0000 перед alembic upgrade head.
+
+Revision ID: 0000
+Revises: 
+Create Date: 2026-10-18 08:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0000'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('password', sa.String(length=100), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    
+    op.create_table(
+        'contracts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('company_name', sa.String(length=100), nullable=False),
+        sa.Column('inn', sa.String(length=12), nullable=False),
+        sa.Column('director', sa.String(length=100), nullable=False),
+        sa.Column('address', sa.Text(), nullable=False),
+        sa.Column('end_date', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('comments', sa.Text(), nullable=True),
+        sa.Column('has_nd', sa.Boolean(), nullable=True),
+        sa.Column('history', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('lawyer_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['lawyer_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_contracts_id'), 'contracts', ['id'], unique=False)
+    op.create_index(op.f('ix_contracts_inn'), 'contracts', ['inn'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_contracts_inn'), table_name='contracts')
+    op.drop_index(op.f('ix_contracts_id'), table_name='contracts')
+    op.drop_table('contracts')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_table('users')
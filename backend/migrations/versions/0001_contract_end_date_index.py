@@ -0,0 +1,26 @@
+"""Индекс по дате окончания контракта
+
+Статус контракта рассчитывается по end_date в момент запроса,
+фильтрация по статусу превращается в диапазон по end_date.
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = '0000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_contracts_end_date'), 'contracts', ['end_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_contracts_end_date'), table_name='contracts')
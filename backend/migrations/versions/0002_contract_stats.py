@@ -0,0 +1,37 @@
+"""Материализованная статистика по контрактам
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'contract_stats',
+        sa.Column('lawyer_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['lawyer_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('lawyer_id', 'status'),
+    )
+    
+    # Заполняем статистику по существующим контрактам
+    op.execute(
+        "INSERT INTO contract_stats (lawyer_id, status, count) "
+        "SELECT lawyer_id, status, COUNT(id) FROM contracts GROUP BY lawyer_id, status"
+    )
+
+
+def downgrade():
+    op.drop_table('contract_stats')
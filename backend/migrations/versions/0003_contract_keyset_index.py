@@ -0,0 +1,28 @@
+"""Составной индекс для курсорной пагинации контрактов
+
+Индекс (end_date, id) покрывает и фильтрацию по диапазону end_date,
+поэтому отдельный индекс по end_date удаляется.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_contracts_end_date_id', 'contracts', ['end_date', 'id'], unique=False)
+    op.drop_index('ix_contracts_end_date', table_name='contracts')
+
+
+def downgrade():
+    op.create_index('ix_contracts_end_date', 'contracts', ['end_date'], unique=False)
+    op.drop_index('ix_contracts_end_date_id', table_name='contracts')
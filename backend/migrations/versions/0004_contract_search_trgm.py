@@ -0,0 +1,46 @@
+"""Триграммные индексы для поиска по контрактам
+
+Индексы создаются только в PostgreSQL: ILIKE '%...%' по наименованию, ИНН,
+руководителю и адресу обслуживается GIN-индексами с gin_trgm_ops.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Поля контракта, по которым выполняется поиск
+SEARCH_COLUMNS = ('company_name', 'inn', 'director', 'address')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    
+    for column in SEARCH_COLUMNS:
+        op.create_index(
+            f'ix_contracts_{column}_trgm',
+            'contracts',
+            [column],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    for column in SEARCH_COLUMNS:
+        op.drop_index(f'ix_contracts_{column}_trgm', table_name='contracts')
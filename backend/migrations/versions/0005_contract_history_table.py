@@ -0,0 +1,137 @@
+"""Перенос истории изменений контрактов в отдельную таблицу
+
+Каждая запись JSON-массива contracts.history становится строкой
+таблицы contract_history, после чего колонка history удаляется.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Размер пачки записей при переносе истории в СУБД, отличных от PostgreSQL
+BATCH_SIZE = 1000
+
+contracts = sa.table(
+    'contracts',
+    sa.column('id', sa.Integer),
+    sa.column('history', sa.JSON),
+)
+
+contract_history = sa.table(
+    'contract_history',
+    sa.column('id', sa.Integer),
+    sa.column('contract_id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('username', sa.String),
+    sa.column('action', sa.String),
+    sa.column('changes', sa.JSON),
+    sa.column('timestamp', sa.DateTime),
+)
+
+
+def upgrade():
+    op.create_table(
+        'contract_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('contract_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('action', sa.String(length=20), nullable=False),
+        sa.Column('changes', sa.JSON(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['contract_id'], ['contracts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_contract_history_id'), 'contract_history', ['id'], unique=False)
+    op.create_index(
+        'ix_contract_history_contract_id_timestamp',
+        'contract_history',
+        ['contract_id', 'timestamp'],
+        unique=False,
+    )
+    
+    bind = op.get_bind()
+    
+    if bind.dialect.name == 'postgresql':
+        # Разворачиваем JSON-массивы одним запросом, сохраняя порядок записей
+        op.execute(
+            """
+            INSERT INTO contract_history (contract_id, user_id, username, action, changes, timestamp)
+            SELECT c.id,
+                   (e.value->>'userId')::integer,
+                   e.value->>'username',
+                   e.value->>'action',
+                   e.value->'changes',
+                   (e.value->>'timestamp')::timestamp
+            FROM contracts c
+            CROSS JOIN LATERAL json_array_elements(c.history) WITH ORDINALITY AS e(value, position)
+            WHERE c.history IS NOT NULL AND json_typeof(c.history) = 'array'
+            ORDER BY c.id, e.position
+            """
+        )
+    else:
+        rows = []
+        for contract_id, history in bind.execute(sa.select(contracts.c.id, contracts.c.history)):
+            for entry in history or []:
+                rows.append({
+                    'contract_id': contract_id,
+                    'user_id': entry['userId'],
+                    'username': entry['username'],
+                    'action': entry['action'],
+                    'changes': entry.get('changes') or {},
+                    'timestamp': datetime.fromisoformat(entry['timestamp']),
+                })
+                
+                if len(rows) >= BATCH_SIZE:
+                    bind.execute(contract_history.insert(), rows)
+                    rows = []
+        
+        if rows:
+            bind.execute(contract_history.insert(), rows)
+    
+    with op.batch_alter_table('contracts') as batch_op:
+        batch_op.drop_column('history')
+
+
+def downgrade():
+    with op.batch_alter_table('contracts') as batch_op:
+        batch_op.add_column(sa.Column('history', sa.JSON(), nullable=True))
+    
+    bind = op.get_bind()
+    
+    # Собираем историю обратно в JSON-массивы
+    histories = {}
+    query = sa.select(contract_history).order_by(
+        contract_history.c.contract_id,
+        contract_history.c.timestamp,
+        contract_history.c.id,
+    )
+    for row in bind.execute(query):
+        histories.setdefault(row.contract_id, []).append({
+            'userId': row.user_id,
+            'username': row.username,
+            'action': row.action,
+            'changes': row.changes or {},
+            'timestamp': row.timestamp.isoformat(),
+        })
+    
+    for contract_id, history in histories.items():
+        bind.execute(
+            contracts.update().where(contracts.c.id == contract_id).values(history=history)
+        )
+    
+    op.drop_index('ix_contract_history_contract_id_timestamp', table_name='contract_history')
+    op.drop_index(op.f('ix_contract_history_id'), table_name='contract_history')
+    op.drop_table('contract_history')
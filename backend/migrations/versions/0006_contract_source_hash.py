@@ -0,0 +1,25 @@
+"""Отпечаток строки источника для инкрементальной синхронизации контрактов
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('contracts', sa.Column('source_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('contracts') as batch_op:
+        batch_op.drop_column('source_hash')
@@ -0,0 +1,27 @@
+"""Повторная отправка сводок с задержкой и отметка исчерпанных попыток
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('notification_outbox', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    op.add_column('notification_outbox', sa.Column('failed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('notification_outbox') as batch_op:
+        batch_op.drop_column('failed_at')
+        batch_op.drop_column('next_attempt_at')
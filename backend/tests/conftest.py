@@ -0,0 +1,116 @@
+"""
+Общие настройки тестов: каталог backend в пути импорта, временная база SQLite
+и клиент API с администратором по умолчанию
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Окружение задается до импорта модулей приложения
+_db_dir = tempfile.mkdtemp(prefix="contracts-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["EXPIRY_SCHEDULER"] = "off"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["CACHE_BACKEND"] = "memory"
+
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin"
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Приложение FastAPI со схемой базы данных, созданной по моделям"""
+    from app.database.base import Base, engine
+    from app.main import app as fastapi_app
+
+    Base.metadata.create_all(bind=engine)
+    return fastapi_app
+
+
+@pytest.fixture(scope="session")
+def api(app):
+    """
+    Клиент API на всю сессию тестов: один цикл событий для асинхронного
+    пула соединений SQLite
+    """
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(app):
+    """Синхронная сессия к очищенной базе с одним администратором"""
+    from app.core.auth import get_password_hash, login_attempts, principal_cache
+    from app.database.base import Base, SessionLocal
+    from app.models.models import User
+
+    session = SessionLocal()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(table.delete())
+    session.add(User(username=ADMIN_USERNAME, password=get_password_hash(ADMIN_PASSWORD), role="admin"))
+    session.commit()
+
+    login_attempts.clear()
+    principal_cache.clear()
+
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(api, db):
+    """Клиент API к очищенной базе"""
+    return api
+
+
+def login(client, username: str, password: str) -> dict:
+    """Заголовки авторизации пользователя"""
+    response = client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def admin_headers(client):
+    return login(client, ADMIN_USERNAME, ADMIN_PASSWORD)
+
+
+@pytest.fixture
+def lawyer(client, admin_headers):
+    """Юрист и заголовки его авторизации"""
+    response = client.post(
+        "/users/", json={"username": "lawyer1", "password": "secret12", "role": "lawyer"}, headers=admin_headers
+    )
+    assert response.status_code == 200, response.text
+    return response.json(), login(client, "lawyer1", "secret12")
+
+
+def contract_data(inn: str, days: int = 100, **fields) -> dict:
+    """Данные нового контракта, истекающего через days дней"""
+    data = {
+        "company_name": f"ООО Компания {inn}",
+        "inn": inn,
+        "director": "Иванов И.И.",
+        "address": "г. Москва, ул. Тверская, 1",
+        "end_date": (datetime.utcnow() + timedelta(days=days)).isoformat(),
+    }
+    data.update(fields)
+    return data
+
+
+@pytest.fixture
+def make_contract(client, admin_headers):
+    """Создает контракт через API и возвращает его"""
+    def make(inn: str, days: int = 100, **fields) -> dict:
+        response = client.post("/contracts/", json=contract_data(inn, days, **fields), headers=admin_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
@@ -0,0 +1,44 @@
+"""
+Тесты входа: лимит неудачных попыток
+"""
+from app.core import auth
+from conftest import ADMIN_PASSWORD, ADMIN_USERNAME
+
+
+def token(client, password: str):
+    return client.post("/token", data={"username": ADMIN_USERNAME, "password": password})
+
+
+def test_successful_logins_are_not_limited(client, monkeypatch):
+    monkeypatch.setattr(auth, "LOGIN_RATE_LIMIT", 2)
+
+    for _ in range(4):
+        assert token(client, ADMIN_PASSWORD).status_code == 200
+
+
+def test_failed_logins_are_limited(client, monkeypatch):
+    monkeypatch.setattr(auth, "LOGIN_RATE_LIMIT", 2)
+
+    assert [token(client, "wrong").status_code for _ in range(2)] == [401, 401]
+
+    limited = token(client, ADMIN_PASSWORD)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) > 0
+
+
+def test_successful_login_resets_failures(client, monkeypatch):
+    monkeypatch.setattr(auth, "LOGIN_RATE_LIMIT", 2)
+
+    assert token(client, "wrong").status_code == 401
+    assert token(client, ADMIN_PASSWORD).status_code == 200
+    assert token(client, "wrong").status_code == 401
+
+    # После сброса счетчика учтена только одна неудачная попытка
+    assert token(client, ADMIN_PASSWORD).status_code == 200
+
+
+def test_unknown_user_attempts_are_counted(client, monkeypatch):
+    monkeypatch.setattr(auth, "LOGIN_RATE_LIMIT", 1)
+
+    assert client.post("/token", data={"username": "ghost", "password": "x"}).status_code == 401
+    assert client.post("/token", data={"username": "ghost", "password": "x"}).status_code == 429
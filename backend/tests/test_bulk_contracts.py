@@ -0,0 +1,122 @@
+"""
+Тесты пакетного изменения контрактов: атомарный режим и режим пакетов
+"""
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.models.models import Contract, ContractHistory
+from app.services import contract_service, stats_service
+from conftest import contract_data
+
+
+def bulk(client, headers, items, atomic=True):
+    response = client.post("/contracts/bulk", json={"items": items, "atomic": atomic}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def statuses(result):
+    return [item["status"] for item in result["results"]]
+
+
+def test_atomic_bulk_applies_all_operations(client, db, admin_headers, lawyer, make_contract):
+    lawyer_user, _ = lawyer
+    first = make_contract("7700000001")
+    second = make_contract("7700000002")
+
+    result = bulk(client, admin_headers, [
+        {"action": "create", "contract": contract_data("7700000003")},
+        {"action": "update", "id": first["id"], "version": first["version"], "changes": {"comments": "изменен"}},
+        {"action": "reassign", "id": first["id"], "lawyer_id": lawyer_user["id"]},
+        {"action": "delete", "id": second["id"]},
+    ])
+
+    assert result["succeeded"] == 4 and result["failed"] == 0
+    assert db.query(Contract).count() == 2
+    updated = db.get(Contract, first["id"])
+    assert (updated.comments, updated.lawyer_id) == ("изменен", lawyer_user["id"])
+    assert {action for (action,) in db.query(ContractHistory.action)} >= {"create", "update", "reassign"}
+
+
+def test_atomic_bulk_rolls_back_everything_on_error(client, db, admin_headers, make_contract):
+    existing = make_contract("7700000001")
+
+    result = bulk(client, admin_headers, [
+        {"action": "create", "contract": contract_data("7700000002")},
+        {"action": "create", "contract": contract_data("7700000001")},
+        {"action": "update", "id": existing["id"], "changes": {"comments": "не применится"}},
+    ])
+
+    assert statuses(result) == ["skipped", "error", "skipped"]
+    assert result["succeeded"] == 0
+    assert db.query(Contract).count() == 1
+    assert db.get(Contract, existing["id"]).comments is None
+
+
+def test_chunked_bulk_keeps_successful_chunks(client, db, admin_headers, make_contract, monkeypatch):
+    monkeypatch.setattr(contract_service, "BULK_CHUNK_SIZE", 2)
+    existing = make_contract("7700000001")
+
+    result = bulk(client, admin_headers, [
+        {"action": "update", "id": existing["id"], "version": existing["version"] + 5, "changes": {"comments": "x"}},
+        {"action": "create", "contract": contract_data("7700000002")},
+        {"action": "create", "contract": contract_data("7700000003")},
+        {"action": "delete", "id": 999999},
+    ], atomic=False)
+
+    assert statuses(result) == ["error", "ok", "ok", "error"]
+    assert result["results"][0]["error"] == "Контракт был изменен другим пользователем"
+    assert db.query(Contract).count() == 3
+
+
+def test_bulk_database_error_is_reported_per_row(client, db, admin_headers, monkeypatch):
+    async def failing_adjust(*args, **kwargs):
+        raise OperationalError("UPDATE contract_stats", {}, Exception("deadlock detected"))
+
+    monkeypatch.setattr(stats_service, "adjust_contract_stats", failing_adjust)
+
+    result = bulk(client, admin_headers, [
+        {"action": "create", "contract": contract_data("7700000001")},
+        {"action": "create", "contract": contract_data("7700000002")},
+    ], atomic=False)
+
+    assert statuses(result) == ["error", "error"]
+    assert result["results"][0]["error"] == "Ошибка базы данных при записи пакета, повторите операцию"
+    assert db.query(Contract).count() == 0
+
+
+def test_bulk_rejects_too_many_items(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(contract_service, "BULK_MAX_ITEMS", 1)
+
+    response = client.post(
+        "/contracts/bulk",
+        json={"items": [{"action": "delete", "id": 1}, {"action": "delete", "id": 2}]},
+        headers=admin_headers,
+    )
+
+    assert response.status_code == 400
+
+
+def test_bulk_requires_admin(client, lawyer):
+    _, headers = lawyer
+
+    response = client.post("/contracts/bulk", json={"items": [{"action": "delete", "id": 1}]}, headers=headers)
+
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("atomic", [True, False])
+def test_bulk_keeps_stats_consistent(client, db, admin_headers, lawyer, make_contract, atomic):
+    lawyer_user, _ = lawyer
+    first = make_contract("7700000001", days=100)
+    second = make_contract("7700000002", days=10)
+
+    bulk(client, admin_headers, [
+        {"action": "create", "contract": contract_data("7700000003", days=-1)},
+        {"action": "reassign", "id": first["id"], "lawyer_id": lawyer_user["id"]},
+        {"action": "delete", "id": second["id"]},
+    ], atomic=atomic)
+
+    stats = client.get("/contracts/stats", headers=admin_headers).json()
+    assert (stats["total"], stats["active"], stats["expiring_soon"], stats["expired"]) == (2, 1, 0, 1)
+    assert stats["per_lawyer"]["lawyer1"]["active"] == 1
@@ -0,0 +1,100 @@
+"""
+Тесты кэшей: TTLCache, асинхронный кэш в памяти и RedisCache на FakeRedis
+"""
+import asyncio
+
+import pytest
+
+from app.core import cache
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = cache.TTLCache("test-lru", maxsize=2, ttl=10)
+
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    now[0] += 11
+    assert lru.get("a", cache.MISSING) is cache.MISSING
+
+    stats = lru.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 2, 1)
+
+
+@pytest.fixture(params=["memory", "fakeredis"])
+def async_cache(request):
+    if request.param == "memory":
+        return cache.AsyncMemoryCache("test-async", ttl=30)
+    return cache.RedisCache("test-redis", cache.FakeRedis(), ttl=30)
+
+
+def test_async_caches_share_interface(async_cache):
+    async def scenario():
+        assert await async_cache.get("k", cache.MISSING) is cache.MISSING
+        await async_cache.set("k", {"value": [1, 2]})
+        await async_cache.set("none", None)
+        assert await async_cache.get("k") == {"value": [1, 2]}
+        assert await async_cache.get("none", cache.MISSING) is None
+
+        await async_cache.invalidate("k")
+        assert await async_cache.get("k") is None
+        await async_cache.clear()
+        assert await async_cache.get("none", cache.MISSING) is cache.MISSING
+
+    run(scenario())
+
+    stats = async_cache.stats()
+    assert (stats["hits"], stats["invalidations"]) == (2, 1)
+
+
+def test_fake_redis_expiry_and_scan(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    client = cache.FakeRedis()
+
+    async def scenario():
+        await client.set("cache:a:1", "x", ex=5)
+        await client.set("cache:b:1", "y")
+        assert await client.get("cache:a:1") == b"x"
+        assert [name async for name in client.scan_iter(match="cache:a:*")] == ["cache:a:1"]
+
+        now[0] += 6
+        assert await client.get("cache:a:1") is None
+        assert await client.delete("cache:a:1", "cache:b:1") == 1
+
+    run(scenario())
+
+
+def test_redis_cache_clear_keeps_other_prefixes():
+    client = cache.FakeRedis()
+    first = cache.RedisCache("test-first", client)
+    second = cache.RedisCache("test-second", client)
+
+    async def scenario():
+        await first.set("k", 1)
+        await second.set("k", 2)
+        await first.clear()
+        return await first.get("k"), await second.get("k")
+
+    assert run(scenario()) == (None, 2)
+
+
+def test_get_many_counts_one_lookup(async_cache):
+    async def scenario():
+        assert await async_cache.get_many(["a", "b"], cache.MISSING) == [cache.MISSING, cache.MISSING]
+        await async_cache.set("b", 2)
+        assert await async_cache.get_many(["a", "b"]) == [None, 2]
+
+    run(scenario())
+
+    stats = async_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,75 @@
+"""
+Тесты условных запросов: ETag и If-None-Match (304), If-Match при обновлении (409)
+"""
+from app.core import http_cache
+
+
+def test_etag_matches_weak_and_listed_tags():
+    etag = 'W/"abc"'
+
+    assert http_cache.etag_matches('"abc"', etag)
+    assert http_cache.etag_matches('W/"xyz", W/"abc"', etag)
+    assert http_cache.etag_matches("*", etag)
+    assert not http_cache.etag_matches(None, etag)
+    assert not http_cache.etag_matches('W/"xyz"', etag)
+
+
+def test_contract_get_returns_304_for_weak_etag(client, admin_headers, make_contract):
+    contract = make_contract("7700000001")
+
+    response = client.get(f"/contracts/{contract['id']}", headers=admin_headers)
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    cached = client.get(f"/contracts/{contract['id']}", headers={**admin_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+
+def test_list_and_stats_revalidate_until_data_changes(client, admin_headers, make_contract):
+    make_contract("7700000001")
+
+    for url in ("/contracts/", "/contracts/stats"):
+        etag = client.get(url, headers=admin_headers).headers["ETag"]
+        assert client.get(url, headers={**admin_headers, "If-None-Match": etag}).status_code == 304
+
+    list_etag = client.get("/contracts/", headers=admin_headers).headers["ETag"]
+    make_contract("7700000002")
+
+    assert client.get("/contracts/", headers={**admin_headers, "If-None-Match": list_etag}).status_code == 200
+
+
+def test_if_match_round_trip(client, admin_headers, make_contract):
+    contract = make_contract("7700000001")
+    etag = client.get(f"/contracts/{contract['id']}", headers=admin_headers).headers["ETag"]
+
+    saved = client.put(
+        f"/contracts/{contract['id']}", json={"comments": "первое"}, headers={**admin_headers, "If-Match": etag}
+    )
+    assert saved.status_code == 200
+    assert saved.json()["version"] == contract["version"] + 1
+    new_etag = saved.headers["ETag"]
+
+    # Повтор со старым ETag - конфликт, в ответе ETag актуальной версии
+    stale = client.put(
+        f"/contracts/{contract['id']}", json={"comments": "второе"}, headers={**admin_headers, "If-Match": etag}
+    )
+    assert stale.status_code == 409
+    assert stale.headers["ETag"] == new_etag
+
+    retried = client.put(
+        f"/contracts/{contract['id']}", json={"comments": "второе"}, headers={**admin_headers, "If-Match": new_etag}
+    )
+    assert retried.status_code == 200
+    assert retried.json()["comments"] == "второе"
+
+
+def test_if_match_rejects_malformed_header(client, admin_headers, make_contract):
+    contract = make_contract("7700000001")
+
+    response = client.put(
+        f"/contracts/{contract['id']}", json={"comments": "x"}, headers={**admin_headers, "If-Match": '"abc"'}
+    )
+
+    assert response.status_code == 400
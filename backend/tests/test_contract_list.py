@@ -0,0 +1,107 @@
+"""
+Тесты списка контрактов: курсорная пагинация, выбор полей и поиск
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.models import Contract
+from app.services import contract_service
+
+
+def test_cursor_roundtrip_keeps_end_date_and_id():
+    contract = Contract(id=42, end_date=datetime(2030, 5, 17, 12, 30))
+
+    cursor = contract_service._encode_cursor("end_date", contract)
+
+    assert "=" not in cursor
+    assert contract_service._decode_cursor(cursor) == ("end_date", datetime(2030, 5, 17, 12, 30), 42)
+
+
+@pytest.mark.parametrize("cursor", ["не-курсор", "e30", "eyJvcmRlcl9ieSI6ICJuYW1lIiwgImlkIjogMX0"])
+def test_invalid_cursor_is_rejected(cursor):
+    # e30 - пустой объект, последний - курсор с недопустимой сортировкой
+    with pytest.raises(HTTPException) as error:
+        contract_service._decode_cursor(cursor)
+
+    assert error.value.status_code == 400
+
+
+def test_cursor_pagination_breaks_end_date_ties_by_id(client, db, admin_headers, make_contract):
+    # Пять контрактов с одинаковой датой окончания и один более ранний
+    end_date = (datetime.utcnow() + timedelta(days=200)).replace(microsecond=0).isoformat()
+    same_day = [make_contract(f"77000000{i:02d}", end_date=end_date)["id"] for i in range(5)]
+    earliest = make_contract("7700000099", days=150)["id"]
+
+    seen, cursor = [], None
+    while True:
+        params = {"pagination": "cursor", "limit": 2, "order_by": "end_date"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/contracts/", params=params, headers=admin_headers).json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [earliest] + sorted(same_day)
+
+
+def test_offset_pagination_and_fields(client, admin_headers, make_contract):
+    ids = [make_contract(f"77000000{i:02d}")["id"] for i in range(3)]
+
+    response = client.get("/contracts/", params={"skip": 1, "limit": 5, "fields": "inn"}, headers=admin_headers)
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == ids[1:]
+    assert set(response.json()[0]) == {"id", "inn"}
+
+
+def test_unknown_field_is_rejected(client, admin_headers):
+    response = client.get("/contracts/", params={"fields": "inn,password"}, headers=admin_headers)
+
+    assert response.status_code == 400
+
+
+def test_status_filter_uses_end_date(client, admin_headers, make_contract):
+    make_contract("7700000001", days=100)
+    expiring = make_contract("7700000002", days=10)
+    expired = make_contract("7700000003", days=-1)
+
+    def ids(status):
+        return [item["id"] for item in client.get("/contracts/", params={"status": status}, headers=admin_headers).json()]
+
+    assert ids("expiring_soon") == [expiring["id"]]
+    assert ids("expired") == [expired["id"]]
+
+
+def test_search_ranks_exact_inn_first_on_sqlite(client, admin_headers, make_contract):
+    by_address = make_contract("7700000001", address="г. Москва, ул. Ромашка 7700000002")
+    by_name = make_contract("7700000003", company_name="Ромашка")
+    by_inn = make_contract("7700000002")
+
+    ranked = client.get("/contracts/", params={"search": "7700000002"}, headers=admin_headers).json()
+    assert [item["id"] for item in ranked] == [by_inn["id"], by_address["id"]]
+
+    ranked = client.get("/contracts/", params={"search": "Ромашка"}, headers=admin_headers).json()
+    assert [item["id"] for item in ranked] == [by_name["id"], by_address["id"]]
+
+
+def test_search_escapes_like_wildcards(client, admin_headers, make_contract):
+    make_contract("7700000001", company_name="ООО 100% Гарантия")
+    make_contract("7700000002", company_name="ООО 1000 мелочей")
+
+    found = client.get("/contracts/", params={"search": "100%"}, headers=admin_headers).json()
+
+    assert len(found) == 1
+
+
+def test_lawyer_sees_only_own_contracts(client, admin_headers, lawyer, make_contract):
+    lawyer_user, lawyer_headers = lawyer
+    own = make_contract("7700000001", lawyer_id=lawyer_user["id"])
+    make_contract("7700000002")
+
+    listed = client.get("/contracts/", headers=lawyer_headers).json()
+
+    assert [item["id"] for item in listed] == [own["id"]]
@@ -0,0 +1,108 @@
+"""
+Тесты материализованной статистики: согласованность с таблицей контрактов
+после изменений через API и после пересчета статусов
+"""
+from datetime import datetime, timedelta
+
+from app.models.models import Contract, ContractStat
+from app.services import contract_service, stats_service
+
+
+def stored_stats(db) -> dict:
+    """Ненулевые счетчики contract_stats по (юрист, статус)"""
+    db.expire_all()
+    return {
+        (stat.lawyer_id, stat.status): stat.count
+        for stat in db.query(ContractStat)
+        if stat.count
+    }
+
+
+def actual_stats(db) -> dict:
+    """Счетчики, посчитанные по таблице контрактов"""
+    counts = {}
+    for contract in db.query(Contract):
+        key = (contract.lawyer_id, contract.status)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def test_stats_follow_create_update_delete(client, db, admin_headers, lawyer, make_contract):
+    lawyer_user, lawyer_headers = lawyer
+    first = make_contract("7700000001", days=100)
+    second = make_contract("7700000002", days=10, lawyer_id=lawyer_user["id"])
+    make_contract("7700000003", days=-5)
+    assert stored_stats(db) == actual_stats(db)
+
+    # Перенос даты меняет статус, смена юриста - владельца счетчика
+    response = client.put(
+        f"/contracts/{first['id']}",
+        json={"end_date": (datetime.utcnow() + timedelta(days=5)).isoformat(), "lawyer_id": lawyer_user["id"]},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert stored_stats(db) == actual_stats(db)
+
+    assert client.delete(f"/contracts/{second['id']}", headers=admin_headers).status_code == 200
+    assert stored_stats(db) == actual_stats(db)
+
+    stats = client.get("/contracts/stats", headers=admin_headers).json()
+    assert (stats["total"], stats["active"], stats["expiring_soon"], stats["expired"]) == (2, 0, 1, 1)
+    assert stats["per_lawyer"]["lawyer1"]["expiring_soon"] == 1
+
+    own = client.get("/contracts/stats", headers=lawyer_headers).json()
+    assert (own["total"], own["expiring_soon"]) == (1, 1)
+    assert own.get("per_lawyer") is None
+
+
+def test_status_refresh_moves_counts_between_statuses(client, db, make_contract):
+    make_contract("7700000001", days=40)
+    make_contract("7700000002", days=100)
+
+    # Через 20 дней первый контракт истекает в течение месяца
+    result = contract_service.refresh_contract_statuses(db, now=datetime.utcnow() + timedelta(days=20))
+
+    assert result["expiring_soon"] == 1
+    assert stored_stats(db) == actual_stats(db)
+
+
+def test_reconcile_repairs_drifted_stats(client, db, make_contract):
+    contract = make_contract("7700000001")
+    make_contract("7700000002", days=10)
+
+    db.query(ContractStat).update({ContractStat.count: 42})
+    db.add(ContractStat(lawyer_id=contract["lawyer_id"], status="expired", count=3))
+    db.commit()
+
+    stats_service.reconcile_contract_stats(db)
+    db.commit()
+
+    assert stored_stats(db) == actual_stats(db)
+
+
+def test_status_refresh_without_transitions_skips_reconcile(client, db, make_contract, monkeypatch):
+    make_contract("7700000001")
+    calls = []
+    monkeypatch.setattr(stats_service, "reconcile_contract_stats", calls.append)
+
+    result = contract_service.refresh_contract_statuses(db)
+
+    assert set(result.values()) == {0}
+    assert calls == []
+
+
+def test_stats_refresh_on_read_without_scheduler(client, db, admin_headers, make_contract, monkeypatch):
+    contract = make_contract("7700000001", days=100)
+    # Срок подошел, а планировщик не запущен: сохраненный статус устарел
+    db.query(Contract).filter(Contract.id == contract["id"]).update(
+        {Contract.end_date: datetime.utcnow() + timedelta(days=5)}
+    )
+    db.commit()
+
+    assert client.get("/contracts/stats", headers=admin_headers).json()["expiring_soon"] == 0
+
+    monkeypatch.setattr(contract_service, "STATUS_REFRESH_ON_READ", True)
+    monkeypatch.setattr(contract_service, "_last_status_refresh", None)
+
+    stats = client.get("/contracts/stats", headers=admin_headers).json()
+    assert (stats["active"], stats["expiring_soon"]) == (0, 1)
@@ -0,0 +1,299 @@
+"""
+Тесты клиента DaData: повторы, автомат отключения и объединение одновременных запросов
+HTTP-сервер DaData подменяется через httpx.MockTransport
+"""
+import asyncio
+import itertools
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.core.cache import AsyncMemoryCache
+from app.services import dadata_service as dadata_module
+from app.services.dadata_service import CircuitBreaker, DadataService
+
+INN = "7707083893"
+COMPANY = {"value": "ПАО СБЕРБАНК", "data": {"inn": INN}}
+
+_cache_names = itertools.count()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """Повторы без задержек"""
+    monkeypatch.setattr(dadata_module, "DADATA_RETRIES", 2)
+    monkeypatch.setattr(dadata_module, "DADATA_RETRY_BACKOFF", 0)
+
+
+def make_service(handler) -> DadataService:
+    """Сервис с подмененным транспортом и отдельным кэшем"""
+    return DadataService(
+        token="token",
+        secret="secret",
+        cache=AsyncMemoryCache(f"test_dadata_{next(_cache_names)}"),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+def party_response(request: httpx.Request) -> httpx.Response:
+    assert json.loads(request.content) == {"query": INN}
+    return httpx.Response(200, json={"suggestions": [COMPANY]})
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 502, 503, 504])
+def test_retries_on_rate_limit_and_server_errors(status_code):
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(status_code)
+        return party_response(request)
+    
+    service = make_service(handler)
+    
+    async def scenario():
+        try:
+            return await service.get_company_by_inn(INN)
+        finally:
+            await service.aclose()
+    
+    assert asyncio.run(scenario()) == COMPANY
+    assert len(calls) == 3
+    assert service.breaker.state == "closed"
+
+
+def test_gives_up_after_retries():
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+    
+    service = make_service(handler)
+    
+    async def scenario():
+        try:
+            with pytest.raises(HTTPException) as error:
+                await service.get_company_by_inn(INN)
+            return error.value
+        finally:
+            await service.aclose()
+    
+    assert asyncio.run(scenario()).status_code == 503
+    assert len(calls) == 3
+    assert service.breaker.failures == 1
+
+
+@pytest.mark.parametrize("status_code", [400, 401, 403, 404])
+def test_does_not_retry_client_errors(status_code):
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(status_code)
+    
+    service = make_service(handler)
+    
+    async def scenario():
+        try:
+            with pytest.raises(HTTPException) as error:
+                await service.get_company_by_inn(INN)
+            return error.value
+        finally:
+            await service.aclose()
+    
+    assert asyncio.run(scenario()).status_code == 502
+    assert len(calls) == 1
+    # Отклоненный запрос не говорит о недоступности сервиса
+    assert service.breaker.failures == 0
+
+
+def test_breaker_opens_and_recovers_through_half_open():
+    calls = []
+    healthy = False
+    
+    def handler(request):
+        calls.append(request)
+        return party_response(request) if healthy else httpx.Response(500)
+    
+    service = make_service(handler)
+    service.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    
+    async def scenario():
+        nonlocal healthy
+        try:
+            for _ in range(2):
+                with pytest.raises(HTTPException):
+                    await service.get_company_by_inn(INN)
+            assert service.breaker.state == "open"
+            assert len(calls) == 6
+            
+            # Открытый автомат отклоняет запросы без обращения к DaData
+            with pytest.raises(HTTPException) as error:
+                await service.get_company_by_inn(INN)
+            assert error.value.status_code == 503
+            assert len(calls) == 6
+            
+            await asyncio.sleep(0.06)
+            assert service.breaker.state == "half_open"
+            
+            # Пробный запрос проходит и закрывает автомат
+            healthy = True
+            assert await service.get_company_by_inn(INN) == COMPANY
+            assert service.breaker.state == "closed"
+            assert len(calls) == 7
+        finally:
+            await service.aclose()
+    
+    asyncio.run(scenario())
+
+
+def test_failed_half_open_trial_reopens_breaker():
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+    
+    service = make_service(handler)
+    service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    
+    async def scenario():
+        try:
+            with pytest.raises(HTTPException):
+                await service.get_company_by_inn(INN)
+            assert service.breaker.state == "open"
+            
+            await asyncio.sleep(0.06)
+            with pytest.raises(HTTPException):
+                await service.get_company_by_inn(INN)
+            assert service.breaker.state == "open"
+            assert len(calls) == 6
+        finally:
+            await service.aclose()
+    
+    asyncio.run(scenario())
+
+
+def test_unexpected_error_in_half_open_trial_releases_breaker():
+    calls = []
+    broken = True
+    
+    def handler(request):
+        calls.append(request)
+        if broken:
+            raise RuntimeError("непредвиденная ошибка")
+        return party_response(request)
+    
+    service = make_service(handler)
+    service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    service.breaker.record_failure()
+    
+    async def scenario():
+        nonlocal broken
+        try:
+            await asyncio.sleep(0.06)
+            with pytest.raises(RuntimeError):
+                await service.get_company_by_inn(INN)
+            assert not service.breaker.trial_in_progress
+            
+            # Следующий пробный запрос не отклоняется
+            broken = False
+            assert await service.get_company_by_inn(INN) == COMPANY
+            assert service.breaker.state == "closed"
+            assert len(calls) == 2
+        finally:
+            await service.aclose()
+    
+    asyncio.run(scenario())
+
+
+def test_concurrent_calls_are_coalesced_when_one_caller_is_cancelled():
+    calls = []
+    
+    async def scenario():
+        release = asyncio.Event()
+        
+        async def handler(request):
+            calls.append(request)
+            await release.wait()
+            return party_response(request)
+        
+        service = make_service(handler)
+        try:
+            first = asyncio.create_task(service.get_company_by_inn(INN))
+            second = asyncio.create_task(service.get_company_by_inn(INN))
+            await asyncio.sleep(0.01)
+            
+            # Отмена одного из ожидающих не отменяет общий запрос
+            first.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            
+            assert await second == COMPANY
+            assert first.cancelled()
+            assert len(calls) == 1
+            
+            # Результат общего запроса сохранен в кэш
+            assert await service.get_company_by_inn(INN) == COMPANY
+            assert len(calls) == 1
+        finally:
+            await service.aclose()
+    
+    asyncio.run(scenario())
+
+
+def test_suggestions_reuse_cached_prefix_with_one_lookup():
+    calls = []
+    horns = {"value": "ООО РОГА И КОПЫТА", "data": {"inn": INN}}
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"suggestions": [horns, COMPANY]})
+    
+    service = make_service(handler)
+    
+    async def scenario():
+        try:
+            await service.suggest_companies("рога", count=5)
+            misses = service.suggest_cache.stats()["misses"]
+            
+            # Полный список для "рога" подходит для продолжения запроса без обращения к DaData
+            assert await service.suggest_companies("рога и копыта", count=5) == [horns]
+            assert len(calls) == 1
+            
+            # Промах по запросу и всем его началам учитывается один раз
+            await service.suggest_companies("сбербанк россии", count=5)
+            assert service.suggest_cache.stats()["misses"] == misses + 1
+            assert len(calls) == 2
+        finally:
+            await service.aclose()
+    
+    asyncio.run(scenario())
+
+
+def test_suggestion_prefix_probes_are_limited(monkeypatch):
+    monkeypatch.setattr(dadata_module, "SUGGEST_PREFIX_PROBES", 2)
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"suggestions": []})
+    
+    service = make_service(handler)
+    
+    async def scenario():
+        try:
+            await service.suggest_companies("рога", count=5)
+            # Начало "рога" дальше двух проверяемых начал запроса ("рога и к", "рога и")
+            await service.suggest_companies("рога и ко", count=5)
+            assert len(calls) == 2
+            await service.suggest_companies("рога и к", count=5)
+            assert len(calls) == 2
+        finally:
+            await service.aclose()
+    
+    asyncio.run(scenario())
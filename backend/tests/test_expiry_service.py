@@ -0,0 +1,152 @@
+"""
+Тесты проверки сроков: очередь сводок, повторы с задержкой и отправка через SMTP-заглушку
+"""
+import smtplib
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.models import NotificationOutbox
+from app.services import expiry_service
+
+
+def digest(username: str, inn: str = "7700000001") -> dict:
+    return {
+        "lawyer_id": None,
+        "username": username,
+        "generated_at": datetime.utcnow().isoformat(),
+        "expiring_soon": [{"id": 1, "company_name": "ООО Ромашка", "inn": inn, "end_date": "2031-01-31T00:00:00", "days_left": 10}],
+        "expired": [],
+    }
+
+
+class StubSMTP:
+    """Заглушка smtplib.SMTP: запоминает соединения и письма, отклоняет заданные адреса"""
+
+    connections = 0
+    outbox = []
+
+    def __init__(self, host, port, refused=(), broken=False):
+        if broken:
+            raise ConnectionRefusedError("SMTP недоступен")
+        StubSMTP.connections += 1
+        self.refused = refused
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, message):
+        if message["To"] in self.refused:
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (550, b"no such user")})
+        StubSMTP.outbox.append(message)
+
+
+@pytest.fixture
+def smtp_sink():
+    StubSMTP.connections = 0
+    StubSMTP.outbox = []
+
+    def make(**options):
+        return expiry_service.SmtpSink(smtp_factory=lambda host, port: StubSMTP(host, port, **options))
+    return make
+
+
+class FailingSink(expiry_service.NotificationSink):
+    """Не принимает сводки юристов из failing"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    def send(self, digests):
+        for item in digests:
+            if item["username"] in self.failing:
+                raise RuntimeError(f"приемник отклонил {item['username']}")
+            self.sent.append(item["username"])
+
+
+def enqueue(db, *usernames):
+    rows = [NotificationOutbox(payload=digest(username)) for username in usernames]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+def test_smtp_sink_uses_one_connection_and_reports_per_message(db, smtp_sink):
+    sink = smtp_sink(refused=("bad@example.com",))
+
+    errors = sink.deliver([digest("a@example.com"), digest("bad@example.com"), digest("c@example.com")])
+
+    assert StubSMTP.connections == 1
+    assert [message["To"] for message in StubSMTP.outbox] == ["a@example.com", "c@example.com"]
+    assert [type(error) for error in errors] == [type(None), smtplib.SMTPRecipientsRefused, type(None)]
+    assert "ООО Ромашка" in StubSMTP.outbox[0].get_content()
+
+
+def test_smtp_connection_error_fails_all_messages(db, smtp_sink):
+    errors = smtp_sink(broken=True).deliver([digest("a@example.com"), digest("b@example.com")])
+
+    assert all(isinstance(error, ConnectionRefusedError) for error in errors)
+
+
+def test_failed_digest_does_not_block_the_rest(db):
+    enqueue(db, "first", "broken", "last")
+    sink = FailingSink(failing={"broken"})
+
+    result = expiry_service.deliver_pending_digests(db, sink)
+
+    assert result == {"sent": 2, "failed": 1, "dead": 0}
+    assert sink.sent == ["first", "last"]
+    broken = db.query(NotificationOutbox).filter(NotificationOutbox.sent_at.is_(None)).one()
+    assert broken.attempts == 1
+    assert "broken" in broken.last_error
+    assert broken.next_attempt_at > datetime.utcnow()
+
+
+def test_retry_waits_for_backoff_and_stops_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(expiry_service, "NOTIFY_MAX_ATTEMPTS", 3)
+    (row,) = enqueue(db, "broken")
+    sink = FailingSink(failing={"broken"})
+
+    assert expiry_service.deliver_pending_digests(db, sink)["failed"] == 1
+    # Время следующей попытки не наступило
+    assert expiry_service.deliver_pending_digests(db, sink) == {"sent": 0, "failed": 0, "dead": 0}
+
+    for attempt in (2, 3):
+        row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        result = expiry_service.deliver_pending_digests(db, sink)
+
+    assert result == {"sent": 0, "failed": 1, "dead": 1}
+    db.refresh(row)
+    assert (row.attempts, row.sent_at) == (3, None)
+    assert row.failed_at is not None
+
+    row.next_attempt_at = None
+    db.commit()
+    assert expiry_service.deliver_pending_digests(db, sink)["failed"] == 0
+
+
+def test_retry_delay_doubles_up_to_maximum(monkeypatch):
+    monkeypatch.setattr(expiry_service, "NOTIFY_RETRY_BACKOFF", 60)
+    monkeypatch.setattr(expiry_service, "NOTIFY_RETRY_BACKOFF_MAX", 300)
+
+    assert [expiry_service.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)] == [60, 120, 240, 300]
+
+
+def test_expiry_check_queues_and_sends_digests(client, db, make_contract):
+    make_contract("7700000001", days=40)
+    make_contract("7700000002", days=100)
+    sink = FailingSink()
+
+    counts = expiry_service.run_expiry_check(db, sink, now=datetime.utcnow() + timedelta(days=20))
+
+    assert counts["expiring_soon"] == 1
+    assert sink.sent == ["admin"]
+    assert db.query(NotificationOutbox).filter(NotificationOutbox.sent_at.isnot(None)).count() == 1
@@ -0,0 +1,48 @@
+"""
+Тесты выгрузки контрактов: экранирование формул в CSV и формат NDJSON
+"""
+import csv
+import io
+import json
+
+from app.services import export_service
+
+
+def test_cell_escapes_formula_prefixes():
+    assert export_service._cell("=HYPERLINK(\"http://x\")") == "'=HYPERLINK(\"http://x\")"
+    assert export_service._cell("+7 495") == "'+7 495"
+    assert export_service._cell("ООО Ромашка") == "ООО Ромашка"
+    assert export_service._cell(None) == ""
+
+
+def test_csv_export_escapes_formulas(client, admin_headers, make_contract):
+    make_contract("7700000001", company_name="=cmd|' /C calc'!A0", comments="@SUM(A1:A2)")
+
+    response = client.get("/contracts/export", params={"format": "csv", "fields": "company_name,comments"}, headers=admin_headers)
+
+    assert response.status_code == 200
+    assert "attachment" in response.headers["Content-Disposition"]
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0] == ["id", "company_name", "comments"]
+    assert rows[1][1:] == ["'=cmd|' /C calc'!A0", "'@SUM(A1:A2)"]
+
+
+def test_ndjson_export_respects_access(client, admin_headers, lawyer, make_contract):
+    lawyer_user, lawyer_headers = lawyer
+    own = make_contract("7700000001", lawyer_id=lawyer_user["id"])
+    make_contract("7700000002")
+
+    response = client.get("/contracts/export", params={"format": "ndjson"}, headers=lawyer_headers)
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [own["id"]]
+    assert lines[0]["company_name"] == "ООО Компания 7700000001"
+    # Дата и время в ISO 8601, как в ответах API
+    assert lines[0]["end_date"] == own["end_date"]
+    assert "T" in lines[0]["created_at"]
+
+
+def test_unknown_export_format_is_rejected(client, admin_headers):
+    response = client.get("/contracts/export", params={"format": "pdf"}, headers=admin_headers)
+
+    assert response.status_code == 422
@@ -0,0 +1,102 @@
+"""
+Тесты импорта и синхронизации из таблицы на локальном источнике (каталог CSV)
+"""
+import csv
+
+import pytest
+
+import migration_tool
+from app.models.models import Contract, ContractHistory, User
+
+CONTRACT_HEADER = ["id", "company_name", "inn", "director", "address", "end_date", "lawyer_id",
+                   "status", "comments", "has_nd", "created_at"]
+
+
+def write_sheet(path, name, header, rows):
+    with open(path / f"{name}.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def contract_row(inn, lawyer_id, end_date="2031-01-31", comments=""):
+    return ["", f"ООО {inn}", inn, "Петров П.П.", "г. Казань", end_date, str(lawyer_id), "", comments, "false",
+            "2024-01-10 09:00:00"]
+
+
+@pytest.fixture
+def source(tmp_path, db):
+    """Локальный источник с двумя пользователями; контракты записываются тестом"""
+    write_sheet(tmp_path, "Users", ["id", "username", "role", "created_at"], [
+        ["1", "ivanova", "lawyer", "2024-01-01 10:00:00"],
+        ["2", "ivanova", "lawyer", "2024-01-01 10:00:00"],
+        ["3", "petrov", "lawyer"],
+    ])
+    write_sheet(tmp_path, "Contracts", CONTRACT_HEADER, [])
+    return migration_tool.LocalSheetSource(str(tmp_path))
+
+
+def test_local_source_drops_trailing_empty_cells(tmp_path):
+    write_sheet(tmp_path, "Users", ["id", "username", "role", "created_at"], [["1", "ivanova", "lawyer", ""], [], ["", "", ""]])
+    source = migration_tool.LocalSheetSource(str(tmp_path))
+
+    assert source.initialize()
+    assert list(source.iter_rows("Users", "D")) == [(2, ["1", "ivanova", "lawyer"])]
+    assert not migration_tool.LocalSheetSource(str(tmp_path / "missing")).initialize()
+
+
+def test_migrate_users_dry_run_writes_nothing(source, db):
+    report = migration_tool.migrate_users(source, db, dry_run=True)
+
+    assert (report["fetched"], report["duplicates"], report["created"]) == (3, 1, 0)
+    assert db.query(User).count() == 1
+
+
+def test_migrate_contracts_validates_and_inserts(tmp_path, source, db):
+    migration_tool.migrate_users(source, db)
+    lawyer_id = db.query(User.id).filter(User.username == "ivanova").scalar()
+    write_sheet(tmp_path, "Contracts", CONTRACT_HEADER, [
+        contract_row("7700000001", lawyer_id),
+        contract_row("7700000001", lawyer_id),
+        contract_row("123", lawyer_id),
+        contract_row("7700000002", 999),
+    ])
+
+    dry = migration_tool.migrate_contracts(source, db, dry_run=True)
+    assert (dry["valid"], dry["created"], dry["failed"]) == (1, 0, 3)
+    assert db.query(Contract).count() == 0
+
+    report = migration_tool.migrate_contracts(source, db)
+    assert report["created"] == 1
+    assert db.query(ContractHistory.action).scalar() == "create"
+
+
+def test_sync_skips_unchanged_rows_and_updates_changed(tmp_path, source, db):
+    migration_tool.migrate_users(source, db)
+    lawyer_id = db.query(User.id).filter(User.username == "ivanova").scalar()
+    write_sheet(tmp_path, "Contracts", CONTRACT_HEADER, [
+        contract_row("7700000001", lawyer_id),
+        contract_row("7700000002", lawyer_id),
+    ])
+
+    first = migration_tool.sync_contracts(source, db, workers=1)
+    assert (first["created"], first["updated"]) == (2, 0)
+
+    write_sheet(tmp_path, "Contracts", CONTRACT_HEADER, [
+        contract_row("7700000001", lawyer_id),
+        contract_row("7700000002", lawyer_id, comments="продлен"),
+        contract_row("7700000003", lawyer_id),
+    ])
+
+    dry = migration_tool.sync_contracts(source, db, dry_run=True, workers=1)
+    assert (dry["unchanged"], dry["changed"], dry["created"], dry["updated"]) == (1, 2, 0, 0)
+    assert db.query(Contract).count() == 2
+
+    second = migration_tool.sync_contracts(source, db, workers=1)
+    assert (second["unchanged"], second["created"], second["updated"]) == (1, 1, 1)
+
+    db.expire_all()
+    changed = db.query(Contract).filter(Contract.inn == "7700000002").one()
+    assert (changed.comments, changed.version) == ("продлен", 2)
+    history = db.query(ContractHistory).filter(ContractHistory.action == "sync").one()
+    assert history.changes == {"comments": {"old": "", "new": "продлен"}}
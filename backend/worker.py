@@ -0,0 +1,60 @@
+"""
+Фоновый процесс проверки сроков контрактов
+Переводит контракты в статусы expiring_soon/expired и рассылает сводки юристам.
+При запуске отдельным процессом в окружении API задается EXPIRY_SCHEDULER=worker,
+чтобы проверка не выполнялась дважды
+"""
+import argparse
+import logging
+import time
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения до импорта модулей приложения
+load_dotenv()
+
+from app.database.base import SessionLocal
+from app.services import expiry_service
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger("worker")
+
+
+def run_once(sink) -> dict:
+    """Выполняет одну проверку в собственной сессии"""
+    db = SessionLocal()
+    try:
+        return expiry_service.run_expiry_check(db, sink)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка сроков контрактов и уведомление юристов")
+    parser.add_argument("--once", action="store_true", help="выполнить одну проверку и завершиться")
+    parser.add_argument("--interval", type=int, default=expiry_service.EXPIRY_CHECK_INTERVAL,
+                        help="интервал между проверками в секундах")
+    parser.add_argument("--sink", choices=sorted(expiry_service.SINKS), default=expiry_service.NOTIFY_SINK,
+                        help="приемник уведомлений")
+    args = parser.parse_args()
+    
+    sink = expiry_service.get_notification_sink(args.sink)
+    
+    if args.once:
+        run_once(sink)
+        return
+    
+    logger.info(f"Проверка сроков контрактов каждые {args.interval} с, приемник: {args.sink}")
+    while True:
+        try:
+            run_once(sink)
+        except Exception as e:
+            logger.error(f"Ошибка при проверке сроков контрактов: {e}")
+        
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()